@@ -0,0 +1,142 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+import metrics
+from embeddings import embed
+from gazetteer import normalize
+
+# Bounds and matching for the process-wide answer cache
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("SALAH_GPT_ANSWER_CACHE_SIZE", "1000"))
+ANSWER_CACHE_TTL = int(os.getenv("SALAH_GPT_ANSWER_CACHE_TTL", "86400"))  # seconds
+# Answers built from prayer times or the Qibla for a location go stale quickly
+ANSWER_CACHE_LOCATION_TTL = int(os.getenv("SALAH_GPT_ANSWER_CACHE_LOCATION_TTL", "900"))  # seconds
+ANSWER_CACHE_THRESHOLD = float(os.getenv("SALAH_GPT_ANSWER_CACHE_THRESHOLD", "0.92"))  # cosine similarity
+
+# Words that decide which answer is right but that the search analyzer drops
+# as stopwords (or an embedding model may barely weigh): timing, who the
+# question is about, permission/obligation, conditions and negation.
+# "t" is what is left of "can't" or "don't" after normalize.
+QUALIFIER_WORDS = frozenset("""
+after before during until till while since
+he she him her his hers man men woman women male female husband wife boy girl
+can could may might must should shall need allowed permissible
+if unless no not without t
+""".split())
+
+
+def query_qualifiers(normalized):
+    """The QUALIFIER_WORDS in a normalized query"""
+    return frozenset(word for word in normalized.split() if word in QUALIFIER_WORDS)
+
+
+class SemanticAnswerCache:
+    """Thread-safe LRU cache of generated answers, matched by query similarity.
+
+    Answers are grouped into buckets (madhab, language and, for location
+    dependent questions, the location) and a lookup only considers answers in
+    the same bucket. Within a bucket, an identical normalized query is a hit
+    without embedding anything; otherwise the most similar earlier query is a
+    hit if its cosine similarity reaches the threshold. So "how to pray fajr"
+    and "How do I pray Fajr?" share one answer. A similar query only counts
+    if it has the same qualifier words, so "Can I pray Fajr after sunrise?"
+    never gets the answer to "... before sunrise?".
+    """
+
+    def __init__(self, max_entries=ANSWER_CACHE_MAX_ENTRIES, threshold=ANSWER_CACHE_THRESHOLD):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self._entries = OrderedDict()  # entry id -> (bucket, normalized query, expires_at, answer)
+        self._exact = {}  # (bucket, normalized query) -> entry id
+        self._buckets = {}  # bucket -> (entry ids, (n, dimensions) query vectors)
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, query, bucket):
+        """Return the cached answer for a query similar enough to query, or None"""
+        normalized = normalize(query)
+        with self._lock:
+            entry_id = self._exact.get((bucket, normalized))
+            if entry_id is None and bucket not in self._buckets:
+                self.misses += 1
+                return None
+
+        if entry_id is None:
+            vector = embed([normalized])[0]
+            with self._lock:
+                entry_id = self._most_similar(bucket, vector, query_qualifiers(normalized))
+
+        with self._lock:
+            entry = self._entries.get(entry_id)
+            if entry is not None:
+                if time.time() < entry[2]:
+                    self._entries.move_to_end(entry_id)
+                    self.hits += 1
+                    return entry[3]
+                self._remove(entry_id)
+            self.misses += 1
+        return None
+
+    def _most_similar(self, bucket, vector, qualifiers):
+        if bucket not in self._buckets:
+            return None
+        ids, vectors = self._buckets[bucket]
+        scores = vectors @ vector
+        mismatched = [query_qualifiers(self._entries[entry_id][1]) != qualifiers for entry_id in ids]
+        scores[np.array(mismatched)] = -1
+        best = int(np.argmax(scores))
+        return ids[best] if scores[best] >= self.threshold else None
+
+    def set(self, query, bucket, answer, ttl=ANSWER_CACHE_TTL):
+        """Store the answer to query in bucket for ttl seconds"""
+        normalized = normalize(query)
+        vector = embed([normalized])[0]
+        with self._lock:
+            previous = self._exact.get((bucket, normalized))
+            if previous is not None:
+                self._remove(previous)
+
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (bucket, normalized, time.time() + ttl, answer)
+            self._exact[(bucket, normalized)] = entry_id
+            ids, vectors = self._buckets.get(bucket, ([], np.zeros((0, len(vector)), dtype=np.float32)))
+            self._buckets[bucket] = (ids + [entry_id], np.vstack([vectors, vector]))
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, entry_id):
+        bucket, normalized, _, _ = self._entries.pop(entry_id)
+        self._exact.pop((bucket, normalized), None)
+        ids, vectors = self._buckets[bucket]
+        position = ids.index(entry_id)
+        if len(ids) == 1:
+            del self._buckets[bucket]
+        else:
+            self._buckets[bucket] = (ids[:position] + ids[position + 1:], np.delete(vectors, position, axis=0))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._exact.clear()
+            self._buckets.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+def answer_bucket(madhab, language, location=None):
+    """Bucket key for answers that only apply to the same madhab, language and location"""
+    return (madhab or "", language or "", normalize(location) if location else "")
+
+
+# Process-wide answer cache shared by all sessions
+ANSWER_CACHE = SemanticAnswerCache()
+metrics.register_stats("answer_cache", ANSWER_CACHE.stats)
@@ -2,12 +2,16 @@ import streamlit as st
 import requests
 from bs4 import BeautifulSoup
 import os
-from openai import OpenAI
 import json
 from datetime import datetime
 import pytz
 import hashlib
 import time
+from locations import resolve_location
+from qibla import qibla_response
+from context_builder import count_tokens
+from chat_pipeline import route_and_complete
+from fast_answers import awrah_guidance, fast_answer, salah_validation, sunnah_prayers, validate_wudu
 
 # Set page configuration
 st.set_page_config(
@@ -16,17 +20,13 @@ st.set_page_config(
     layout="wide"
 )
 
-# Initialize OpenAI client
+# OpenAI API key; the client itself is shared by all sessions (llm_gateway)
 openai_api_key = os.getenv("OPENAI_API_KEY", "")
 if not openai_api_key:
     openai_api_key = st.sidebar.text_input("OpenAI API Key", type="password")
 
-if openai_api_key:
-    client = OpenAI(api_key=openai_api_key)
-
 # API URLs
 PRAYER_API_URL = "https://api.aladhan.com/v1/timingsByCity"
-QIBLA_API_URL = "https://api.aladhan.com/v1/qibla"
 QURAN_API_URL = "https://api.quran.com/api/v4/search"
 
 # Initialize session cache and state
@@ -91,66 +91,15 @@ def get_prayer_times(city, country, madhab=None):
         return None
 
 def get_qibla_direction(city, country):
-    cache_key = get_cache_key("get_qibla_direction", {"city": city, "country": country})
-    if cache_key in st.session_state.cache and time.time() - st.session_state.cache[cache_key]["timestamp"] < 2592000:
-        return st.session_state.cache[cache_key]["data"]
-    
+    """Get Qibla direction for a specific location, calculated locally"""
     try:
-        response = requests.get(QIBLA_API_URL, params={"city": city, "country": country})
-        if response.status_code == 200:
-            data = response.json()
-            st.session_state.cache[cache_key] = {"timestamp": time.time(), "data": data}
-            return data
-        return None
+        place = resolve_location(city, country)
     except Exception as e:
-        st.error(f"Error fetching Qibla direction: {str(e)}")
+        st.error(f"Error finding location: {str(e)}")
         return None
-
-def validate_wudu():
-    steps = [
-        "Wash hands 3 times",
-        "Rinse mouth 3 times",
-        "Clean nose 3 times",
-        "Wash face 3 times",
-        "Wash arms up to elbows 3 times",
-        "Wipe head once",
-        "Wash feet up to ankles 3 times"
-    ]
-    return "\n".join([f"- {step}" for step in steps]) + "\n\n**Note**: Ensure water reaches all required areas, maintain order (Hanafi/Shafi’i), and make niyyah (intention)."
-
-def awrah_guidance(gender, madhab):
-    guidance = {
-        "Hanafi": {"Male": "Navel to knees", "Female": "Entire body except face, hands, and feet"},
-        "Shafii": {"Male": "Navel to knees", "Female": "Entire body except face and hands"},
-        "Maliki": {"Male": "Navel to knees", "Female": "Entire body except face and hands"},
-        "Hanbali": {"Male": "Navel to knees", "Female": "Entire body except face and hands"}
-    }
-    madhab = madhab.capitalize() if madhab else "Hanafi"  # Default to Hanafi
-    return guidance.get(madhab, guidance["Hanafi"])[gender.capitalize()]
-
-def salah_validation():
-    return """
-    **Salah Prerequisites**:
-    - Wudu: Complete ablution (see steps above).
-    - Purity: Clean body, clothes, and place of prayer.
-    - Niyyah: Intention in heart for specific prayer (e.g., 'I intend to pray 2 rak’ahs of Fajr').
-    - Qibla: Face the Ka’bah.
-    - Time: Perform within prayer window.
-    
-    **Pillars (Arkan)**:
-    - Takbir al-Ihram: 'Allahu Akbar' to start.
-    - Recite Surah Al-Fatihah: Mandatory in every rak’ah (Hanafi/Shafi’i).
-    - Ruku: Bow with tuma’ninah (calmness, pause for 1-2 seconds).
-    - Sujud: Prostrate twice per rak’ah with tuma’ninah.
-    - Tashahhud: Sit and recite after 2nd and final rak’ah.
-    - Tasleem: 'Assalamu alaikum wa rahmatullah' to end.
-    """
-
-def sunnah_prayers(prayer, madhab):
-    sunnah_muakkadah = {
-        "Fajr": 2, "Dhuhr": 4, "Maghrib": 2, "Isha": 2
-    }
-    return sunnah_muakkadah.get(prayer, 0)
+    if not place:
+        return None
+    return qibla_response(place["latitude"], place["longitude"])
 
 def generate_response(query, results, madhab=None, gender="Male"):
     system_prompt = """
@@ -165,18 +114,11 @@ def generate_response(query, results, madhab=None, gender="Male"):
     if madhab:
         system_prompt += f"\nPrioritize {madhab.capitalize()} madhab rulings."
     
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4-turbo",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"Query: '{query}'\nSources:\n{json.dumps(results, indent=2)}\nGender: {gender}\nProvide a structured answer with references."}
-            ]
-        )
-        return response.choices[0].message.content
-    except Exception as e:
-        st.error(f"Error generating response: {str(e)}")
-        return None
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": f"Query: '{query}'\nSources:\n{json.dumps(results, indent=2)}\nGender: {gender}\nProvide a structured answer with references."}
+    ]
+    return route_and_complete(openai_api_key, query, messages, count_tokens(messages[1]["content"]), on_error=st.error)
 
 # App UI
 st.title("🕌 Salah GPT")
@@ -230,26 +172,29 @@ if query:
         message_placeholder = st.empty()
         message_placeholder.markdown("🤔 Processing...")
         
-        results = []
-        if "wudu" in query.lower():
-            results.append({"source": "Internal", "data": validate_wudu()})
-        if "awrah" in query.lower():
-            results.append({"source": "Internal", "data": awrah_guidance(gender, madhab)})
-        if "salah" in query.lower():
-            results.append({"source": "Internal", "data": salah_validation()})
-        if "sunnah" in query.lower():
-            results.append({"source": "Internal", "data": {p: sunnah_prayers(p, madhab) for p in ["Fajr", "Dhuhr", "Maghrib", "Isha"]}})
+        # Structured questions are answered directly, without searching or the LLM
+        response = fast_answer(query, madhab, city, country, gender, prayer_times=get_prayer_times, qibla=get_qibla_direction)
+        if not response:
+            results = []
+            if "wudu" in query.lower():
+                results.append({"source": "Internal", "data": validate_wudu()})
+            if "awrah" in query.lower():
+                results.append({"source": "Internal", "data": awrah_guidance(gender, madhab)})
+            if "salah" in query.lower():
+                results.append({"source": "Internal", "data": salah_validation()})
+            if "sunnah" in query.lower():
+                results.append({"source": "Internal", "data": {p: sunnah_prayers(p, madhab) for p in ["Fajr", "Dhuhr", "Maghrib", "Isha"]}})
         
-        website_results = search_islamic_websites(query, madhab)
-        if website_results:
-            results.append({"source": "Islamic Websites", "data": website_results})
+            website_results = search_islamic_websites(query, madhab)
+            if website_results:
+                results.append({"source": "Islamic Websites", "data": website_results})
         
-        if city and country and "time" in query.lower():
-            prayer_data = get_prayer_times(city, country, madhab)
-            if prayer_data:
-                results.append({"source": "Prayer Times API", "data": prayer_data["data"]})
+            if city and country and "time" in query.lower():
+                prayer_data = get_prayer_times(city, country, madhab)
+                if prayer_data:
+                    results.append({"source": "Prayer Times API", "data": prayer_data["data"]})
         
-        response = generate_response(query, results, madhab, gender) if results else "Please provide more details or check your API key."
+            response = generate_response(query, results, madhab, gender) if results else "Please provide more details or check your API key."
         message_placeholder.markdown(response)
         st.session_state.messages.append({"role": "assistant", "content": response})
 
@@ -0,0 +1,270 @@
+"""Offline end-to-end benchmark of the chat query pipeline.
+
+Runs the chat handler shared with salah-gpt.py (chat_pipeline.answer_query:
+instant answers, answer cache, concurrent retrieval, prompt context, model
+routing and the OpenAI call through the gateway) against the local stand-ins in
+stand_ins.py: recorded search pages and a mock OpenAI endpoint with
+configurable latency. No network access or API key is needed.
+
+    python benchmarks/bench_pipeline.py
+    python benchmarks/bench_pipeline.py --concurrency 1 8 32 --queries 200
+    python benchmarks/bench_pipeline.py --quick --max-p95 5 --json bench.json   # CI
+
+For every concurrency level it reports p50/p95/p99 query latency,
+throughput, the latency of the main stages and the hit rates of the
+response cache and the answer cache. Caches start empty at each level
+unless --warm is given. The exit status is 1 if any query failed or a
+--max-p95 / --min-throughput limit was not met.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Benchmark against the network fallbacks with an empty semantic store, so
+# runs are reproducible whatever indexes were built locally. These must be
+# set before the app modules are imported.
+_EMPTY_DATA = tempfile.mkdtemp(prefix="salah-gpt-bench-")
+for name in ("SALAH_GPT_HADITH_INDEX", "SALAH_GPT_QURAN_INDEX", "SALAH_GPT_SEMANTIC_INDEX"):
+    os.environ[name] = os.path.join(_EMPTY_DATA, name.lower())
+os.environ["SALAH_GPT_CACHE_DB"] = ""
+os.environ["SALAH_GPT_LOCATION_CACHE"] = ""
+os.environ.setdefault("SALAH_GPT_EMBEDDER", "hashing")
+# The OpenAI gateway's rate limit would dominate the measurement
+os.environ.setdefault("SALAH_GPT_LLM_RPM", "1000000")
+os.environ.setdefault("SALAH_GPT_LLM_BURST", "1000000")
+
+from stand_ins import StandIns  # noqa: E402
+
+import http_client  # noqa: E402
+import metrics  # noqa: E402
+import retrieval  # noqa: E402
+import semantic_index  # noqa: E402
+from answer_cache import ANSWER_CACHE  # noqa: E402
+from chat_pipeline import answer_query  # noqa: E402
+from locations import LOCATION_CACHE  # noqa: E402
+from response_cache import RESPONSE_CACHE  # noqa: E402
+
+# Realistic question mix; popular questions are asked more often (see workload)
+QUERIES = [
+    "How do I pray Fajr?",
+    "how to pray fajr",
+    "What are the conditions for prayer to be valid?",
+    "Does bleeding break wudu?",
+    "Can I combine Dhuhr and Asr while travelling?",
+    "How do I make up missed prayers?",
+    "What are the sunnah prayers before Dhuhr?",
+    "Do the madhabs differ on raising the hands in prayer?",
+    "Is witr prayer obligatory?",
+    "Is praying in congregation obligatory for men?",
+    "What is sujud al-sahw and when do I do it?",
+    "When does the time for Asr begin?",
+    "Should I recite al-Fatihah behind the imam?",
+    "What hadith says prayer is the pillar of the religion?",
+    "Which Quran verses command establishing prayer?",
+    "What does the prophet say about praying on time?",
+    "How many rakahs in Isha?",
+    "What time is Maghrib?",
+    "Which way is the qibla?",
+    "How do I perform wudu?",
+]
+MADHABS = [None, "hanafi", "shafii", "maliki", "hanbali"]
+LOCATION = ("London", "UK")
+STAGES = ["semantic_search", "search_islamic_websites", "fetch_website", "search_sunnah_database", "search_quran", "get_prayer_times", "llm_request"]
+
+def use_stand_ins(stand_ins):
+    """Start stand_ins and point the app's outbound requests and OpenAI client at them"""
+    stand_ins.start()
+    return route_to_stand_ins(stand_ins)
+
+
+def route_to_stand_ins(stand_ins):
+    """Point the app's outbound requests and OpenAI client at stand_ins (started here or in another process)"""
+    os.environ["OPENAI_BASE_URL"] = f"{stand_ins.base_url}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "bench")
+
+    # Send every outbound request to the recorded pages instead of the real sites
+    async def fetch_recorded(url, params=None, as_json=False):
+        return await http_client.fetch(stand_ins.site_url(url), params=params, as_json=as_json)
+    retrieval._fetch = fetch_recorded
+    return stand_ins
+
+
+def workload(count, seed=0):
+    """count (query, madhab) pairs; question i is picked with weight 1/(i+1)"""
+    rng = random.Random(seed)
+    weights = [1 / (i + 1) for i in range(len(QUERIES))]
+    return [(rng.choices(QUERIES, weights)[0], rng.choice(MADHABS)) for _ in range(count)]
+
+
+def answer(query, madhab, city, country, api_key):
+    """One chat query through the app's handler; returns how it was answered"""
+    generation_errors = []
+    text, path, errors = answer_query(api_key, query, madhab, city, country, on_text=lambda text: None, on_error=generation_errors.append)
+    errors = errors + generation_errors
+    if errors or path == "failed":
+        raise RuntimeError("; ".join(errors) or "no answer generated")
+    return path
+
+
+def reset_caches():
+    RESPONSE_CACHE.clear()
+    ANSWER_CACHE.clear()
+    LOCATION_CACHE.clear()
+    with semantic_index._store_lock:
+        semantic_index._store = None
+        semantic_index._site_passages = None
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    position = (len(values) - 1) * q / 100
+    low = int(position)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+
+def cache_rates(before, after):
+    """Response cache hit/stale/miss counts per cached function between two counter snapshots"""
+    rates = {}
+    for labels, value in after.items():
+        delta = value - before.get(labels, 0)
+        if delta:
+            labels = dict(labels)
+            rates.setdefault(labels["function"], {"hit": 0, "stale": 0, "miss": 0})[labels["result"]] += delta
+    return rates
+
+
+def run_level(concurrency, queries, api_key, location):
+    """Run queries with concurrency worker threads (one per simulated session)"""
+    latencies, paths, failures = [], {}, []
+    stage_times = {stage: [] for stage in STAGES + ["generate_response"]}
+    lock = threading.Lock()
+    cache_before = metrics.counter_values("cache_requests_total")
+
+    def one(item):
+        query, madhab = item
+        with metrics.trace() as spans:
+            started = time.perf_counter()
+            try:
+                path = answer(query, madhab, *location, api_key)
+            except Exception as e:
+                path = "error"
+                with lock:
+                    failures.append(f"{query!r}: {str(e)}")
+            elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            paths[path] = paths.get(path, 0) + 1
+            for span in spans:
+                if span["stage"] in stage_times:
+                    stage_times[span["stage"]].append(span["seconds"])
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, queries))
+    wall = time.perf_counter() - started
+
+    answered = len(queries) - paths.get("error", 0)
+    return {
+        "concurrency": concurrency,
+        "queries": len(queries),
+        "seconds": round(wall, 3),
+        "throughput": round(len(queries) / wall, 2),
+        "latency": {f"p{q}": round(percentile(latencies, q), 4) for q in (50, 95, 99)} | {"mean": round(statistics.fmean(latencies), 4)},
+        "stages": {
+            stage: {"calls": len(times), "p50": round(percentile(times, 50), 4), "p95": round(percentile(times, 95), 4)}
+            for stage, times in stage_times.items() if times
+        },
+        "answers": paths,
+        "answer_cache_hit_rate": round(paths.get("cache", 0) / answered, 3) if answered else 0.0,
+        "response_cache": cache_rates(cache_before, metrics.counter_values("cache_requests_total")),
+        "failures": failures[:10],
+    }
+
+
+def print_level(level):
+    latency = level["latency"]
+    print(f"\n== concurrency {level['concurrency']}: {level['queries']} queries in {level['seconds']:.2f}s "
+          f"({level['throughput']:.1f} q/s)")
+    print(f"   latency  p50 {latency['p50'] * 1000:7.0f} ms   p95 {latency['p95'] * 1000:7.0f} ms   "
+          f"p99 {latency['p99'] * 1000:7.0f} ms")
+    print("   answers  " + ", ".join(f"{path} {count}" for path, count in sorted(level["answers"].items()))
+          + f"   (answer cache hit rate {level['answer_cache_hit_rate']:.0%})")
+    for stage, stats in level["stages"].items():
+        print(f"   {stage:<24} {stats['calls']:5d} calls   p50 {stats['p50'] * 1000:7.1f} ms   p95 {stats['p95'] * 1000:7.1f} ms")
+    for function, counts in sorted(level["response_cache"].items()):
+        total = sum(counts.values())
+        print(f"   cache {function:<26} hit {counts['hit'] / total:4.0%}   stale {counts['stale'] / total:4.0%}   "
+              f"miss {counts['miss'] / total:4.0%}   ({total} lookups)")
+    for failure in level["failures"]:
+        print(f"   FAILED {failure}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16], help="simulated sessions per level")
+    parser.add_argument("--queries", type=int, default=100, help="queries per concurrency level")
+    parser.add_argument("--site-latency", type=float, default=0.15, help="mean latency of the recorded sites, seconds")
+    parser.add_argument("--llm-latency", type=float, default=0.4, help="mean time to first token of the mock OpenAI endpoint, seconds")
+    parser.add_argument("--llm-token-delay", type=float, default=0.01, help="delay between streamed chunks, seconds")
+    parser.add_argument("--no-location", action="store_true", help="ask without a city and country")
+    parser.add_argument("--warm", action="store_true", help="keep caches between concurrency levels")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--quick", action="store_true", help="small run for CI: concurrency 1 and 8, 40 queries")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--max-p95", type=float, help="fail if p95 latency at any level exceeds this many seconds")
+    parser.add_argument("--min-throughput", type=float, help="fail if throughput at any level is below this many queries/s")
+    args = parser.parse_args(argv)
+    if args.quick:
+        args.concurrency, args.queries = [1, 8], 40
+
+    stand_ins = use_stand_ins(StandIns(site_latency=args.site_latency, llm_latency=args.llm_latency,
+                                       llm_token_delay=args.llm_token_delay, seed=args.seed))
+
+    location = (None, None) if args.no_location else LOCATION
+    queries = workload(args.queries, args.seed)
+    print(f"Benchmarking {args.queries} queries per level; sites ~{args.site_latency * 1000:.0f} ms, "
+          f"OpenAI ~{args.llm_latency * 1000:.0f} ms to first token")
+
+    levels = []
+    for concurrency in args.concurrency:
+        if not args.warm:
+            reset_caches()
+        level = run_level(concurrency, queries, "bench", location)
+        levels.append(level)
+        print_level(level)
+    stand_ins.stop()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"settings": vars(args), "levels": levels}, f, indent=2)
+
+    failed = False
+    for level in levels:
+        if level["answers"].get("error"):
+            print(f"FAIL: {level['answers']['error']} queries failed at concurrency {level['concurrency']}")
+            failed = True
+        if args.max_p95 is not None and level["latency"]["p95"] > args.max_p95:
+            print(f"FAIL: p95 {level['latency']['p95']:.3f}s > {args.max_p95}s at concurrency {level['concurrency']}")
+            failed = True
+        if args.min_throughput is not None and level["throughput"] < args.min_throughput:
+            print(f"FAIL: {level['throughput']} q/s < {args.min_throughput} q/s at concurrency {level['concurrency']}")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,307 @@
+"""Load test: many concurrent chat sessions against a real Streamlit server.
+
+Starts salah-gpt.py with `streamlit run` in a subprocess and drives it the
+way browsers do: every simulated user opens its own websocket to
+/_stcore/stream and sends rerun requests carrying its widget values, so
+every interaction is a full rerun through the server's own session
+handling (page config, CSS, the timezone component, the sidebar prayer
+panel, geocoding, ...). A session opens the app, sets a location, asks N
+questions and clears the conversation. Outbound requests from the server
+go to the stand-ins in stand_ins.py, so no network access or API key is
+needed.
+
+    python benchmarks/load_sessions.py --sessions 8 --questions 3
+    python benchmarks/load_sessions.py --sessions 1 4 16 --questions 2 --json load.json
+
+Every rerun's wall time, from sending the request until the script
+finished, is recorded by step (open, set location, question, clear)
+together with the bytes the server sent and its RSS, so the report shows
+rerun latency percentiles, reruns per second and memory per session for
+each number of concurrent sessions. Browser-side work is not simulated:
+the timezone component never reports back and periodic panel refreshes
+(auto reruns) are not requested.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+import aiohttp
+from bench_pipeline import LOCATION, QUERIES, ROOT, percentile, route_to_stand_ins
+from stand_ins import StandIns
+
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+APP = os.path.join(ROOT, "salah-gpt.py")
+STEPS = ["open", "location", "question", "clear"]
+SERVER_START_TIMEOUT = 60  # seconds
+
+
+def serve(port, stand_ins_port):
+    """Run the app with `streamlit run` in this process, talking to stand-ins in another one"""
+    route_to_stand_ins(StandIns(port=stand_ins_port))
+    from streamlit.web import cli
+    sys.argv = [
+        "streamlit", "run", APP,
+        "--server.headless=true",
+        f"--server.port={port}",
+        "--server.address=127.0.0.1",
+        "--browser.gatherUsageStats=false",
+        "--server.fileWatcherType=none",
+        "--logger.level=error",
+    ]
+    cli.main()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(stand_ins):
+    """Start a fresh app server; returns (process, base URL) once it is healthy"""
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--serve", str(port), "--stand-ins-port", str(stand_ins.port)],
+        stdout=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while True:
+        if server.poll() is not None:
+            raise RuntimeError(f"streamlit server exited with status {server.returncode}")
+        try:
+            with urllib.request.urlopen(f"{base_url}/_stcore/health", timeout=1) as response:
+                if response.status == 200:
+                    return server, base_url
+        except OSError:
+            pass
+        if time.monotonic() > deadline:
+            stop_server(server)
+            raise RuntimeError(f"streamlit server not healthy after {SERVER_START_TIMEOUT}s")
+        time.sleep(0.2)
+
+
+def stop_server(server):
+    server.terminate()
+    try:
+        server.wait(10)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+
+
+def rss_bytes(pid):
+    """Resident set size of process pid (Linux only; 0 elsewhere)"""
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+class Session:
+    """One simulated browser tab: a websocket plus the values of its widgets"""
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.widgets = {}  # (element type, label) -> widget id
+        self.values = {}  # widget id -> WidgetState kept across reruns
+
+    async def rerun(self, *triggers):
+        """Request a rerun with the kept widget values plus one-shot triggers.
+
+        Waits for the script to finish; returns (bytes received, exception messages).
+        """
+        msg = BackMsg()
+        msg.rerun_script.query_string = ""
+        for state in [*self.values.values(), *triggers]:
+            msg.rerun_script.widget_states.widgets.add().CopyFrom(state)
+        await self.ws.send_bytes(msg.SerializeToString())
+
+        received = 0
+        exceptions = []
+        while True:
+            message = await self.ws.receive()
+            if message.type != aiohttp.WSMsgType.BINARY:
+                raise ConnectionError(f"websocket closed during a rerun ({message.type.name})")
+            received += len(message.data)
+            forward = ForwardMsg()
+            forward.ParseFromString(message.data)
+            kind = forward.WhichOneof("type")
+            if kind == "delta" and forward.delta.WhichOneof("type") == "new_element":
+                element = forward.delta.new_element
+                element_type = element.WhichOneof("type")
+                if element_type == "exception":
+                    exceptions.append(element.exception.message)
+                elif element_type in ("text_input", "chat_input", "button"):
+                    widget = getattr(element, element_type)
+                    self.widgets[element_type, getattr(widget, "label", "")] = widget.id
+            elif kind == "script_finished":
+                if forward.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    exceptions.append("script failed to compile")
+                # The script calls st.rerun() after a question and after clearing
+                if forward.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    return received, exceptions
+
+    def set_text(self, label, value):
+        widget_id = self.widgets["text_input", label]
+        self.values[widget_id] = WidgetState(id=widget_id, string_value=value)
+
+    def chat(self, text):
+        state = WidgetState(id=self.widgets["chat_input", ""])
+        state.chat_input_value.data = text
+        return state
+
+    def click(self, label):
+        return WidgetState(id=self.widgets["button", label], trigger_value=True)
+
+
+async def run_session(http, base_url, pid, number, questions, location, timeout):
+    """Script one user session; returns its list of rerun records"""
+    reruns = []
+    ws_url = base_url.replace("http", "ws", 1) + "/_stcore/stream"
+    async with http.ws_connect(ws_url, protocols=("streamlit",), max_msg_size=0) as ws:
+        session = Session(ws)
+
+        async def rerun(step, *triggers):
+            started = time.perf_counter()
+            received, exceptions = await asyncio.wait_for(session.rerun(*triggers), timeout)
+            reruns.append({
+                "session": number,
+                "step": step,
+                "seconds": time.perf_counter() - started,
+                "bytes": received,
+                "rss": rss_bytes(pid),
+                "exception": exceptions or None,
+            })
+
+        await rerun("open")
+        if location:
+            city, country = location
+            session.set_text("City", city)
+            session.set_text("Country", country)
+            await rerun("location")
+        for question in questions:
+            await rerun("question", session.chat(question))
+        await rerun("clear", session.click("Clear Conversation"))
+    return reruns
+
+
+async def run_sessions(base_url, pid, jobs, location, timeout):
+    async with aiohttp.ClientSession() as http:
+        results = await asyncio.gather(*(
+            run_session(http, base_url, pid, number, questions, location, timeout) for number, questions in jobs
+        ))
+    return [record for records in results for record in records]
+
+
+def run_level(base_url, pid, sessions, questions_per_session, location, timeout, offset):
+    """Run sessions concurrent sessions against the server; returns the level summary"""
+    rss_before = rss_bytes(pid)
+    jobs = []
+    for number in range(sessions):
+        start = (offset + number * questions_per_session) % len(QUERIES)
+        questions = [QUERIES[(start + i) % len(QUERIES)] for i in range(questions_per_session)]
+        jobs.append((number, questions))
+
+    started = time.perf_counter()
+    reruns = asyncio.run(run_sessions(base_url, pid, jobs, location, timeout))
+    wall = time.perf_counter() - started
+
+    steps = {}
+    for step in STEPS:
+        records = [r for r in reruns if r["step"] == step]
+        if records:
+            times = [r["seconds"] for r in records]
+            steps[step] = {
+                "reruns": len(times),
+                **{f"p{q}": round(percentile(times, q), 4) for q in (50, 95, 99)},
+                "max": round(max(times), 4),
+                "kb_per_rerun": round(sum(r["bytes"] for r in records) / len(records) / 1024, 1),
+            }
+    rss_after = max(r["rss"] for r in reruns)
+    return {
+        "sessions": sessions,
+        "seconds": round(wall, 3),
+        "reruns": len(reruns),
+        "reruns_per_second": round(len(reruns) / wall, 2),
+        "steps": steps,
+        "rss_before_mb": round(rss_before / 2 ** 20, 1),
+        "rss_peak_mb": round(rss_after / 2 ** 20, 1),
+        "rss_per_session_kb": round((rss_after - rss_before) / sessions / 1024, 1),
+        "exceptions": [f"session {r['session']} {r['step']}: {r['exception']}" for r in reruns if r["exception"]][:10],
+    }
+
+
+def print_level(level):
+    print(f"\n== {level['sessions']} concurrent sessions: {level['reruns']} reruns in {level['seconds']:.2f}s "
+          f"({level['reruns_per_second']:.1f} reruns/s)")
+    for step, stats in level["steps"].items():
+        print(f"   {step:<9} {stats['reruns']:4d} reruns   p50 {stats['p50'] * 1000:7.0f} ms   "
+              f"p95 {stats['p95'] * 1000:7.0f} ms   p99 {stats['p99'] * 1000:7.0f} ms   max {stats['max'] * 1000:7.0f} ms   "
+              f"{stats['kb_per_rerun']:6.1f} KB sent")
+    print(f"   memory   server RSS {level['rss_before_mb']:.0f} -> {level['rss_peak_mb']:.0f} MB "
+          f"(~{level['rss_per_session_kb']:.0f} KB per session)")
+    for exception in level["exceptions"]:
+        print(f"   EXCEPTION {exception}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 4, 8], help="concurrent sessions per level")
+    parser.add_argument("--questions", type=int, default=3, help="questions asked per session")
+    parser.add_argument("--no-location", action="store_true", help="skip setting the city and country")
+    parser.add_argument("--site-latency", type=float, default=0.15, help="mean latency of the recorded sites, seconds")
+    parser.add_argument("--llm-latency", type=float, default=0.4, help="mean time to first token of the mock OpenAI endpoint, seconds")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds a single rerun may take")
+    parser.add_argument("--warm", action="store_true", help="keep one server, and so its caches, for every level")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--serve", type=int, metavar="PORT", help=argparse.SUPPRESS)
+    parser.add_argument("--stand-ins-port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.serve:
+        serve(args.serve, args.stand_ins_port)
+        return 0
+
+    stand_ins = StandIns(site_latency=args.site_latency, llm_latency=args.llm_latency).start()
+    location = None if args.no_location else LOCATION
+    print(f"Load testing {APP} under streamlit run: {args.questions} questions per session")
+
+    levels = []
+    server = None
+    try:
+        for index, sessions in enumerate(args.sessions):
+            # A fresh server per level starts with empty caches
+            if server is None or not args.warm:
+                if server is not None:
+                    stop_server(server)
+                server, base_url = start_server(stand_ins)
+                # Import the app once before measuring, so memory per session
+                # does not include it
+                asyncio.run(run_sessions(base_url, server.pid, [(-1, [])], None, args.timeout))
+            level = run_level(base_url, server.pid, sessions, args.questions, location, args.timeout, offset=index)
+            levels.append(level)
+            print_level(level)
+    finally:
+        if server is not None:
+            stop_server(server)
+        stand_ins.stop()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"settings": vars(args), "levels": levels}, f, indent=2)
+    return 1 if any(level["exceptions"] for level in levels) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+"""Local stand-ins for the services the query pipeline talks to.
+
+One aiohttp server, run on a daemon thread, serves:
+
+    /site/<host>/...          recorded search pages for the Islamic websites
+                              and sunnah.com (fixtures/*.html)
+    /site/api.quran.com/...   a recorded quran.com search response
+    /v1/chat/completions      an OpenAI-compatible chat endpoint (streaming
+                              and non-streaming) that returns a canned answer
+
+Every response is delayed by a configurable latency with jitter, so the
+benchmark sees realistic waiting without touching the network. Prayer
+times, geocoding and the Qibla are computed locally by the app and need no
+stand-in.
+"""
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+
+from aiohttp import web
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# Host -> recorded page
+SITE_FIXTURES = {
+    "islamqa.info": "islamqa.html",
+    "seekersguidance.org": "seekersguidance.html",
+    "aboutislam.net": "aboutislam.html",
+    "hanafifiqh.org": "hanafifiqh.html",
+    "sunnah.com": "sunnah.html",
+    "api.quran.com": "quran_search.json",
+}
+
+ANSWER = (
+    "## Answer\n\nAccording to the sources found, the prayer is performed with its conditions and pillars: "
+    "purity, facing the Qibla, the intention, standing, recitation of al-Fatihah, bowing, prostration and "
+    "the final sitting. The madhabs differ in some details, which are noted below with their references.\n\n"
+    "- **Hanafi**: see the cited answer.\n- **Shafi'i**: see the cited answer.\n\n"
+    "*Sources: IslamQA, SeekersGuidance, Sahih al-Bukhari.*"
+)
+
+
+class StandIns:
+    """Fixture HTTP server and mock OpenAI endpoint on 127.0.0.1:port.
+
+    site_latency and llm_latency are mean delays in seconds (±jitter);
+    llm_token_delay is the gap between streamed chunks.
+    """
+
+    def __init__(self, port=0, site_latency=0.15, llm_latency=0.4, llm_token_delay=0.01, jitter=0.3, seed=0):
+        self.port = port
+        self.site_latency = site_latency
+        self.llm_latency = llm_latency
+        self.llm_token_delay = llm_token_delay
+        self.jitter = jitter
+        self.requests = {"site": 0, "llm": 0}
+        self._random = random.Random(seed)
+        self._pages = {}
+        for host, name in SITE_FIXTURES.items():
+            with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+                self._pages[host] = f.read()
+        self._loop = None
+        self._runner = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def site_url(self, url):
+        """Rewrite a real site URL to the stand-in"""
+        scheme, _, rest = url.partition("://")
+        return f"{self.base_url}/site/{rest}"
+
+    def _delay(self, mean):
+        return max(0.0, mean * (1 + self._random.uniform(-self.jitter, self.jitter)))
+
+    async def _site(self, request):
+        self.requests["site"] += 1
+        page = self._pages.get(request.match_info["host"])
+        await asyncio.sleep(self._delay(self.site_latency))
+        if page is None:
+            return web.Response(status=404)
+        content_type = "application/json" if page.lstrip().startswith("{") else "text/html"
+        return web.Response(text=page, content_type=content_type)
+
+    async def _chat(self, request):
+        self.requests["llm"] += 1
+        body = await request.json()
+        prompt_tokens = sum(len(m["content"]) for m in body["messages"]) // 4
+        words = ANSWER.split(" ")
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(words), "total_tokens": prompt_tokens + len(words)}
+        await asyncio.sleep(self._delay(self.llm_latency))
+
+        if not body.get("stream"):
+            return web.json_response({
+                "id": "bench", "object": "chat.completion", "created": int(time.time()), "model": body["model"],
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": ANSWER}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for i, word in enumerate(words):
+            chunk = {
+                "id": "bench", "object": "chat.completion.chunk", "created": int(time.time()), "model": body["model"],
+                "choices": [{"index": 0, "delta": {"content": word if i == 0 else " " + word},
+                             "finish_reason": "stop" if i == len(words) - 1 else None}],
+            }
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            await asyncio.sleep(self.llm_token_delay)
+        if (body.get("stream_options") or {}).get("include_usage"):
+            chunk = {"id": "bench", "object": "chat.completion.chunk", "created": int(time.time()), "model": body["model"],
+                     "choices": [], "usage": usage}
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        await response.write(b"data: [DONE]\n\n")
+        return response
+
+    def start(self):
+        """Start serving on a daemon thread; returns self"""
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, name="bench-stand-ins", daemon=True).start()
+        asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+        return self
+
+    async def _start(self):
+        app = web.Application()
+        app.router.add_get("/site/{host}/{path:.*}", self._site)
+        app.router.add_post("/v1/chat/completions", self._chat)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    def stop(self):
+        if self._runner is not None:
+            asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
@@ -0,0 +1,150 @@
+"""The chat request handler.
+
+Answers one question the way the chat box in salah-gpt.py does: instant
+answers first, then the answer cache, then concurrent retrieval and the
+OpenAI call (routed and escalated by model_router). It has no UI of its
+own; callers pass callbacks for streamed text, errors and progress, so the
+app and benchmarks/bench_pipeline.py run exactly the same code.
+"""
+import re
+from contextlib import nullcontext
+
+from langdetect import DetectorFactory, detect
+
+import metrics
+from answer_cache import ANSWER_CACHE, ANSWER_CACHE_LOCATION_TTL, ANSWER_CACHE_TTL, answer_bucket
+from context_builder import build_context, count_tokens
+from fast_answers import fast_answer
+from llm_gateway import chat
+from model_router import LARGE_MODEL, escalation_reason, route_model
+from retrieval import gather_sources, get_prayer_schedule, get_prayer_times, get_qibla_direction, retry_request, run_retrieval, uses_location
+
+# langdetect often misreads short English questions ("How do I pray Fajr?" as
+# Polish), so ASCII queries containing common English words count as English
+ENGLISH_HINTS = {"how", "what", "when", "why", "where", "which", "who", "is", "are", "do", "does", "can", "should", "the", "to", "i", "my", "many", "much"}
+
+# Make langdetect deterministic, so a query always gets the same language
+DetectorFactory.seed = 0
+
+def detect_language(text):
+    """Detect the language of the input text."""
+    if text.isascii() and ENGLISH_HINTS & set(re.findall(r"[a-z]+", text.lower())):
+        return "en"
+    try:
+        return detect(text)
+    except:
+        return "en"  # Default to English if detection fails
+
+def build_messages(query, results, madhab=None, query_language="en"):
+    """Chat messages for the OpenAI call: system prompt plus the question and its sources"""
+    # Create system prompt based on madhab preference and detected language
+    system_prompt = f"""
+    You are Salah GPT, an Islamic AI assistant specializing in prayer (Salah) guidance.
+    When providing information:
+    1. Always give accurate information according to authentic Islamic sources
+    2. Cite Quran verses and Hadith when applicable
+    3. Be respectful and maintain Islamic etiquette in responses
+    4. Provide detailed step-by-step guidance when asked about prayer procedures
+    5. Acknowledge differences between madhabs (schools of thought)
+    6. Include references to the websites or sources where information was found
+    7. Format your response in a clear, organized way with headings and bullet points when appropriate
+    8. Respond in the same language as the user's query. The user's query is in {query_language}, so respond in {query_language}.
+    """
+    if madhab:
+        system_prompt += f"\nThe user follows the {madhab.capitalize()} madhab, so prioritize rulings according to this school of thought while acknowledging others when relevant."
+
+    context = build_context(query, results)
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": f"The user asked: '{query}'\n\nHere are the relevant sources I've found:\n{context}\n\nProvide a structured, easy-to-understand answer with references. If there are differences between madhabs on this topic, explain them respectfully. Make sure to cite sources where information was found."}
+    ]
+    return messages, context
+
+@metrics.timed()
+@retry_request
+def generate_response(api_key, query, results, madhab=None, on_text=None, on_error=print):
+    """Generate response using OpenAI in the same language as the query.
+
+    on_text is called with the text so far while the completion streams.
+    Errors are reported through on_error; None is returned if no answer
+    could be generated. The model is picked per question by model_router.
+    """
+    if not api_key:
+        on_error("Please provide an OpenAI API key to generate responses.")
+        return None
+
+    messages, context = build_messages(query, results, madhab, detect_language(query))
+    return route_and_complete(api_key, query, messages, count_tokens(context), on_text=on_text, on_error=on_error)
+
+def route_and_complete(api_key, query, messages, context_tokens, on_text=None, on_error=print):
+    """Answer messages with the model picked by model_router, escalating weak answers.
+
+    Simple questions go to the small model; its answer is retried on the
+    large model when escalation_reason finds it weak or the call fails.
+    Errors are reported through on_error; returns the answer text or None.
+    """
+    model, reason = route_model(query, context_tokens)
+    if metrics.TRACE_QUERIES:
+        print(f"Model route: {model} ({reason})")
+    try:
+        answer, finish_reason = chat(api_key, model, messages, on_text=on_text)
+        escalation = escalation_reason(model, answer, finish_reason)
+    except Exception as e:
+        if model == LARGE_MODEL:
+            on_error(f"Error generating response: {str(e)}")
+            return None
+        answer, escalation = None, f"error from {model}: {str(e)}"
+
+    if escalation:
+        if metrics.TRACE_QUERIES:
+            print(f"Model route: escalating to {LARGE_MODEL} ({escalation})")
+        try:
+            answer, _ = chat(api_key, LARGE_MODEL, messages, on_text=on_text)
+        except Exception as e:
+            on_error(f"Error generating response: {str(e)}")
+            # A weak answer from the small model beats none at all
+            if not answer:
+                return None
+    return answer
+
+def answer_query(api_key, query, madhab=None, city=None, country=None, on_text=None, on_error=print, status=nullcontext):
+    """Answer one chat question; returns (answer, path, errors).
+
+    path is how it was answered: "fast", "cache" or "generated", or
+    "no results" when retrieval found nothing and "failed" when no answer
+    could be generated (answer is None for both). errors are the retrieval
+    errors. status(message) is entered around the slow steps, e.g. st.spinner.
+    """
+    # Structured questions (prayer times, Qibla, rak'ahs, ...) are answered directly
+    with metrics.span("fast_answer"):
+        answer = fast_answer(query, madhab, city, country, prayer_times=get_prayer_times, qibla=get_qibla_direction, prayer_schedule=get_prayer_schedule)
+    if answer:
+        metrics.count("answers_total", help="Chat answers by how they were produced", path="fast")
+        return answer, "fast", []
+
+    # Rephrasings of an earlier question are answered from the answer cache
+    location = f"{city}, {country}" if uses_location(query, city, country) else None
+    bucket = answer_bucket(madhab, detect_language(query), location)
+    with metrics.span("answer_cache"):
+        answer = ANSWER_CACHE.get(query, bucket)
+    if answer:
+        metrics.count("answers_total", help="Chat answers by how they were produced", path="cache")
+        return answer, "cache", []
+
+    results, errors = [], []
+    try:
+        # Query all relevant sources concurrently within one deadline
+        with status("Searching Islamic sources..."):
+            results, errors = run_retrieval(gather_sources(query, madhab, city, country))
+    except Exception as e:
+        errors.append(f"Error searching Islamic sources: {str(e)}")
+    if not results:
+        return None, "no results", errors
+
+    with status("Generating response..."):
+        answer = generate_response(api_key, query, results, madhab, on_text=on_text, on_error=on_error)
+    if not answer:
+        return None, "failed", errors
+    metrics.count("answers_total", help="Chat answers by how they were produced", path="generated")
+    ANSWER_CACHE.set(query, bucket, answer, ttl=ANSWER_CACHE_LOCATION_TTL if location else ANSWER_CACHE_TTL)
+    return answer, "generated", errors
@@ -0,0 +1,149 @@
+"""Token-budgeted source context for the LLM prompt.
+
+Flattens the gathered results into one line per source item, drops
+duplicates, ranks items by overlap with the query and packs as many as fit
+in the token budget. Prayer time and Qibla data are reduced to the fields an
+answer needs and always come first.
+"""
+import json
+import math
+import os
+import re
+
+from text_index import english_arabic_analyzer
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("SALAH_GPT_CONTEXT_TOKENS", "2000"))
+ITEM_MAX_TOKENS = 200  # a single snippet never takes more than this
+TOKENIZER_ENCODING = "cl100k_base"  # gpt-4 / gpt-4-turbo / gpt-3.5-turbo
+
+PRAYER_TIMINGS = ["Fajr", "Sunrise", "Dhuhr", "Asr", "Maghrib", "Isha"]
+
+# Small tie-breaking preference between sources of equal relevance
+SOURCE_WEIGHTS = {
+    "Quran API": 0.3,
+    "Hadith Database": 0.2,
+    "Semantic Search": 0.1,
+    "Islamic Websites": 0.0,
+}
+
+_encoding = None
+
+
+def count_tokens(text):
+    """Token count with tiktoken when available, otherwise about 4 characters per token"""
+    global _encoding
+    if tiktoken is not None and _encoding is None:
+        try:
+            _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+        except Exception:
+            # The encoding file could not be loaded (e.g. offline); use the estimate
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text))
+    return math.ceil(len(text) / 4)
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut text at a word boundary so it fits in max_tokens"""
+    if count_tokens(text) <= max_tokens:
+        return text
+    words = text.split()
+    low, high = 0, len(words)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(" ".join(words[:middle]) + " …") <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return " ".join(words[:low]) + " …"
+
+
+def _clean(text):
+    return " ".join(str(text or "").split())
+
+
+def _items(results):
+    """Yield (source, label, text, reference, prior) for every item in the gathered results"""
+    for result in results:
+        source, data = result["source"], result["data"]
+        if source == "Islamic Websites":
+            for site in data:
+                for position, item in enumerate(site["results"]):
+                    text = f"{_clean(item['title'])}. {_clean(item['snippet'])}"
+                    yield source, site["source"], text, item["link"], -0.01 * position
+        elif source == "Hadith Database":
+            for position, hadith in enumerate(data):
+                yield source, hadith["collection"], _clean(hadith["text"]), hadith["reference"], -0.01 * position
+        elif source == "Quran API":
+            for position, verse in enumerate(data["verses"]):
+                translations = verse.get("translations") or []
+                text = _clean(translations[0]["text"] if translations else verse.get("text"))
+                # quran.com marks matches and footnotes with HTML tags
+                text = re.sub(r"<[^>]+>", "", text)
+                yield source, "Quran", text, f"Quran {verse['verse_key']}", -0.01 * position
+        elif source == "Semantic Search":
+            for passage in data:
+                yield source, passage["source"], _clean(passage["text"]), passage.get("link") or passage["reference"], passage["score"] - 1
+        else:
+            yield source, source, json.dumps(data, ensure_ascii=False, separators=(",", ":")), "", 0
+
+
+def _structured_lines(results):
+    """Compact lines for prayer time and Qibla data"""
+    lines = []
+    for result in results:
+        data = result["data"]
+        if result["source"] == "Prayer Times API":
+            timings = ", ".join(f"{name} {data['timings'][name]}" for name in PRAYER_TIMINGS if name in data["timings"])
+            timezone = data.get("meta", {}).get("timezone", "")
+            lines.append(f"Prayer times for {data['date']['readable']} ({timezone}): {timings}")
+        elif result["source"] == "Qibla":
+            line = f"Qibla: {data['direction']:.1f}° from North"
+            if "distance" in data:
+                line += f", {data['distance']:,.0f} km to Makkah"
+            lines.append(line)
+    return lines
+
+
+def _dedupe_key(text):
+    return re.sub(r"\W+", " ", text.casefold()).strip()
+
+
+def build_context(query, results, budget=CONTEXT_TOKEN_BUDGET):
+    """Serialize gathered results into a compact, deduplicated, ranked context within budget tokens"""
+    lines = _structured_lines(results)
+    used = sum(count_tokens(line) + 1 for line in lines)
+
+    query_terms = set(english_arabic_analyzer(query))
+    candidates = []
+    seen = set()
+    for source, label, text, reference, prior in _items([r for r in results if r["source"] not in ("Prayer Times API", "Qibla")]):
+        key = _dedupe_key(text)
+        # The same page often comes back from several sites or searches
+        link = reference if reference.startswith("http") else None
+        if not key or key in seen or (link and link in seen):
+            continue
+        seen.add(key)
+        if link:
+            seen.add(link)
+
+        overlap = len(query_terms & set(english_arabic_analyzer(text))) / len(query_terms) if query_terms else 0
+        candidates.append((overlap + SOURCE_WEIGHTS.get(source, 0) + prior, label, text, reference))
+
+    candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+    number = 0
+    for _, label, text, reference in candidates:
+        suffix = f" ({reference})" if reference else ""
+        line = f"[{number + 1}] {label}: {truncate_to_tokens(text, ITEM_MAX_TOKENS)}{suffix}"
+        tokens = count_tokens(line) + 1
+        if used + tokens > budget:
+            continue
+        lines.append(line)
+        used += tokens
+        number += 1
+    return "\n".join(lines)
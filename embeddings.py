@@ -0,0 +1,105 @@
+"""CPU-only text embeddings for semantic search.
+
+A sentence-transformers model is used when the package is installed and the
+model can be loaded locally (SALAH_GPT_EMBEDDING_MODEL). Otherwise texts
+are embedded with a dependency-free hashing embedder: stemmed words and
+word bigrams are hashed into a fixed number of signed buckets. It captures
+vocabulary overlap rather than meaning, but it is deterministic, fast and
+needs no model download. All embeddings are L2-normalized float32, so a dot
+product is the cosine similarity.
+"""
+import os
+import threading
+import zlib
+
+import numpy as np
+
+from text_index import english_arabic_analyzer
+
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    SentenceTransformer = None
+
+# "hashing" or "sentence-transformers"; empty picks sentence-transformers if installed
+EMBEDDER = os.getenv("SALAH_GPT_EMBEDDER", "")
+EMBEDDING_MODEL = os.getenv("SALAH_GPT_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+HASHING_DIMENSIONS = 512
+EMBEDDING_BATCH_SIZE = 64
+
+
+def _normalize_rows(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class HashingEmbedder:
+    """Feature-hashing embedder over stemmed words and word bigrams"""
+
+    # Shared vocabulary, not meaning: a close match has to repeat most of the words
+    min_score = 0.5
+
+    def __init__(self, dimensions=HASHING_DIMENSIONS):
+        self.dimensions = dimensions
+        self.name = f"hashing-{dimensions}"
+
+    def _features(self, text):
+        words = english_arabic_analyzer(text)
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def embed(self, texts):
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                # crc32 rather than hash() so vectors are stable across processes
+                bucket = zlib.crc32(feature.encode("utf-8"))
+                sign = 1.0 if bucket & 0x80000000 else -1.0
+                vectors[row, bucket % self.dimensions] += sign
+        # Sublinear term frequency, then unit length
+        vectors = np.sign(vectors) * np.log1p(np.abs(vectors))
+        return _normalize_rows(vectors)
+
+
+class SentenceTransformerEmbedder:
+    """sentence-transformers model run on the CPU"""
+
+    min_score = 0.6
+
+    def __init__(self, model_name=EMBEDDING_MODEL):
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dimensions = self.model.get_sentence_embedding_dimension()
+        self.name = model_name
+
+    def embed(self, texts):
+        vectors = self.model.encode(
+            list(texts), batch_size=EMBEDDING_BATCH_SIZE, convert_to_numpy=True, normalize_embeddings=True
+        )
+        return vectors.astype(np.float32)
+
+
+_embedder = None
+_embedder_lock = threading.Lock()
+
+
+def get_embedder():
+    """Return the process-wide embedder, loading the model on first use"""
+    global _embedder
+    if _embedder is None:
+        with _embedder_lock:
+            if _embedder is None:
+                _embedder = _load_embedder()
+    return _embedder
+
+
+def _load_embedder():
+    if EMBEDDER != "hashing" and SentenceTransformer is not None:
+        try:
+            return SentenceTransformerEmbedder()
+        except Exception as e:
+            print(f"Could not load embedding model {EMBEDDING_MODEL}, using hashing embeddings: {str(e)}")
+    return HashingEmbedder()
+
+
+def embed(texts):
+    """Embed a list of texts as an (n, dimensions) float32 array of unit vectors"""
+    return get_embedder().embed(texts)
@@ -0,0 +1,236 @@
+"""Deterministic answers for structured questions.
+
+A small rule-based intent classifier recognizes questions that can be
+answered from local data (today's prayer times, the Qibla, rak'ah counts,
+wudu steps and awrah) and renders the answer directly, without searching
+the web or calling the LLM. Anything else, including questions that only
+mention these topics ("does bleeding break wudu?"), is left to the full
+pipeline.
+"""
+import re
+from datetime import datetime
+
+import pytz
+
+from prayer_times import format_countdown
+
+PRAYERS = ["Fajr", "Dhuhr", "Asr", "Maghrib", "Isha"]
+PRAYER_ALIASES = {"fajr": "Fajr", "subh": "Fajr", "dhuhr": "Dhuhr", "zuhr": "Dhuhr", "duhr": "Dhuhr", "asr": "Asr", "maghrib": "Maghrib", "isha": "Isha", "esha": "Isha"}
+PRAYER_RE = re.compile(r"\b(" + "|".join(PRAYER_ALIASES) + r")\b")
+
+FARD_RAKAHS = {"Fajr": 2, "Dhuhr": 4, "Asr": 4, "Maghrib": 3, "Isha": 4}
+
+WUDU_STEPS = [
+    "Wash hands 3 times",
+    "Rinse mouth 3 times",
+    "Clean nose 3 times",
+    "Wash face 3 times",
+    "Wash arms up to elbows 3 times",
+    "Wipe head once",
+    "Wash feet up to ankles 3 times"
+]
+
+AWRAH = {
+    "Hanafi": {"Male": "Navel to knees", "Female": "Entire body except face, hands, and feet"},
+    "Shafii": {"Male": "Navel to knees", "Female": "Entire body except face and hands"},
+    "Maliki": {"Male": "Navel to knees", "Female": "Entire body except face and hands"},
+    "Hanbali": {"Male": "Navel to knees", "Female": "Entire body except face and hands"}
+}
+
+# Confirmed sunnah (rawatib) per madhab as (before, after) the fard. The
+# Malikis hold only the two before Fajr (raghibah) as confirmed; the other
+# voluntary prayers around the fard are recommended without a fixed number.
+SUNNAH_MUAKKADAH = {
+    "Hanafi": {"Fajr": (2, 0), "Dhuhr": (4, 2), "Maghrib": (0, 2), "Isha": (0, 2)},
+    "Shafii": {"Fajr": (2, 0), "Dhuhr": (2, 2), "Maghrib": (0, 2), "Isha": (0, 2)},
+    "Maliki": {"Fajr": (2, 0)},
+    "Hanbali": {"Fajr": (2, 0), "Dhuhr": (2, 2), "Maghrib": (0, 2), "Isha": (0, 2)}
+}
+
+# Intent patterns, checked in order. A question matching EXCLUDE_RE asks
+# about a ruling or a special case and always goes to the full pipeline.
+INTENT_PATTERNS = [
+    ("qibla", re.compile(r"\b(qibla|qiblah|kiblat)\b.*\b(direction|way|where|find|face|facing|degrees?)\b|\b(direction|way|where|find)\b.*\b(qibla|qiblah|kiblat)\b")),
+    ("rakahs", re.compile(r"\bhow many\b.*\b(rak'?ahs?|rak'?ats?|raka'?at|raka|units|cycles)\b")),
+    ("prayer_time", re.compile(r"\b(what time|when)\b.*\b(" + "|".join(PRAYER_ALIASES) + r")\b|\bprayer times?\b.*\b(today|now)\b|\b(today'?s|todays) prayer times?\b|\b(" + "|".join(PRAYER_ALIASES) + r")\b (prayer )?time\b|\bnext prayer\b")),
+    ("wudu", re.compile(r"\b(how (do|to|should|can) (i |you |we |one )?(perform|make|do|take)|steps? (of|for|to)|method of|procedure)\b.*\b(wudu|wudhu|wudoo|ablution)\b|\b(wudu|wudhu|wudoo|ablution) (steps|procedure|method)\b")),
+    ("awrah", re.compile(r"\b(what|which|how much|define|definition)\b.*\b(awrah|awra|aurat|satr)\b|^\W*(awrah|awra|aurat|satr)\b")),
+]
+# Questions about when a prayer ends or may not be prayed, fasting times and
+# travel have different answers from the prayer's start time or rak'ah count.
+EXCLUDE_RE = re.compile(
+    r"\b(break|breaks|invalidate|invalidates|nullify|nullifies|missed|miss|forgot|forget|if|while|during|"
+    r"travel\w*|musafir|safar|combine|shorten|qasr|sick|makeup|qada|jumu'?ah|friday|eid|janazah|taraweeh|tarawih|witr|why|"
+    r"end|ends|ending|last|latest|until|till|expire|expires|stop|makruh|makrooh|disliked|forbidden|prohibited|haram|"
+    r"suhoor|suhur|sehri|sahur|iftar|ramadan|fast|fasting)\b"
+)
+
+NEXT_PRAYER_RE = re.compile(r"\bnext prayer\b")
+
+FEMALE_RE = re.compile(r"\b(woman|women|female|females|girl|girls|sister|sisters|wife|lady|ladies)\b")
+MALE_RE = re.compile(r"\b(man|men|male|males|boy|boys|brother|brothers|husband)\b")
+
+
+def classify_intent(query):
+    """Return (intent, entities) for a structured question, or (None, {})"""
+    lowered = (query or "").lower().replace("’", "'")
+    if not lowered or EXCLUDE_RE.search(lowered):
+        return None, {}
+
+    for intent, pattern in INTENT_PATTERNS:
+        if pattern.search(lowered):
+            entities = {}
+            prayer = PRAYER_RE.search(lowered)
+            if prayer:
+                entities["prayer"] = PRAYER_ALIASES[prayer.group(1)]
+            if intent == "prayer_time" and NEXT_PRAYER_RE.search(lowered):
+                entities["next"] = True
+            female, male = FEMALE_RE.search(lowered), MALE_RE.search(lowered)
+            if female and male:
+                # "a man in front of his wife": whose ruling is asked needs reading, not a keyword
+                return None, {}
+            if female:
+                entities["gender"] = "Female"
+            elif male:
+                entities["gender"] = "Male"
+            return intent, entities
+    return None, {}
+
+
+def validate_wudu():
+    return "\n".join([f"- {step}" for step in WUDU_STEPS]) + "\n\n**Note**: Ensure water reaches all required areas, maintain order (Hanafi/Shafi’i), and make niyyah (intention)."
+
+
+def awrah_guidance(gender, madhab):
+    madhab = madhab.capitalize() if madhab else "Hanafi"  # Default to Hanafi
+    return AWRAH.get(madhab, AWRAH["Hanafi"])[gender.capitalize()]
+
+
+def salah_validation():
+    return """
+    **Salah Prerequisites**:
+    - Wudu: Complete ablution (see steps above).
+    - Purity: Clean body, clothes, and place of prayer.
+    - Niyyah: Intention in heart for specific prayer (e.g., 'I intend to pray 2 rak’ahs of Fajr').
+    - Qibla: Face the Ka’bah.
+    - Time: Perform within prayer window.
+
+    **Pillars (Arkan)**:
+    - Takbir al-Ihram: 'Allahu Akbar' to start.
+    - Recite Surah Al-Fatihah: Mandatory in every rak’ah (Hanafi/Shafi’i).
+    - Ruku: Bow with tuma’ninah (calmness, pause for 1-2 seconds).
+    - Sujud: Prostrate twice per rak’ah with tuma’ninah.
+    - Tashahhud: Sit and recite after 2nd and final rak’ah.
+    - Tasleem: 'Assalamu alaikum wa rahmatullah' to end.
+    """
+
+
+def sunnah_rakahs(prayer, madhab):
+    """(before, after) confirmed sunnah rak'ahs of a prayer in a madhab"""
+    madhab = madhab.capitalize() if madhab else "Hanafi"  # Default to Hanafi
+    return SUNNAH_MUAKKADAH.get(madhab, SUNNAH_MUAKKADAH["Hanafi"]).get(prayer, (0, 0))
+
+
+def sunnah_prayers(prayer, madhab):
+    return sum(sunnah_rakahs(prayer, madhab))
+
+
+def _next_prayer_answer(madhab, city, country, prayer_schedule):
+    schedule = prayer_schedule(city, country, madhab)
+    if not schedule:
+        return None
+    now = datetime.now(pytz.utc).timestamp()
+    status = schedule.status(now)
+    if status["next"] == "Sunrise":
+        # Sunrise ends Fajr's time; it is not a prayer
+        status = schedule.status(status["next_start"])
+    if not status["next"]:
+        return None
+    starts = datetime.fromtimestamp(status["next_start"], pytz.timezone(schedule.timezone_name))
+    return (f"The next prayer in {city}, {country} is **{status['next']}** at **{starts.strftime('%H:%M')}**, "
+            f"in {format_countdown(status['next_start'] - now)}.")
+
+
+def _prayer_time_answer(entities, madhab, city, country, prayer_times, prayer_schedule):
+    if not (city and country):
+        return None
+    if entities.get("next"):
+        return _next_prayer_answer(madhab, city, country, prayer_schedule) if prayer_schedule else None
+    if not prayer_times:
+        return None
+    prayer_data = prayer_times(city, country, madhab)
+    if not prayer_data or prayer_data.get("code") != 200:
+        return None
+    timings = prayer_data["data"]["timings"]
+    date = prayer_data["data"]["date"]["readable"]
+    prayer = entities.get("prayer")
+    if prayer:
+        return f"**{prayer}** in {city}, {country} on {date} is at **{timings[prayer]}**."
+    lines = [f"**Prayer times for {city}, {country}** ({date}):", ""]
+    lines += [f"- **{name}**: {timings[name]}" for name in ["Fajr", "Sunrise", "Dhuhr", "Asr", "Maghrib", "Isha"]]
+    return "\n".join(lines)
+
+
+def _qibla_answer(city, country, qibla):
+    if not (city and country and qibla):
+        return None
+    qibla_data = qibla(city, country)
+    if not qibla_data or qibla_data.get("code") != 200:
+        return None
+    data = qibla_data["data"]
+    answer = f"The Qibla from {city}, {country} is **{data['direction']:.1f}° from North** (clockwise)"
+    if "distance" in data:
+        answer += f", {data['distance']:,.0f} km to the Ka’bah in Makkah"
+    return answer + "."
+
+
+def _sunnah_cell(prayer, madhab):
+    before, after = sunnah_rakahs(prayer, madhab)
+    parts = [f"{before} before"] if before else []
+    if after:
+        parts.append(f"{after} after")
+    return ", ".join(parts) or "-"
+
+
+def _rakahs_answer(entities, madhab):
+    prayers = [entities["prayer"]] if "prayer" in entities else PRAYERS
+    school = madhab.capitalize() if madhab else "Hanafi"
+    lines = ["| Prayer | Fard | Sunnah mu’akkadah |", "|---|---|---|"]
+    for prayer in prayers:
+        lines.append(f"| {prayer} | {FARD_RAKAHS[prayer]} | {_sunnah_cell(prayer, madhab)} |")
+    lines += ["", f"Sunnah rak’ahs follow the {school} madhab; the other schools count them differently."]
+    return "\n".join(lines)
+
+
+def _awrah_answer(entities, madhab, gender):
+    gender = entities.get("gender", gender)
+    genders = [gender] if gender else ["Male", "Female"]
+    school = madhab.capitalize() if madhab else "Hanafi"
+    lines = [f"**Awrah in prayer ({school} madhab)**:"]
+    lines += [f"- **{gender}**: {awrah_guidance(gender, madhab)}" for gender in genders]
+    return "\n".join(lines)
+
+
+def fast_answer(query, madhab=None, city=None, country=None, gender=None, prayer_times=None, qibla=None, prayer_schedule=None):
+    """Answer a structured question directly, or return None to use the full pipeline.
+
+    A gender mentioned in the question takes precedence over gender; with
+    neither, awrah is given for both.
+
+    prayer_times(city, country, madhab) and qibla(city, country) return
+    Aladhan-shaped responses, and prayer_schedule(city, country, madhab) a
+    prayer_times.PrayerSchedule for "next prayer" questions; without them (or a
+    location) the prayer time and Qibla intents fall through to the full pipeline.
+    """
+    intent, entities = classify_intent(query)
+    if intent == "prayer_time":
+        return _prayer_time_answer(entities, madhab, city, country, prayer_times, prayer_schedule)
+    if intent == "qibla":
+        return _qibla_answer(city, country, qibla)
+    if intent == "rakahs":
+        return _rakahs_answer(entities, madhab)
+    if intent == "wudu":
+        return "**Steps of wudu**:\n\n" + validate_wudu()
+    if intent == "awrah":
+        return _awrah_answer(entities, madhab, gender)
+    return None
@@ -0,0 +1,201 @@
+"""Offline city gazetteer.
+
+Resolves a (city, country) pair typed in the sidebar to coordinates and an
+IANA timezone without any network request. The bundled data is generated
+from the GeoNames cities15000 and countryInfo dumps (CC BY 4.0):
+
+    python gazetteer.py build cities15000.txt countryInfo.txt
+"""
+import csv
+import difflib
+import gzip
+import os
+import re
+import sys
+import threading
+import unicodedata
+from array import array
+from bisect import bisect_left
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+CITIES_PATH = os.path.join(DATA_DIR, "cities.tsv.gz")
+CITY_INDEX_PATH = os.path.join(DATA_DIR, "city_index.tsv.gz")
+COUNTRIES_PATH = os.path.join(DATA_DIR, "countries.tsv")
+
+# Minimum similarity for a fuzzy city match (difflib ratio)
+FUZZY_CUTOFF = 0.8
+
+# Common ways of writing a country that are not in the GeoNames country names
+COUNTRY_ALIASES = {
+    "uk": "GB", "england": "GB", "scotland": "GB", "wales": "GB", "britain": "GB", "great britain": "GB",
+    "usa": "US", "us": "US", "america": "US", "united states of america": "US",
+    "uae": "AE", "emirates": "AE",
+    "ksa": "SA", "saudi": "SA",
+    "russia": "RU", "south korea": "KR", "north korea": "KP", "korea": "KR",
+    "iran": "IR", "syria": "SY", "turkey": "TR", "turkiye": "TR", "vietnam": "VN",
+    "palestine": "PS", "czech republic": "CZ", "ivory coast": "CI", "holland": "NL",
+    "bosnia": "BA", "macedonia": "MK", "congo": "CD", "drc": "CD", "tanzania": "TZ",
+}
+
+
+def normalize(text):
+    """Case-fold, strip accents and punctuation, and collapse whitespace"""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).casefold()
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+class Gazetteer:
+    """Array-backed city index with exact and fuzzy lookup.
+
+    The index file holds one "normalized name|country code" key per city name
+    or alternate name, already sorted and pointing at the most populous city
+    of that name, so loading is a straight read and an exact lookup is a
+    binary search. City coordinates and timezones live in parallel arrays.
+    Fuzzy lookup compares against the names of the requested country only.
+    """
+
+    def __init__(self, cities_path=CITIES_PATH, index_path=CITY_INDEX_PATH, countries_path=COUNTRIES_PATH):
+        self._country_codes = {}  # normalized country name/code -> ISO code
+        with open(countries_path, encoding="utf-8", newline="") as f:
+            for code, code3, name in csv.reader(f, delimiter="\t"):
+                for alias in (code, code3, name):
+                    self._country_codes[normalize(alias)] = code
+        for alias, code in COUNTRY_ALIASES.items():
+            self._country_codes.setdefault(alias, code)
+
+        self._names = []
+        self._latitudes = array("d")
+        self._longitudes = array("d")
+        self._timezone_ids = array("H")
+        self._timezones = []
+        tz_index = {}
+        with gzip.open(cities_path, "rt", encoding="utf-8") as f:
+            for line in f:
+                name, lat, lon, tz = line.rstrip("\n").split("\t")
+                if tz not in tz_index:
+                    tz_index[tz] = len(self._timezones)
+                    self._timezones.append(tz)
+                self._names.append(name)
+                self._latitudes.append(float(lat))
+                self._longitudes.append(float(lon))
+                self._timezone_ids.append(tz_index[tz])
+
+        self._keys = []
+        self._city_ids = array("I")
+        self._names_by_country = {}
+        with gzip.open(index_path, "rt", encoding="utf-8") as f:
+            for line in f:
+                key, city_id = line.rstrip("\n").split("\t")
+                self._keys.append(key)
+                self._city_ids.append(int(city_id))
+                name, _, code = key.rpartition("|")
+                self._names_by_country.setdefault(code, []).append(name)
+
+    def __len__(self):
+        return len(self._names)
+
+    def country_code(self, country):
+        """Resolve a country name, alias or ISO code to its ISO 3166 alpha-2 code"""
+        return self._country_codes.get(normalize(country))
+
+    def lookup(self, city, country, fuzzy=True):
+        """Find a city in a country.
+
+        Returns {"name", "country_code", "latitude", "longitude", "timezone"}
+        or None if there is no exact match and no close enough fuzzy match.
+        """
+        code = self.country_code(country)
+        key = normalize(city)
+        if not code or not key:
+            return None
+
+        city_id = self._find(f"{key}|{code}")
+        if city_id is None and fuzzy:
+            matches = difflib.get_close_matches(key, self._names_by_country.get(code, []), n=1, cutoff=FUZZY_CUTOFF)
+            if matches:
+                city_id = self._find(f"{matches[0]}|{code}")
+        if city_id is None:
+            return None
+
+        return {
+            "name": self._names[city_id],
+            "country_code": code,
+            "latitude": self._latitudes[city_id],
+            "longitude": self._longitudes[city_id],
+            "timezone": self._timezones[self._timezone_ids[city_id]],
+        }
+
+    def _find(self, full_key):
+        position = bisect_left(self._keys, full_key)
+        if position < len(self._keys) and self._keys[position] == full_key:
+            return self._city_ids[position]
+        return None
+
+
+_gazetteer = None
+_gazetteer_lock = threading.Lock()
+
+
+def get_gazetteer():
+    """Return the process-wide gazetteer, loading it on first use"""
+    global _gazetteer
+    if _gazetteer is None:
+        with _gazetteer_lock:
+            if _gazetteer is None:
+                _gazetteer = Gazetteer()
+    return _gazetteer
+
+
+def lookup_city(city, country):
+    """Resolve a city with the shared gazetteer (see Gazetteer.lookup)"""
+    return get_gazetteer().lookup(city, country)
+
+
+def build(cities_dump, country_info, cities_path=CITIES_PATH, index_path=CITY_INDEX_PATH, countries_path=COUNTRIES_PATH):
+    """Build the bundled gazetteer files from GeoNames dump files"""
+    os.makedirs(os.path.dirname(cities_path), exist_ok=True)
+
+    with open(country_info, encoding="utf-8") as src, open(countries_path, "w", encoding="utf-8", newline="") as dst:
+        writer = csv.writer(dst, delimiter="\t", lineterminator="\n")
+        for line in src:
+            if line.startswith("#") or not line.strip():
+                continue
+            fields = line.rstrip("\n").split("\t")
+            writer.writerow([fields[0], fields[1], fields[4]])
+
+    cities = []
+    with open(cities_dump, encoding="utf-8") as src:
+        for line in src:
+            fields = line.rstrip("\n").split("\t")
+            cities.append(fields)
+    # Most populous first, so duplicate names resolve to the larger city
+    cities.sort(key=lambda fields: -int(fields[14] or 0))
+
+    index = {}
+    with gzip.open(cities_path, "wt", encoding="utf-8") as dst:
+        for city_id, fields in enumerate(cities):
+            name, ascii_name, alternates, code = fields[1], fields[2], fields[3], fields[8]
+            dst.write(f"{name}\t{round(float(fields[4]), 4)}\t{round(float(fields[5]), 4)}\t{fields[17]}\n")
+
+            # Index Latin-script alternate names (e.g. "Mecca" for "Makkah"),
+            # skipping other scripts and airport/IATA style codes
+            keys = [normalize(name), normalize(ascii_name)]
+            for alias in alternates.split(","):
+                if alias.isascii() and not alias.isupper() and not any(ch.isdigit() for ch in alias):
+                    keys.append(normalize(alias))
+            for key in keys:
+                if key:
+                    index.setdefault(f"{key}|{code}", city_id)
+
+    with gzip.open(index_path, "wt", encoding="utf-8") as dst:
+        for key in sorted(index):
+            dst.write(f"{key}\t{index[key]}\n")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] != "build":
+        print("Usage: python gazetteer.py build <cities15000.txt> <countryInfo.txt>")
+        sys.exit(1)
+    build(sys.argv[2], sys.argv[3])
@@ -0,0 +1,114 @@
+"""Local hadith search.
+
+Searches a hadith collection dump indexed on disk (see text_index.py)
+instead of scraping sunnah.com. No hadith text is bundled; build the index
+from a dump of your choice:
+
+    python hadith_index.py ingest bukhari.jsonl muslim.csv ...
+
+Each record needs a collection, the hadith text and a reference. JSON
+(a list, or {"hadiths": [...]}), JSON Lines and CSV files are accepted, and
+common field names (book, english, hadith_number, ...) are recognized.
+"""
+import csv
+import json
+import os
+import sys
+import threading
+
+from text_index import TextIndex, build_index
+
+HADITH_INDEX_PATH = os.getenv(
+    "SALAH_GPT_HADITH_INDEX",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "hadith_index"),
+)
+
+# Accepted names for each field in a dump, in order of preference
+FIELD_ALIASES = {
+    "collection": ["collection", "book", "collection_name", "source"],
+    "text": ["text", "english", "hadith_text", "hadith", "body", "content"],
+    "reference": ["reference", "ref", "citation"],
+    "number": ["number", "hadith_number", "hadithNumber", "idInBook", "hadith_no"],
+}
+
+
+def _field(record, name):
+    for alias in FIELD_ALIASES[name]:
+        value = record.get(alias)
+        if isinstance(value, dict):
+            # e.g. {"english": {"narrator": ..., "text": ...}}
+            value = " ".join(str(part) for part in (value.get("narrator"), value.get("text")) if part)
+        if value not in (None, ""):
+            return str(value).strip()
+    return ""
+
+
+def normalize_record(record, default_collection=""):
+    """Map a dump record onto the {"collection", "text", "reference"} shape"""
+    collection = _field(record, "collection") or default_collection or "Unknown Collection"
+    reference = _field(record, "reference")
+    if not reference:
+        number = _field(record, "number")
+        reference = f"{collection} {number}" if number else "Reference not available"
+    return {"collection": collection, "text": _field(record, "text"), "reference": reference}
+
+
+def read_dump(path):
+    """Yield normalized hadith records from a JSON, JSON Lines or CSV dump"""
+    default_collection = os.path.splitext(os.path.basename(path))[0].replace("_", " ").title()
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.endswith(".csv"):
+            records = csv.DictReader(f)
+        elif path.endswith(".jsonl"):
+            records = (json.loads(line) for line in f if line.strip())
+        else:
+            data = json.load(f)
+            if isinstance(data, dict):
+                default_collection = (data.get("metadata") or {}).get("english", {}).get("title") or default_collection
+                data = data.get("hadiths", [])
+            records = data
+
+        for record in records:
+            hadith = normalize_record(record, default_collection)
+            if hadith["text"]:
+                yield hadith
+
+
+def ingest(paths, index_path=HADITH_INDEX_PATH):
+    """Build the hadith index from one or more dump files"""
+    hadiths = [hadith for path in paths for hadith in read_dump(path)]
+    build_index(index_path, hadiths, fields=("collection", "text"))
+    return len(hadiths)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_hadith_index():
+    """Return the process-wide hadith index, or None if it has not been built"""
+    global _index
+    if _index is None and os.path.exists(os.path.join(HADITH_INDEX_PATH, "meta.json")):
+        with _index_lock:
+            if _index is None:
+                _index = TextIndex(HADITH_INDEX_PATH)
+    return _index
+
+
+def search_hadith(query, limit=5):
+    """Top hadiths for a query as {"collection", "text", "reference"} dicts.
+
+    Returns None when no local index is available.
+    """
+    index = get_hadith_index()
+    if index is None:
+        return None
+    return [document for _, document in index.search(query, limit)]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] != "ingest":
+        print("Usage: python hadith_index.py ingest <dump> [<dump> ...]")
+        sys.exit(1)
+    count = ingest(sys.argv[2:])
+    print(f"Indexed {count} hadiths into {HADITH_INDEX_PATH}")
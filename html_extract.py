@@ -0,0 +1,257 @@
+"""Selective HTML extraction for scraped search pages.
+
+Each site is described by a few simple selectors ("tag" or "tag.class") for
+its result containers and the fields inside them, so supporting a new site
+is a matter of registering its selectors. Parsing is delegated to the
+fastest available backend: selectolax, then lxml, then BeautifulSoup. The
+BeautifulSoup backend only builds a tree for the result containers
+(SoupStrainer) instead of the whole page.
+"""
+import os
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as SelectolaxParser
+except ImportError:
+    SelectolaxParser = None
+
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+# Force a backend ("selectolax", "lxml" or "bs4"); empty picks the fastest installed
+HTML_PARSER = os.getenv("SALAH_GPT_HTML_PARSER", "")
+
+NO_PREVIEW = "No preview available"
+
+# Per-site selectors. "container" may list alternatives, tried in order.
+SITE_SELECTORS = {
+    "IslamQA": {
+        "container": ["div.search-item"],
+        "title": ["h3"],
+        "snippet": ["div.search-item-excerpt"],
+        "base_url": "https://islamqa.info",
+    },
+    "SeekersGuidance": {
+        "container": ["article"],
+        "title": ["h2.entry-title"],
+        "snippet": ["div.entry-summary"],
+    },
+    "AboutIslam": {
+        "container": ["article"],
+        "title": ["h2.jeg_post_title"],
+        "snippet": ["div.jeg_post_excerpt"],
+    },
+}
+
+# Used when a site has no selectors of its own or they match nothing
+GENERIC_SELECTORS = {
+    "container": ["article", "div.result-item", "div.search-result"],
+    "title": ["h2", "h3", "h4"],
+    "snippet": ["p", "div.excerpt"],
+    "generic": True,
+}
+
+# sunnah.com search results: field -> (selector, default when missing)
+HADITH_SELECTORS = {
+    "container": ["div.hadith_container"],
+    "fields": {
+        "collection": ("div.book_title", "Unknown Collection"),
+        "text": ("div.text_details", "Hadith text not available"),
+        "reference": ("div.hadith_reference", "Reference not available"),
+    },
+}
+
+
+def register_site(name, selectors):
+    """Register (or replace) the selectors used to extract results for a site"""
+    SITE_SELECTORS[name] = selectors
+
+
+def _split_selector(selector):
+    tag, _, css_class = selector.partition(".")
+    return tag, css_class or None
+
+
+class SelectolaxBackend:
+    """selectolax's lexbor parser; the fastest option"""
+    name = "selectolax"
+
+    def parse(self, page, containers):
+        return SelectolaxParser(page)
+
+    def select(self, node, selector):
+        return node.css(selector)
+
+    def select_first(self, node, selector):
+        return node.css_first(selector)
+
+    def text(self, node):
+        return node.text(deep=True)
+
+    def attr(self, node, name):
+        return node.attributes.get(name) or ""
+
+
+class LxmlBackend:
+    """libxml2 parser queried with XPath translated from the simple selectors"""
+    name = "lxml"
+
+    def parse(self, page, containers):
+        return lxml.html.fromstring(page)
+
+    def _xpath(self, selector):
+        tag, css_class = _split_selector(selector)
+        if css_class:
+            return f".//{tag}[contains(concat(' ', normalize-space(@class), ' '), ' {css_class} ')]"
+        return f".//{tag}"
+
+    def select(self, node, selector):
+        return node.xpath(self._xpath(selector))
+
+    def select_first(self, node, selector):
+        matches = node.xpath(f"({self._xpath(selector)})[1]")
+        return matches[0] if matches else None
+
+    def text(self, node):
+        return node.text_content()
+
+    def attr(self, node, name):
+        return node.get(name) or ""
+
+
+def _container_strainer(containers):
+    """SoupStrainer that only lets the parser build the given containers"""
+    wanted = [_split_selector(selector) for selector in containers]
+
+    def is_container(name, attrs):
+        classes = (attrs or {}).get("class") or ""
+        if not isinstance(classes, str):
+            classes = " ".join(classes)
+        return any(name == tag and (css_class is None or css_class in classes.split()) for tag, css_class in wanted)
+
+    if not hasattr(SoupStrainer, "allow_tag_creation"):
+        # bs4 < 4.13 calls a name function with (name, attrs)
+        return SoupStrainer(is_container)
+
+    class ContainerStrainer(SoupStrainer):
+        def allow_tag_creation(self, nsprefix, name, attrs):
+            return is_container(name, attrs)
+
+        def allow_string_creation(self, string):
+            return False
+
+    return ContainerStrainer()
+
+
+class SoupBackend:
+    """BeautifulSoup restricted to the result containers via SoupStrainer"""
+    name = "bs4"
+
+    def parse(self, page, containers):
+        features = "lxml" if lxml is not None else "html.parser"
+        return BeautifulSoup(page, features, parse_only=_container_strainer(containers))
+
+    def select(self, node, selector):
+        tag, css_class = _split_selector(selector)
+        return node.find_all(tag, class_=css_class) if css_class else node.find_all(tag)
+
+    def select_first(self, node, selector):
+        tag, css_class = _split_selector(selector)
+        return node.find(tag, class_=css_class) if css_class else node.find(tag)
+
+    def text(self, node):
+        return node.text
+
+    def attr(self, node, name):
+        return node.get(name) or ""
+
+
+PARSERS = {
+    "selectolax": SelectolaxBackend,
+    "lxml": LxmlBackend,
+    "bs4": SoupBackend,
+}
+
+
+def get_backend(name=HTML_PARSER):
+    """Return the requested parser backend, or the fastest one installed"""
+    if name:
+        return PARSERS[name]()
+    if SelectolaxParser is not None:
+        return SelectolaxBackend()
+    if lxml is not None:
+        return LxmlBackend()
+    return SoupBackend()
+
+
+def _first(backend, node, selectors):
+    for selector in selectors:
+        match = backend.select_first(node, selector)
+        if match is not None:
+            return match
+    return None
+
+
+def _containers(backend, root, selectors, limit):
+    for selector in selectors:
+        matches = backend.select(root, selector)
+        if matches:
+            return matches[:limit]
+    return []
+
+
+def _extract_articles(backend, root, selectors, limit):
+    results = []
+    for article in _containers(backend, root, selectors["container"], limit):
+        title_elem = _first(backend, article, selectors["title"])
+        if title_elem is None:
+            continue
+        link_elem = backend.select_first(title_elem, "a")
+        if selectors.get("generic"):
+            link_elem = link_elem if link_elem is not None else backend.select_first(article, "a")
+        elif link_elem is None:
+            continue
+
+        link = backend.attr(link_elem, "href") if link_elem is not None else ""
+        if link.startswith("/") and selectors.get("base_url"):
+            link = selectors["base_url"] + link
+        snippet = _first(backend, article, selectors["snippet"])
+
+        results.append({
+            "title": backend.text(title_elem).strip(),
+            "link": link,
+            "snippet": backend.text(snippet).strip() if snippet is not None else NO_PREVIEW
+        })
+    return results
+
+
+def extract_site_results(site_name, page, limit=3, backend=None):
+    """Extract up to limit {"title", "link", "snippet"} results from a search page"""
+    backend = backend or get_backend()
+    selectors = SITE_SELECTORS.get(site_name)
+    containers = (selectors["container"] if selectors else []) + GENERIC_SELECTORS["container"]
+    root = backend.parse(page, containers)
+
+    results = _extract_articles(backend, root, selectors, limit) if selectors else []
+    # Generic fallback if site-specific parsing fails
+    if not results:
+        results = _extract_articles(backend, root, GENERIC_SELECTORS, limit)
+    return results
+
+
+def extract_hadith_results(page, limit=5, backend=None):
+    """Extract up to limit {"collection", "text", "reference"} results from a sunnah.com search page"""
+    backend = backend or get_backend()
+    root = backend.parse(page, HADITH_SELECTORS["container"])
+
+    results = []
+    for container in _containers(backend, root, HADITH_SELECTORS["container"], limit):
+        hadith = {}
+        for field, (selector, default) in HADITH_SELECTORS["fields"].items():
+            elem = backend.select_first(container, selector)
+            hadith[field] = backend.text(elem).strip() if elem is not None else default
+        results.append(hadith)
+    return results
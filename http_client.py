@@ -0,0 +1,131 @@
+"""Process-wide pooled HTTP client for all outbound requests.
+
+A single event loop runs in a daemon thread and owns one long-lived client,
+so every Streamlit session and every query reuses the same connection pool
+(keep-alive, per-host limits) instead of paying a TCP+TLS handshake per
+request. httpx with HTTP/2 is used when httpx and h2 are installed;
+otherwise aiohttp (HTTP/1.1) is used.
+"""
+import asyncio
+import atexit
+import os
+import threading
+
+import aiohttp
+
+try:
+    import h2  # noqa: F401  (only needed so httpx can negotiate HTTP/2)
+    import httpx
+except ImportError:
+    httpx = None
+
+# Connection pool configuration
+HTTP_POOL_SIZE = int(os.getenv("SALAH_GPT_HTTP_POOL_SIZE", "50"))  # total connections
+HTTP_POOL_PER_HOST = int(os.getenv("SALAH_GPT_HTTP_POOL_PER_HOST", "5"))  # connections per host
+HTTP_KEEPALIVE = int(os.getenv("SALAH_GPT_HTTP_KEEPALIVE", "60"))  # seconds an idle connection is kept
+HTTP_TIMEOUT = int(os.getenv("SALAH_GPT_HTTP_TIMEOUT", "10"))  # seconds per request
+USE_HTTP2 = httpx is not None and os.getenv("SALAH_GPT_HTTP2", "1") != "0"
+
+# User agent to mimic a browser
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+
+# Errors worth retrying, whichever backend is in use
+TRANSIENT_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError) + ((httpx.HTTPError,) if httpx else ())
+
+_loop = None
+_client = None
+_lock = threading.Lock()
+
+
+def _get_loop():
+    """Start the shared event loop thread on first use"""
+    global _loop
+    if _loop is None:
+        with _lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="http-client-loop", daemon=True)
+                thread.start()
+                _loop = loop
+    return _loop
+
+
+def _get_client():
+    """Return the shared client; must be called on the shared loop"""
+    global _client
+    if _client is None:
+        if USE_HTTP2:
+            _client = httpx.AsyncClient(
+                http2=True,
+                headers=HEADERS,
+                timeout=HTTP_TIMEOUT,
+                follow_redirects=True,
+                limits=httpx.Limits(
+                    max_connections=HTTP_POOL_SIZE,
+                    max_keepalive_connections=HTTP_POOL_SIZE,
+                    keepalive_expiry=HTTP_KEEPALIVE,
+                ),
+            )
+        else:
+            connector = aiohttp.TCPConnector(
+                limit=HTTP_POOL_SIZE,
+                limit_per_host=HTTP_POOL_PER_HOST,
+                keepalive_timeout=HTTP_KEEPALIVE,
+                ttl_dns_cache=300,
+            )
+            _client = aiohttp.ClientSession(
+                connector=connector,
+                headers=HEADERS,
+                timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT),
+            )
+    return _client
+
+
+def run(coro):
+    """Run a coroutine on the shared loop and block until it finishes"""
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop()).result()
+
+
+async def fetch(url, params=None, as_json=False):
+    """GET a URL through the shared pool and return (status, body).
+
+    body is the decoded JSON or text for a 200 response and None otherwise.
+    Must be awaited on the shared loop (i.e. from a coroutine passed to run).
+    """
+    client = _get_client()
+    if USE_HTTP2:
+        async with _per_host_limit(url):
+            response = await client.get(url, params=params)
+        if response.status_code != 200:
+            return response.status_code, None
+        return response.status_code, response.json() if as_json else response.text
+
+    async with client.get(url, params=params) as response:
+        if response.status != 200:
+            return response.status, None
+        if as_json:
+            return response.status, await response.json(content_type=None)
+        return response.status, await response.text()
+
+
+_host_semaphores = {}
+
+
+def _per_host_limit(url):
+    """Semaphore capping concurrent httpx requests per host (aiohttp's connector does this itself)"""
+    host = httpx.URL(url).host
+    if host not in _host_semaphores:
+        _host_semaphores[host] = asyncio.Semaphore(HTTP_POOL_PER_HOST)
+    return _host_semaphores[host]
+
+
+@atexit.register
+def _close():
+    if _loop is not None and _client is not None:
+        close = _client.aclose() if USE_HTTP2 else _client.close()
+        try:
+            asyncio.run_coroutine_threadsafe(close, _loop).result(timeout=5)
+        except Exception:
+            pass
@@ -0,0 +1,210 @@
+"""Process-wide gateway for OpenAI chat completions.
+
+Every Streamlit session shares one OpenAI client per API key, so the
+client's connection pool survives reruns. Requests go through a global
+concurrency cap and a token-bucket rate limiter, so a burst of questions
+queues instead of failing with 429s. Rate limits, timeouts, connection
+errors and 5xx responses are retried with jittered exponential backoff
+(honouring Retry-After), and identical prompts that are already in flight
+share one completion.
+"""
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+
+import openai
+from openai import OpenAI
+
+import metrics
+
+# Concurrency and rate limits for all sessions together
+LLM_MAX_CONCURRENCY = int(os.getenv("SALAH_GPT_LLM_CONCURRENCY", "8"))  # requests in flight
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("SALAH_GPT_LLM_RPM", "60"))
+LLM_BURST = int(os.getenv("SALAH_GPT_LLM_BURST", "10"))  # requests allowed back to back
+LLM_QUEUE_TIMEOUT = float(os.getenv("SALAH_GPT_LLM_QUEUE_TIMEOUT", "60"))  # seconds a request may wait for a slot
+LLM_TIMEOUT = float(os.getenv("SALAH_GPT_LLM_TIMEOUT", "60"))  # seconds per request
+
+# Retries with jittered exponential backoff
+LLM_MAX_RETRIES = int(os.getenv("SALAH_GPT_LLM_RETRIES", "4"))
+LLM_BACKOFF_BASE = 1.0  # seconds
+LLM_BACKOFF_MAX = 30.0  # seconds
+
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError, openai.InternalServerError)
+
+
+class GatewayBusyError(RuntimeError):
+    """No request slot became free within LLM_QUEUE_TIMEOUT"""
+
+
+class TokenBucket:
+    """Thread-safe token bucket: rate tokens per second, at most capacity saved up"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout=None):
+        """Take one token, waiting for it if necessary; False if timeout passes first"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if deadline is not None and now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class _Call:
+    """A completion in flight; callers with the same prompt wait on it"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY)
+_bucket = TokenBucket(LLM_REQUESTS_PER_MINUTE / 60, LLM_BURST)
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+
+def get_client(api_key):
+    """Return the shared OpenAI client for api_key"""
+    client = _clients.get(api_key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(api_key)
+            if client is None:
+                # Retries are done here, so they share the rate limiter and backoff
+                client = OpenAI(api_key=api_key, max_retries=0, timeout=LLM_TIMEOUT)
+                _clients[api_key] = client
+    return client
+
+
+def _backoff(attempt, error):
+    """Seconds to wait before retry number attempt (1-based)"""
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        if retry_after is not None:
+            return min(float(retry_after), LLM_BACKOFF_MAX)
+    except ValueError:
+        pass
+    # Full jitter, so queued sessions don't all retry at the same moment
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+
+
+def _count_usage(model, usage):
+    if usage is not None:
+        metrics.count("llm_tokens_total", usage.prompt_tokens, help="OpenAI tokens used", model=model, kind="prompt")
+        metrics.count("llm_tokens_total", usage.completion_tokens, help="OpenAI tokens used", model=model, kind="completion")
+
+
+def _complete(client, model, messages, on_text):
+    """One completion attempt; returns (text, finish_reason)"""
+    if on_text is None:
+        response = client.chat.completions.create(model=model, messages=messages)
+        _count_usage(model, response.usage)
+        return response.choices[0].message.content, response.choices[0].finish_reason
+
+    # The final chunk of the stream carries the token usage
+    response = client.chat.completions.create(model=model, messages=messages, stream=True, stream_options={"include_usage": True})
+    chunks = []
+    finish_reason = None
+    for chunk in response:
+        _count_usage(model, getattr(chunk, "usage", None))
+        if not chunk.choices:
+            continue
+        if chunk.choices[0].delta.content:
+            chunks.append(chunk.choices[0].delta.content)
+            on_text("".join(chunks))
+        finish_reason = chunk.choices[0].finish_reason or finish_reason
+    return "".join(chunks), finish_reason
+
+
+def _call(api_key, model, messages, on_text):
+    client = get_client(api_key)
+    shown = []
+
+    def show(text):
+        shown.append(text)
+        on_text(text)
+
+    attempt = 0
+    while True:
+        if not _slots.acquire(timeout=LLM_QUEUE_TIMEOUT):
+            raise GatewayBusyError(f"No OpenAI request slot free after {LLM_QUEUE_TIMEOUT:.0f} seconds")
+        try:
+            if not _bucket.acquire(timeout=LLM_QUEUE_TIMEOUT):
+                raise GatewayBusyError(f"OpenAI rate limit still exhausted after {LLM_QUEUE_TIMEOUT:.0f} seconds")
+            try:
+                with metrics.span("llm_request"):
+                    result = _complete(client, model, messages, show if on_text else None)
+                metrics.count("llm_requests_total", help="OpenAI requests by outcome", model=model, outcome="ok")
+                return result
+            except RETRYABLE_ERRORS as e:
+                metrics.count("llm_requests_total", help="OpenAI requests by outcome", model=model, outcome=type(e).__name__)
+                # A stream that already showed text can't be retried transparently
+                attempt += 1
+                if shown or attempt > LLM_MAX_RETRIES:
+                    raise
+                error = e
+        finally:
+            _slots.release()
+        delay = _backoff(attempt, error)
+        print(f"OpenAI request failed ({type(error).__name__}), retry {attempt}/{LLM_MAX_RETRIES} in {delay:.1f}s")
+        time.sleep(delay)
+
+
+def chat(api_key, model, messages, on_text=None):
+    """Run a chat completion through the gateway and return (text, finish_reason).
+
+    If on_text is given, the completion is streamed and on_text is called
+    with the text so far as it grows. A caller whose prompt is identical to
+    one already in flight waits for that completion instead of sending its
+    own, and gets on_text called once with the full text.
+    """
+    key = hashlib.sha256(json.dumps([api_key, model, messages], sort_keys=True).encode("utf-8")).hexdigest()
+    with _in_flight_lock:
+        call = _in_flight.get(key)
+        leader = call is None
+        if leader:
+            call = _in_flight[key] = _Call()
+
+    if not leader:
+        metrics.count("llm_coalesced_total", help="Completions shared with an identical prompt already in flight", model=model)
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        if call.result is None:
+            # The first caller was interrupted (its session stopped); send our own request
+            return _call(api_key, model, messages, on_text)
+        if on_text is not None and call.result[0]:
+            on_text(call.result[0])
+        return call.result
+
+    try:
+        call.result = _call(api_key, model, messages, on_text)
+        return call.result
+    except Exception as e:
+        call.error = e
+        raise
+    finally:
+        with _in_flight_lock:
+            del _in_flight[key]
+        call.done.set()
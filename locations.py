@@ -0,0 +1,244 @@
+"""Process-wide location resolution.
+
+Turns the (city, country) typed in the sidebar into coordinates and an IANA
+timezone. Results are kept in a shared LRU keyed by the normalized names,
+so "London, UK" and "london , uk" resolve once for every session, and are
+written to a JSON file so a restarted process does not geocode them again.
+The bundled gazetteer answers most places; Nominatim and TimezoneFinder are
+only used for the rest, through one instance of each per process.
+"""
+import concurrent.futures
+import html
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from geopy.geocoders import Nominatim
+from timezonefinder import TimezoneFinder
+
+import metrics
+from gazetteer import lookup_city, normalize
+
+# Bounds and persistence for the location cache
+LOCATION_CACHE_MAX_ENTRIES = int(os.getenv("SALAH_GPT_LOCATION_CACHE_SIZE", "4096"))
+# Kept in the user's cache directory, outside the source tree; set to "" to
+# keep resolved locations in memory only
+LOCATION_CACHE_PATH = os.getenv("SALAH_GPT_LOCATION_CACHE", os.path.join(
+    os.getenv("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "salah-gpt", "locations.json"
+))
+# Places that could not be found are retried after this long (never persisted)
+LOCATION_NOT_FOUND_TTL = int(os.getenv("SALAH_GPT_LOCATION_NOT_FOUND_TTL", "3600"))  # seconds
+GEOCODER_TIMEOUT = 10  # seconds
+
+
+def location_key(city, country):
+    """Cache key for a place: normalized city and country"""
+    # Some callers pass html-escaped input (see retrieval.sanitize_input)
+    return normalize(html.unescape(city or "")), normalize(html.unescape(country or ""))
+
+
+class LocationCache:
+    """Thread-safe LRU of resolved locations, optionally persisted to a JSON file.
+
+    Values are {"latitude", "longitude", "timezone"} dicts. A place that could
+    not be resolved is remembered as None for not_found_ttl seconds, so a
+    misspelled city does not hit the geocoder on every rerun. The file is
+    rewritten (atomically) whenever a new place is added.
+    """
+
+    def __init__(self, path=LOCATION_CACHE_PATH, max_entries=LOCATION_CACHE_MAX_ENTRIES, not_found_ttl=LOCATION_NOT_FOUND_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.not_found_ttl = not_found_ttl
+        self._entries = OrderedDict()  # (city, country) -> location
+        self._not_found = {}  # (city, country) -> expires_at
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if path:
+            self._load()
+
+    def lookup(self, key):
+        """Return (found, location); location is None for a place known not to exist"""
+        with self._lock:
+            location = self._entries.get(key)
+            if location is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, location
+            expires_at = self._not_found.get(key)
+            if expires_at is not None:
+                if time.time() < expires_at:
+                    self.hits += 1
+                    return True, None
+                del self._not_found[key]
+            self.misses += 1
+            return False, None
+
+    def set(self, key, location):
+        if location is None:
+            with self._lock:
+                self._not_found[key] = time.time() + self.not_found_ttl
+            return
+
+        with self._lock:
+            self._not_found.pop(key, None)
+            self._entries[key] = location
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        if self.path:
+            self.save()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._not_found.clear()
+
+    def stats(self):
+        """Return a snapshot of cache size and hit/miss counters"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "not_found": len(self._not_found),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def save(self):
+        """Write the cached locations to self.path, least recently used first"""
+        try:
+            with self._save_lock:
+                # Copied under the save lock, so a newer snapshot is never overwritten by an older one
+                with self._lock:
+                    rows = [[city, country, location] for (city, country), location in self._entries.items()]
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                temp_path = f"{self.path}.{os.getpid()}.tmp"
+                with open(temp_path, "w", encoding="utf-8") as f:
+                    json.dump(rows, f, ensure_ascii=False)
+                os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"Error writing location cache {self.path}: {str(e)}")
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                rows = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"Error reading location cache {self.path}: {str(e)}")
+            return
+        if not isinstance(rows, list):
+            print(f"Error reading location cache {self.path}: expected a list of rows")
+            return
+        skipped = 0
+        for row in rows[-self.max_entries:]:
+            try:
+                city, country, location = row
+                entry = {
+                    "latitude": float(location["latitude"]),
+                    "longitude": float(location["longitude"]),
+                    "timezone": str(location["timezone"])
+                }
+            except (TypeError, ValueError, KeyError):
+                skipped += 1
+                continue
+            if not isinstance(city, str) or not isinstance(country, str):
+                skipped += 1
+                continue
+            self._entries[(city, country)] = entry
+        if skipped:
+            print(f"Skipped {skipped} invalid rows in location cache {self.path}")
+
+
+_in_flight = {}  # location key -> concurrent.futures.Future
+_in_flight_lock = threading.Lock()
+
+_geocoder = None
+_timezone_finder = None
+_services_lock = threading.Lock()
+
+
+def get_geocoder():
+    """Return the shared Nominatim geocoder"""
+    global _geocoder
+    if _geocoder is None:
+        with _services_lock:
+            if _geocoder is None:
+                _geocoder = Nominatim(user_agent="salah_gpt", timeout=GEOCODER_TIMEOUT)
+    return _geocoder
+
+
+def get_timezone_finder():
+    """Return the shared TimezoneFinder (its shape data is loaded once per process)"""
+    global _timezone_finder
+    if _timezone_finder is None:
+        with _services_lock:
+            if _timezone_finder is None:
+                _timezone_finder = TimezoneFinder()
+    return _timezone_finder
+
+
+def _resolve(city, country):
+    place = lookup_city(city, country)
+    if place:
+        return {
+            "latitude": place["latitude"],
+            "longitude": place["longitude"],
+            "timezone": place["timezone"]
+        }
+
+    with metrics.span("nominatim"):
+        location = get_geocoder().geocode(f"{city}, {country}")
+    if not location:
+        return None
+
+    timezone_str = get_timezone_finder().timezone_at(lat=location.latitude, lng=location.longitude)
+    return {
+        "latitude": location.latitude,
+        "longitude": location.longitude,
+        "timezone": timezone_str or "UTC"
+    }
+
+
+def resolve_location(city, country):
+    """Coordinates and timezone name for a place, or None if it cannot be found.
+
+    Geocoder errors are raised and not cached, so the next call tries again.
+    Callers waiting on the same lookup get the same error.
+    """
+    key = location_key(city, country)
+    found, location = LOCATION_CACHE.lookup(key)
+    if found:
+        return location
+
+    # Concurrent misses for the same place share one geocoder call (single
+    # flight), since Nominatim allows one request per second
+    with _in_flight_lock:
+        future = _in_flight.get(key)
+        owner = future is None
+        if owner:
+            future = _in_flight[key] = concurrent.futures.Future()
+    if not owner:
+        return future.result()
+
+    try:
+        location = _resolve(html.unescape(city or ""), html.unescape(country or ""))
+        LOCATION_CACHE.set(key, location)
+        future.set_result(location)
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _in_flight_lock:
+            _in_flight.pop(key, None)
+    return location
+
+
+# Module-level instance shared by every Streamlit session in the process
+LOCATION_CACHE = LocationCache()
+metrics.register_stats("location_cache", LOCATION_CACHE.stats)
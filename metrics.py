@@ -0,0 +1,241 @@
+"""Process-wide timing spans, counters and a Prometheus metrics endpoint.
+
+Retrieval functions and the LLM call are wrapped with timed, which records
+their latency in a histogram per stage; caches and the LLM gateway count
+hits, misses and tokens. Everything is exposed in the Prometheus text
+format on SALAH_GPT_METRICS_PORT (off unless set):
+
+    curl localhost:9100/metrics
+
+Within a trace() block, every span is also collected into a per-query trace.
+The trace follows the query into asyncio tasks and worker threads started
+with asyncio.to_thread, and into the shared HTTP loop through bind_trace.
+"""
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_PORT = int(os.getenv("SALAH_GPT_METRICS_PORT", "0"))  # 0 disables the endpoint
+METRICS_HOST = os.getenv("SALAH_GPT_METRICS_HOST", "127.0.0.1")
+# Log each query's stage timings and show them under the answer
+TRACE_QUERIES = os.getenv("SALAH_GPT_TRACE", "0") == "1"
+
+# Latency histogram buckets, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+PREFIX = "salah_gpt_"
+
+_lock = threading.Lock()
+_counters = {}  # (name, labels) -> value
+_histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+_stats = {}  # name -> function returning a dict of current values
+_help = {}  # name -> (type, help text)
+
+_trace = contextvars.ContextVar("salah_gpt_trace", default=None)
+
+
+def _labels(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def count(name, value=1, help="", **labels):
+    """Add value to the counter name{labels}"""
+    with _lock:
+        _help.setdefault(name, ("counter", help))
+        key = (name, _labels(labels))
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, value, help="", **labels):
+    """Record value in the histogram name{labels}"""
+    with _lock:
+        _help.setdefault(name, ("histogram", help))
+        key = (name, _labels(labels))
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [0] * (len(BUCKETS) + 2)
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                histogram[i] += 1
+        histogram[-2] += value
+        histogram[-1] += 1
+
+
+def counter_values(name):
+    """Current values of the counter name, keyed by their sorted ((label, value), ...) pairs"""
+    with _lock:
+        return {labels: value for (counter, labels), value in _counters.items() if counter == name}
+
+
+def register_stats(name, stats):
+    """Expose the numeric values of stats() as gauges name_<key> at every scrape"""
+    with _lock:
+        _stats[name] = stats
+
+
+def _record(stage, started, error):
+    elapsed = time.perf_counter() - started
+    observe("stage_seconds", elapsed, help="Time spent per pipeline stage", stage=stage)
+    if error:
+        count("stage_errors_total", help="Pipeline stage failures", stage=stage)
+    spans = _trace.get()
+    if spans is not None:
+        spans.append({"stage": stage, "seconds": round(elapsed, 4), "error": error})
+
+
+@contextmanager
+def span(stage):
+    """Time the enclosed block as stage"""
+    started = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        _record(stage, started, error)
+
+
+def timed(stage=None):
+    """Decorator timing every call of a function or coroutine function as stage"""
+    def decorator(func):
+        name = stage or func.__name__
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def trace():
+    """Collect the spans recorded inside the block; yields the list they are added to"""
+    spans = []
+    token = _trace.set(spans)
+    try:
+        yield spans
+    finally:
+        _trace.reset(token)
+
+
+async def bind_trace(coro, spans):
+    """Run coro with spans as the current trace (for coroutines run on another thread's loop)"""
+    _trace.set(spans)
+    return await coro
+
+
+def current_trace():
+    """The span list of the trace() block we are in, or None"""
+    return _trace.get()
+
+
+def format_trace(spans):
+    """One line per span, for logs or the UI"""
+    return "\n".join(
+        f"{s['stage']}: {s['seconds'] * 1000:.0f} ms" + (f" ({s['error']})" if s["error"] else "") for s in spans
+    )
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: list(value) for key, value in _histograms.items()}
+        stats = dict(_stats)
+        help_texts = dict(_help)
+
+    lines = []
+    described = set()
+
+    def describe(name, kind, help_text):
+        if name not in described:
+            described.add(name)
+            if help_text:
+                lines.append(f"# HELP {PREFIX}{name} {help_text}")
+            lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+    for (name, labels), value in sorted(counters.items()):
+        describe(name, "counter", help_texts[name][1])
+        lines.append(f"{PREFIX}{name}{_format_labels(labels)} {value}")
+
+    for (name, labels), histogram in sorted(histograms.items()):
+        describe(name, "histogram", help_texts[name][1])
+        for bound, bucket in zip(BUCKETS, histogram):
+            lines.append(f"{PREFIX}{name}_bucket{_format_labels(labels, [('le', str(bound))])} {bucket}")
+        lines.append(f"{PREFIX}{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {histogram[-1]}")
+        lines.append(f"{PREFIX}{name}_sum{_format_labels(labels)} {histogram[-2]:.6f}")
+        lines.append(f"{PREFIX}{name}_count{_format_labels(labels)} {histogram[-1]}")
+
+    for stats_name, stats_func in sorted(stats.items()):
+        try:
+            values = stats_func()
+        except Exception as e:
+            print(f"Error collecting {stats_name} metrics: {str(e)}")
+            continue
+        for key, value in sorted(values.items()):
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                describe(f"{stats_name}_{key}", "gauge", "")
+                lines.append(f"{PREFIX}{stats_name}_{key} {value}")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes every few seconds would flood the Streamlit log
+        pass
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port=METRICS_PORT, host=METRICS_HOST):
+    """Serve /metrics from a daemon thread; does nothing if port is 0 or it is already running"""
+    global _server
+    if not port or _server is not None:
+        return _server or None
+    with _server_lock:
+        if _server is None:
+            try:
+                server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            except (OSError, OverflowError) as e:
+                # Don't retry on every rerun (e.g. another worker holds the port)
+                print(f"Metrics endpoint disabled: could not listen on {host}:{port}: {type(e).__name__}: {str(e)}")
+                _server = False
+                return None
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+            _server = server
+    return _server or None
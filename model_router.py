@@ -0,0 +1,62 @@
+"""Choose the OpenAI model for a question.
+
+Simple factual questions go to a small, fast model. Questions comparing
+madhabs or asking about disagreement and evidence, long or multi-part
+questions, and questions with a large source context go to the large model.
+An answer from the small model that failed, came back empty, was cut off or
+hedges ("I'm not sure") is regenerated with the large model.
+"""
+import os
+import re
+
+SMALL_MODEL = os.getenv("SALAH_GPT_SMALL_MODEL", "gpt-4o-mini")
+LARGE_MODEL = os.getenv("SALAH_GPT_LARGE_MODEL", "gpt-4-turbo")
+# "auto" picks a model per question; "small" or "large" always uses that model
+MODEL_ROUTING = os.getenv("SALAH_GPT_MODEL_ROUTING", "auto")
+# Whether a weak answer from the small model is regenerated with the large one
+MODEL_ESCALATION = os.getenv("SALAH_GPT_MODEL_ESCALATION", "1") != "0"
+
+# Thresholds above which a question goes straight to the large model
+ESCALATE_CONTEXT_TOKENS = int(os.getenv("SALAH_GPT_ESCALATE_CONTEXT_TOKENS", "1200"))
+ESCALATE_QUERY_WORDS = 30
+
+MADHAB_RE = re.compile(r"\b(hanafi|shafi'?i|maliki|hanbali|ja'?fari)\b")
+MULTI_MADHAB_RE = re.compile(r"\b(madh?habs|schools|all (four|4) (madh?habs?|schools)|each (madh?hab|school))\b")
+COMPLEX_RE = re.compile(r"\b(differ|differs|difference|differences|different|compare|comparison|versus|vs|disagree|disagreement|opinions|scholars|evidence|evidences|dalil|proof|proofs|which is (correct|right|stronger|stronger opinion))\b")
+UNCERTAIN_RE = re.compile(r"\b(i'?m not sure|i am not sure|i don'?t know|i do not know|(cannot|can'?t|unable to) (determine|answer|find)|not enough information|insufficient information)\b")
+
+
+def route_model(query, context_tokens=0):
+    """Return (model, reason) for a question with a source context of context_tokens tokens"""
+    if MODEL_ROUTING == "small":
+        return SMALL_MODEL, "routing fixed to small model"
+    if MODEL_ROUTING == "large":
+        return LARGE_MODEL, "routing fixed to large model"
+
+    lowered = (query or "").lower().replace("’", "'")
+    if len(set(MADHAB_RE.findall(lowered))) > 1 or MULTI_MADHAB_RE.search(lowered):
+        return LARGE_MODEL, "multiple madhabs"
+    match = COMPLEX_RE.search(lowered)
+    if match:
+        return LARGE_MODEL, f"asks about {match.group(0)}"
+    if lowered.count("?") > 1:
+        return LARGE_MODEL, "several questions"
+    if len(lowered.split()) > ESCALATE_QUERY_WORDS:
+        return LARGE_MODEL, "long question"
+    if context_tokens > ESCALATE_CONTEXT_TOKENS:
+        return LARGE_MODEL, f"large context ({context_tokens} tokens)"
+    return SMALL_MODEL, "simple question"
+
+
+def escalation_reason(model, answer, finish_reason=None):
+    """Why an answer from model should be regenerated with the large model, or None"""
+    if not MODEL_ESCALATION or model == LARGE_MODEL:
+        return None
+    if not (answer or "").strip():
+        return "empty answer"
+    if finish_reason == "length":
+        return "answer cut off"
+    match = UNCERTAIN_RE.search(answer.lower().replace("’", "'"))
+    if match:
+        return f"uncertain answer ({match.group(0)})"
+    return None
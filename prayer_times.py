@@ -0,0 +1,339 @@
+import math
+import time
+from bisect import bisect_right
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pytz
+
+# Calculation methods, keyed by the Aladhan method ids used in method_map.
+# Angles are degrees below the horizon; "isha_minutes" is an interval after Maghrib.
+METHODS = {
+    1: {"name": "University of Islamic Sciences, Karachi", "fajr": 18, "isha": 18},
+    2: {"name": "Islamic Society of North America (ISNA)", "fajr": 15, "isha": 15},
+    3: {"name": "Muslim World League", "fajr": 18, "isha": 17},
+    4: {"name": "Umm Al-Qura University, Makkah", "fajr": 18.5, "isha_minutes": 90},
+}
+DEFAULT_METHOD = 2
+
+# Asr shadow factor: shadow length = factor * object length + noon shadow
+ASR_FACTORS = {"standard": 1, "hanafi": 2}
+
+# Refraction and solar semi-diameter at sunrise/sunset
+SUNRISE_ANGLE = 0.833
+IMSAK_MINUTES = 10
+
+EPOCH_DATE = date(1970, 1, 1)
+
+PRAYER_NAMES = ["Fajr", "Sunrise", "Dhuhr", "Asr", "Sunset", "Maghrib", "Isha", "Imsak", "Midnight", "Firstthird", "Lastthird"]
+
+# The times a day is divided into for the current/next prayer
+SCHEDULE_NAMES = ["Fajr", "Sunrise", "Dhuhr", "Asr", "Maghrib", "Isha"]
+
+
+def _dsin(d):
+    return np.sin(np.radians(d))
+
+def _dcos(d):
+    return np.cos(np.radians(d))
+
+def _dtan(d):
+    return np.tan(np.radians(d))
+
+def _darcsin(x):
+    return np.degrees(np.arcsin(x))
+
+def _darccos(x):
+    # Outside [-1, 1] the sun never reaches the angle (polar day/night): NaN
+    with np.errstate(invalid="ignore"):
+        return np.degrees(np.arccos(x))
+
+def _darctan2(y, x):
+    return np.degrees(np.arctan2(y, x))
+
+def _darccot(x):
+    return np.degrees(np.arctan(1 / x))
+
+def _fix(a, b):
+    return np.mod(a, b)
+
+
+def julian_date(year, month, day):
+    """Julian date at 00:00 UTC of the given Gregorian date"""
+    if month <= 2:
+        year -= 1
+        month += 12
+    a = math.floor(year / 100)
+    b = 2 - a + math.floor(a / 4)
+    return math.floor(365.25 * (year + 4716)) + math.floor(30.6001 * (month + 1)) + day + b - 1524.5
+
+
+def sun_position(jd):
+    """Return (declination in degrees, equation of time in hours) for Julian date(s)"""
+    d = jd - 2451545.0
+    g = _fix(357.529 + 0.98560028 * d, 360)
+    q = _fix(280.459 + 0.98564736 * d, 360)
+    l = _fix(q + 1.915 * _dsin(g) + 0.020 * _dsin(2 * g), 360)
+    e = 23.439 - 0.00000036 * d
+
+    ra = _darctan2(_dcos(e) * _dsin(l), _dcos(l)) / 15
+    equation_of_time = q / 15 - _fix(ra, 24)
+    declination = _darcsin(_dsin(e) * _dsin(l))
+    return declination, equation_of_time
+
+
+def calculate_prayer_times(latitude, longitude, day, utc_offset, method=DEFAULT_METHOD, asr_factor=1):
+    """Compute prayer times for one location and date.
+
+    day is a datetime.date, utc_offset the location's offset from UTC in hours
+    on that date. Returns a dict of prayer name -> local time as fractional
+    hours (NaN where the sun never reaches the required angle).
+    """
+    times = calculate_prayer_times_batch([latitude], [longitude], [day], utc_offset, method, asr_factor)
+    return {name: float(values[0, 0]) for name, values in times.items()}
+
+
+def calculate_prayer_times_batch(latitudes, longitudes, days, utc_offsets, method=DEFAULT_METHOD, asr_factor=1):
+    """Compute prayer times for N locations over D dates in one vectorized pass.
+
+    utc_offsets may be a scalar, one offset per location (shape (N,)) or a
+    full (N, D) grid as returned by utc_offset_grid when DST matters. Returns
+    a dict of prayer name -> (N, D) array of local times as fractional hours.
+    """
+    params = METHODS.get(method, METHODS[DEFAULT_METHOD])
+    latitude = np.asarray(latitudes, dtype=float).reshape(-1, 1)
+    longitude = np.asarray(longitudes, dtype=float).reshape(-1, 1)
+    utc_offset = np.asarray(utc_offsets, dtype=float)
+    if utc_offset.ndim == 1:
+        utc_offset = utc_offset.reshape(-1, 1)
+
+    jd = np.array([julian_date(day.year, day.month, day.day) for day in days]).reshape(1, -1)
+    jd = jd - longitude / (15 * 24)
+
+    def mid_day(t):
+        _, eqt = sun_position(jd + t)
+        return _fix(12 - eqt, 24)
+
+    def sun_angle_time(angle, t, ccw=False):
+        decl, eqt = sun_position(jd + t)
+        noon = _fix(12 - eqt, 24)
+        hour_angle = _darccos(
+            (-_dsin(angle) - _dsin(decl) * _dsin(latitude)) / (_dcos(decl) * _dcos(latitude))
+        ) / 15
+        return noon - hour_angle if ccw else noon + hour_angle
+
+    def asr_time(factor, t):
+        decl, _ = sun_position(jd + t)
+        angle = -_darccot(factor + _dtan(np.abs(latitude - decl)))
+        return sun_angle_time(angle, t)
+
+    # Initial guesses as day portions, refined by evaluating the sun at that time
+    times = {
+        "Fajr": sun_angle_time(params["fajr"], 5 / 24, ccw=True),
+        "Sunrise": sun_angle_time(SUNRISE_ANGLE, 6 / 24, ccw=True),
+        "Dhuhr": mid_day(12 / 24),
+        "Asr": asr_time(asr_factor, 13 / 24),
+        "Sunset": sun_angle_time(SUNRISE_ANGLE, 18 / 24),
+        "Isha": sun_angle_time(params.get("isha", 0), 18 / 24),
+    }
+
+    # Convert from local solar time to the location's clock time
+    shift = utc_offset - longitude / 15
+    for name in times:
+        times[name] = times[name] + shift
+
+    times["Maghrib"] = times["Sunset"]
+    if "isha_minutes" in params:
+        times["Isha"] = times["Maghrib"] + params["isha_minutes"] / 60
+
+    _adjust_high_latitudes(times, params)
+
+    times["Imsak"] = times["Fajr"] - IMSAK_MINUTES / 60
+
+    # Night runs from sunset to the next sunrise (for midnight) or next Fajr (for thirds)
+    night = _fix(times["Sunrise"] - times["Sunset"], 24)
+    times["Midnight"] = times["Sunset"] + night / 2
+    fajr_night = _fix(times["Fajr"] - times["Sunset"], 24)
+    times["Firstthird"] = times["Sunset"] + fajr_night / 3
+    times["Lastthird"] = times["Sunset"] + 2 * fajr_night / 3
+    return times
+
+
+def _adjust_high_latitudes(times, params):
+    """Angle-based adjustment for Fajr and Isha when twilight never ends"""
+    night = _fix(times["Sunrise"] - times["Sunset"], 24)
+
+    fajr_portion = params["fajr"] / 60 * night
+    with np.errstate(invalid="ignore"):
+        too_early = np.isnan(times["Fajr"]) | (_fix(times["Sunrise"] - times["Fajr"], 24) > fajr_portion)
+    times["Fajr"] = np.where(too_early, times["Sunrise"] - fajr_portion, times["Fajr"])
+
+    if "isha" in params:
+        isha_portion = params["isha"] / 60 * night
+        with np.errstate(invalid="ignore"):
+            too_late = np.isnan(times["Isha"]) | (_fix(times["Isha"] - times["Sunset"], 24) > isha_portion)
+        times["Isha"] = np.where(too_late, times["Sunset"] + isha_portion, times["Isha"])
+
+
+def utc_offset_grid(timezone_names, days):
+    """(N, D) array of UTC offsets in hours for each timezone on each date"""
+    offsets = {}
+    for name in set(timezone_names):
+        offsets[name] = [utc_offset_hours(name, day) for day in days]
+    return np.array([offsets[name] for name in timezone_names], dtype=float)
+
+
+def to_epoch_seconds(times, days, utc_offsets):
+    """Convert fractional local hours on each date to Unix timestamps.
+
+    times is an (N, D) array from calculate_prayer_times_batch and utc_offsets
+    the offsets it was computed with. Results are rounded to the minute, like
+    the formatted timings, and are NaN where the time is undefined.
+    """
+    utc_offset = np.asarray(utc_offsets, dtype=float)
+    if utc_offset.ndim == 1:
+        utc_offset = utc_offset.reshape(-1, 1)
+    day_starts = np.array(
+        [(day - EPOCH_DATE).days * 86400 for day in days], dtype=float
+    ).reshape(1, -1)
+    seconds = day_starts + (times - utc_offset) * 3600
+    return np.round(seconds / 60) * 60
+
+
+def prayer_timetable(latitude, longitude, timezone_name, start, days, method=DEFAULT_METHOD, asr_factor=1):
+    """Formatted timings for one location over consecutive days, e.g. a monthly timetable"""
+    dates = [start + timedelta(days=i) for i in range(days)]
+    offsets = utc_offset_grid([timezone_name], dates)
+    times = calculate_prayer_times_batch([latitude], [longitude], dates, offsets, method, asr_factor)
+    return [
+        {
+            "date": day.strftime("%d-%m-%Y"),
+            "timings": {name: format_time(times[name][0, i]) for name in PRAYER_NAMES},
+        }
+        for i, day in enumerate(dates)
+    ]
+
+
+class PrayerSchedule:
+    """Prayer times for one location and local day, ready for current/next lookups.
+
+    Holds the SCHEDULE_NAMES times of yesterday, today and tomorrow as one
+    sorted list of Unix timestamps, so the current and next prayer at any
+    moment of the day are a binary search away, including before Fajr (still
+    yesterday's Isha) and after Isha (next is tomorrow's Fajr). The object is
+    immutable and shared by every session showing that location.
+    """
+
+    def __init__(self, latitude, longitude, timezone_name, day, method=DEFAULT_METHOD, asr_factor=1):
+        self.timezone_name = timezone_name
+        self.day = day
+        dates = [day - timedelta(days=1), day, day + timedelta(days=1)]
+        offsets = utc_offset_grid([timezone_name], dates)
+        times = calculate_prayer_times_batch([latitude], [longitude], dates, offsets, method, asr_factor)
+
+        # Today's times as shown in the timetable
+        self.timings = {name: format_time(times[name][0, 1]) for name in SCHEDULE_NAMES}
+        self.readable_date = day.strftime("%d %b %Y")
+
+        epochs = []
+        for name in SCHEDULE_NAMES:
+            for seconds in to_epoch_seconds(times[name], dates, offsets)[0]:
+                if not math.isnan(seconds):
+                    epochs.append((int(seconds), name))
+        epochs.sort()
+        self._epochs = [seconds for seconds, _ in epochs]
+        self._names = [name for _, name in epochs]
+
+    def status(self, now=None):
+        """Current and next prayer at now (Unix time, default the current time).
+
+        Returns {"current", "current_start", "next", "next_start", "countdown"}
+        with the start times as Unix timestamps and countdown in seconds until
+        the next prayer; names are None outside the three days covered.
+        """
+        if now is None:
+            now = time.time()
+        i = bisect_right(self._epochs, now)
+        current = i - 1 if i > 0 else None
+        following = i if i < len(self._epochs) else None
+        return {
+            "current": self._names[current] if current is not None else None,
+            "current_start": self._epochs[current] if current is not None else None,
+            "next": self._names[following] if following is not None else None,
+            "next_start": self._epochs[following] if following is not None else None,
+            "countdown": self._epochs[following] - now if following is not None else None,
+        }
+
+
+def format_countdown(seconds):
+    """Format a countdown in seconds as hours and minutes, rounded up, e.g. 2h 05m"""
+    minutes = max(0, int(seconds + 59) // 60)
+    if minutes >= 60:
+        return f"{minutes // 60}h {minutes % 60:02d}m"
+    return f"{minutes}m"
+
+
+def format_time(hours):
+    """Format fractional hours as HH:MM, rounded to the nearest minute"""
+    if math.isnan(hours):
+        return "-----"
+    hours = _fix(hours + 0.5 / 60, 24)
+    return f"{int(hours):02d}:{int((hours - int(hours)) * 60):02d}"
+
+
+def utc_offset_hours(timezone_name, day):
+    """UTC offset in hours of a timezone at local noon on the given date"""
+    tz = pytz.timezone(timezone_name)
+    noon = tz.localize(datetime(day.year, day.month, day.day, 12))
+    return noon.utcoffset().total_seconds() / 3600
+
+
+def prayer_times_response(latitude, longitude, timezone_name, method=DEFAULT_METHOD, asr_factor=1, day=None):
+    """Compute prayer times shaped like an Aladhan timingsByCity response"""
+    if day is None:
+        day = datetime.now(pytz.timezone(timezone_name)).date()
+    elif isinstance(day, datetime):
+        day = day.date()
+
+    times = calculate_prayer_times(
+        latitude, longitude, day, utc_offset_hours(timezone_name, day), method, asr_factor
+    )
+    params = METHODS.get(method, METHODS[DEFAULT_METHOD])
+    method_params = {"Fajr": params["fajr"]}
+    if "isha_minutes" in params:
+        method_params["Isha"] = f"{params['isha_minutes']} min"
+    else:
+        method_params["Isha"] = params["isha"]
+
+    return {
+        "code": 200,
+        "status": "OK",
+        "data": {
+            "timings": {name: format_time(times[name]) for name in PRAYER_NAMES},
+            "date": {
+                "readable": day.strftime("%d %b %Y"),
+                "timestamp": str(int(pytz.timezone(timezone_name).localize(datetime(day.year, day.month, day.day)).timestamp())),
+                "gregorian": {
+                    "date": day.strftime("%d-%m-%Y"),
+                    "format": "DD-MM-YYYY",
+                    "day": day.strftime("%d"),
+                    "weekday": {"en": day.strftime("%A")},
+                    "month": {"number": day.month, "en": day.strftime("%B")},
+                    "year": str(day.year),
+                },
+            },
+            "meta": {
+                "latitude": latitude,
+                "longitude": longitude,
+                "timezone": timezone_name,
+                "method": {
+                    "id": method if method in METHODS else DEFAULT_METHOD,
+                    "name": params["name"],
+                    "params": method_params,
+                },
+                "latitudeAdjustmentMethod": "ANGLE_BASED",
+                "midnightMode": "STANDARD",
+                "school": "HANAFI" if asr_factor == ASR_FACTORS["hanafi"] else "STANDARD",
+            },
+        },
+    }
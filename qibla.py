@@ -0,0 +1,65 @@
+import math
+
+import numpy as np
+
+# Coordinates of the Ka'bah in Makkah
+KAABA_LATITUDE = 21.4225
+KAABA_LONGITUDE = 39.8262
+
+# Mean Earth radius used for great-circle distances
+EARTH_RADIUS_KM = 6371.0088
+
+
+def qibla_direction(latitude, longitude):
+    """Initial great-circle bearing to the Ka'bah, in degrees clockwise from North"""
+    lat = math.radians(latitude)
+    delta_lon = math.radians(KAABA_LONGITUDE - longitude)
+    kaaba_lat = math.radians(KAABA_LATITUDE)
+
+    y = math.sin(delta_lon)
+    x = math.cos(lat) * math.tan(kaaba_lat) - math.sin(lat) * math.cos(delta_lon)
+    return math.degrees(math.atan2(y, x)) % 360
+
+
+def distance_to_makkah(latitude, longitude):
+    """Great-circle (haversine) distance to the Ka'bah in kilometres"""
+    lat = math.radians(latitude)
+    kaaba_lat = math.radians(KAABA_LATITUDE)
+    delta_lat = kaaba_lat - lat
+    delta_lon = math.radians(KAABA_LONGITUDE - longitude)
+
+    a = math.sin(delta_lat / 2) ** 2 + math.cos(lat) * math.cos(kaaba_lat) * math.sin(delta_lon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def qibla_directions(latitudes, longitudes):
+    """Vectorized Qibla bearings and distances for many points.
+
+    Returns (directions in degrees from North, distances in km) as arrays
+    with the broadcast shape of the inputs.
+    """
+    lat = np.radians(np.asarray(latitudes, dtype=float))
+    delta_lon = np.radians(KAABA_LONGITUDE - np.asarray(longitudes, dtype=float))
+    kaaba_lat = math.radians(KAABA_LATITUDE)
+
+    y = np.sin(delta_lon)
+    x = np.cos(lat) * math.tan(kaaba_lat) - np.sin(lat) * np.cos(delta_lon)
+    directions = np.degrees(np.arctan2(y, x)) % 360
+
+    a = np.sin((kaaba_lat - lat) / 2) ** 2 + np.cos(lat) * math.cos(kaaba_lat) * np.sin(delta_lon / 2) ** 2
+    distances = 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+    return directions, distances
+
+
+def qibla_response(latitude, longitude):
+    """Qibla direction shaped like an Aladhan /v1/qibla response, plus distance"""
+    return {
+        "code": 200,
+        "status": "OK",
+        "data": {
+            "latitude": latitude,
+            "longitude": longitude,
+            "direction": qibla_direction(latitude, longitude),
+            "distance": distance_to_makkah(latitude, longitude),
+        },
+    }
@@ -0,0 +1,107 @@
+"""Local Quran search.
+
+Searches the Arabic text and an English translation of the Quran indexed on
+disk (see text_index.py) instead of calling the quran.com search API, and
+understands Arabic queries: diacritics and hamza forms are normalized and
+words are also matched by their root. Uthmani spellings such as ٱلصَّلَوٰةَ
+are normalized to match plain queries (الصلاة); words where Uthmani uses a
+superscript alef (ٱلْكِتَٰبِ for الكتاب) only match by root, so the Tanzil
+"simple" text gives better Arabic ranking. No text is bundled; build the
+index from Tanzil (tanzil.net) "sura|aya|text" files:
+
+    python quran_index.py ingest quran-simple.txt en.sahih.txt "Saheeh International"
+"""
+import os
+import sys
+import threading
+
+from text_index import TextIndex, build_index
+
+QURAN_INDEX_PATH = os.getenv(
+    "SALAH_GPT_QURAN_INDEX",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "quran_index"),
+)
+
+
+def read_tanzil(path):
+    """Yield (sura, aya, text) from a Tanzil pipe-delimited text file"""
+    with open(path, encoding="utf-8-sig") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if not line or line.startswith("#"):
+                continue
+            sura, aya, text = line.split("|", 2)
+            yield int(sura), int(aya), text
+
+
+def ingest(arabic_path, translation_path=None, translation_name="", index_path=QURAN_INDEX_PATH):
+    """Build the Quran index from Tanzil Arabic text and an optional translation"""
+    translations = {}
+    if translation_path:
+        translations = {(sura, aya): text for sura, aya, text in read_tanzil(translation_path)}
+
+    verses = []
+    for verse_id, (sura, aya, text) in enumerate(read_tanzil(arabic_path), start=1):
+        verses.append({
+            "verse_key": f"{sura}:{aya}",
+            "verse_id": verse_id,
+            "text": text,
+            "translation": translations.get((sura, aya), ""),
+            "translation_name": translation_name,
+        })
+    build_index(index_path, verses, fields=("text", "translation"), analyzer="english_arabic")
+    return len(verses)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_quran_index():
+    """Return the process-wide Quran index, or None if it has not been built"""
+    global _index
+    if _index is None and os.path.exists(os.path.join(QURAN_INDEX_PATH, "meta.json")):
+        with _index_lock:
+            if _index is None:
+                _index = TextIndex(QURAN_INDEX_PATH)
+    return _index
+
+
+def search_verses(query, size=5):
+    """Search the local index, shaped like a quran.com /search response.
+
+    Returns None when no local index is available.
+    """
+    index = get_quran_index()
+    if index is None:
+        return None
+
+    results = []
+    for _, verse in index.search(query, size):
+        results.append({
+            "verse_key": verse["verse_key"],
+            "verse_id": verse["verse_id"],
+            "text": verse["text"],
+            "translations": [{
+                "text": verse["translation"],
+                "name": verse["translation_name"],
+                "language_name": "english",
+            }] if verse["translation"] else [],
+        })
+    return {
+        "search": {
+            "query": query,
+            "total_results": len(results),
+            "current_page": 1,
+            "total_pages": 1,
+            "results": results,
+        }
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (3, 4, 5) or sys.argv[1] != "ingest":
+        print("Usage: python quran_index.py ingest <arabic.txt> [<translation.txt> [<translation name>]]")
+        sys.exit(1)
+    count = ingest(*sys.argv[2:])
+    print(f"Indexed {count} verses into {QURAN_INDEX_PATH}")
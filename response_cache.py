@@ -0,0 +1,245 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+import metrics
+
+# Bounds for the process-wide response cache
+CACHE_MAX_ENTRIES = int(os.getenv("SALAH_GPT_CACHE_MAX_ENTRIES", "2048"))
+CACHE_MAX_BYTES = int(os.getenv("SALAH_GPT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))  # 64 MB
+
+# Optional persistent tier: set to a file path to keep cached responses across restarts
+CACHE_DB_PATH = os.getenv("SALAH_GPT_CACHE_DB", "")
+CACHE_DB_CLEANUP_INTERVAL = int(os.getenv("SALAH_GPT_CACHE_DB_CLEANUP_INTERVAL", "600"))  # seconds
+
+# How long an expired entry may still be served while it is being refreshed
+CACHE_STALE_SECONDS = int(os.getenv("SALAH_GPT_CACHE_STALE_SECONDS", "3600"))
+
+
+class ResponseCache:
+    """Thread-safe LRU cache shared by every Streamlit session in the process.
+
+    Entries carry their own expiry time, so each cached function keeps the TTL
+    it declares. The cache is bounded both by entry count and by the total
+    pickled size of the stored values; the least recently used entries are
+    evicted first when either bound is exceeded.
+
+    An entry set with a stale_ttl stays available through lookup for that
+    long after it expires, so callers can serve the stale value while they
+    refresh it; get treats it as expired.
+
+    If a DiskCacheTier is given, it is used as a second tier: every set is
+    written through to disk and in-memory misses are looked up on disk and
+    promoted, so a fresh process warms up lazily from earlier runs.
+    """
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES, disk_tier=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_tier = disk_tier
+        self._entries = OrderedDict()  # key -> (expires_at, stale_until, size, value)
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return the cached value for key, or None if missing or expired"""
+        value, fresh = self.lookup(key)
+        return value if fresh else None
+
+    def lookup(self, key):
+        """Return (value, fresh) for key.
+
+        fresh is False for an expired entry still inside its stale window;
+        (None, False) means there is no usable entry.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, stale_until, size, value = entry
+                now = time.time()
+                if now < expires_at:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value, True
+                if now < stale_until:
+                    self._entries.move_to_end(key)
+                    self.stale_hits += 1
+                    return value, False
+                self._remove(key)
+
+        if self.disk_tier is not None:
+            row = self.disk_tier.get(key)
+            if row is not None:
+                expires_at, stale_until, value, size = row
+                self._store(key, value, expires_at, stale_until, size)
+                fresh = time.time() < expires_at
+                with self._lock:
+                    if fresh:
+                        self.disk_hits += 1
+                    else:
+                        self.stale_hits += 1
+                return value, fresh
+
+        with self._lock:
+            self.misses += 1
+        return None, False
+
+    def set(self, key, value, ttl, stale_ttl=0):
+        """Store value under key for ttl seconds, then keep it stale_ttl seconds more"""
+        expires_at = time.time() + ttl
+        pickled = _pickle(value)
+        size = len(pickled) if pickled is not None else len(repr(value).encode())
+        if size > self.max_bytes:
+            # Never let a single oversized value flush the whole cache or fill the disk
+            return
+        self._store(key, value, expires_at, expires_at + stale_ttl, size)
+        if self.disk_tier is not None and pickled is not None:
+            self.disk_tier.set(key, pickled, expires_at, expires_at + stale_ttl)
+
+    def _store(self, key, value, expires_at, stale_until, size):
+        if size > self.max_bytes:
+            # A disk row written under a larger max_bytes
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires_at, stale_until, size, value)
+            self._total_bytes += size
+            self._evict()
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+        if self.disk_tier is not None:
+            self.disk_tier.delete(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+        if self.disk_tier is not None:
+            self.disk_tier.clear()
+
+    def stats(self):
+        """Return a snapshot of cache size and hit/miss counters"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+            }
+
+    def _remove(self, key):
+        _, _, size, _ = self._entries.pop(key)
+        self._total_bytes -= size
+
+    def _evict(self):
+        while self._entries and (
+            len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes
+        ):
+            _, (_, _, size, _) = self._entries.popitem(last=False)
+            self._total_bytes -= size
+
+
+class DiskCacheTier:
+    """SQLite-backed persistent cache tier.
+
+    Values are stored as zlib-compressed pickles keyed by cache key, together
+    with their absolute expiry time and the end of their stale window. Rows
+    are only read when requested, and a daemon thread periodically deletes
+    rows past their stale window so the file does not grow without bound.
+    """
+
+    def __init__(self, path, cleanup_interval=CACHE_DB_CLEANUP_INTERVAL):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, expires_at REAL NOT NULL, stale_until REAL NOT NULL, value BLOB NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_stale_until ON cache (stale_until)")
+
+        if cleanup_interval > 0:
+            cleaner = threading.Thread(
+                target=self._cleanup_loop, args=(cleanup_interval,), name="cache-db-cleanup", daemon=True
+            )
+            cleaner.start()
+
+    def get(self, key):
+        """Return (expires_at, stale_until, value, pickled size) for key, or None if missing or past its stale window"""
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT expires_at, stale_until, value FROM cache WHERE key = ? AND stale_until > ?",
+                    (key, time.time()),
+                ).fetchone()
+            if row is None:
+                return None
+            pickled = zlib.decompress(row[2])
+            return row[0], row[1], pickle.loads(pickled), len(pickled)
+        except Exception as e:
+            print(f"Error reading cache database {self.path}: {str(e)}")
+            return None
+
+    def set(self, key, pickled, expires_at, stale_until):
+        """Store an already pickled value (see ResponseCache.set)"""
+        try:
+            blob = zlib.compress(pickled)
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO cache (key, expires_at, stale_until, value) VALUES (?, ?, ?, ?)",
+                    (key, expires_at, stale_until, blob),
+                )
+        except Exception as e:
+            print(f"Error writing cache database {self.path}: {str(e)}")
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache")
+
+    def purge_expired(self):
+        """Delete rows past their stale window and return how many were removed"""
+        with self._lock:
+            return self._conn.execute("DELETE FROM cache WHERE stale_until <= ?", (time.time(),)).rowcount
+
+    def _cleanup_loop(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.purge_expired()
+            except Exception as e:
+                print(f"Error purging cache database {self.path}: {str(e)}")
+
+
+def _pickle(value):
+    """Pickle value once, for both its size estimate and the disk tier; None if it can't be"""
+    try:
+        return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        return None
+
+
+# Module-level instance: Streamlit imports this module once per process, so
+# every session (and every rerun of the app script) shares the same cache.
+RESPONSE_CACHE = ResponseCache(disk_tier=DiskCacheTier(CACHE_DB_PATH) if CACHE_DB_PATH else None)
+metrics.register_stats("response_cache", RESPONSE_CACHE.stats)
@@ -0,0 +1,518 @@
+import asyncio
+import concurrent.futures
+import hashlib
+import html
+import json
+import threading
+import time
+from datetime import date, datetime
+from functools import wraps
+
+import aiohttp
+import pytz
+import requests
+import streamlit as st
+
+import http_client
+import metrics
+from hadith_index import search_hadith
+from html_extract import extract_hadith_results, extract_site_results
+from locations import resolve_location
+from prayer_times import ASR_FACTORS, PrayerSchedule, prayer_times_response
+from qibla import qibla_response
+from quran_index import search_verses
+from response_cache import CACHE_STALE_SECONDS, RESPONSE_CACHE
+from semantic_index import add_site_results, search_passages
+
+# API URLs
+QURAN_API_URL = "https://api.quran.com/api/v4/search"
+
+# Initialize retry parameters
+MAX_RETRIES = 3
+RETRY_DELAY = 2  # seconds
+
+# Total time budget for gathering all sources for one chat query
+QUERY_DEADLINE = 15  # seconds
+
+# Query keywords that route a chat query to each source
+HADITH_KEYWORDS = ["hadith", "prophet", "sunnah", "tradition"]
+PRAYER_TIME_KEYWORDS = ["time", "prayer", "when", "schedule"]
+QURAN_KEYWORDS = ["quran", "verse", "ayah", "surah", "ayat", "قرآن", "قران", "آية", "اية", "سورة"]
+
+# Close stored passages needed to answer without scraping the Islamic websites
+SEMANTIC_MIN_PASSAGES = 3
+
+# Helper functions
+def get_cache_key(func_name, params):
+    """Generate a cache key from function name and parameters"""
+    # Sanitize params to remove any sensitive information
+    if isinstance(params, dict) and "api_key" in params:
+        sanitized_params = params.copy()
+        sanitized_params["api_key"] = "REDACTED"
+    else:
+        sanitized_params = params
+    
+    params_str = json.dumps(sanitized_params, sort_keys=True)
+    key = f"{func_name}:{params_str}"
+    return hashlib.md5(key.encode()).hexdigest()
+
+# Cache keys being computed right now: concurrent misses wait for one call
+_in_flight = {}  # cache key -> concurrent.futures.Future (sync) or asyncio.Task (async)
+_in_flight_lock = threading.Lock()
+
+def cached(expiry_seconds, stale_seconds=CACHE_STALE_SECONDS):
+    """Decorator to cache function results with given expiry time.
+
+    Results are stored in the process-wide RESPONSE_CACHE, so they are shared
+    by all browser sessions instead of being duplicated per session. Works
+    for both regular functions and coroutine functions.
+
+    Concurrent misses for the same arguments share one call of the function
+    (single flight). For stale_seconds after a result expires it is still
+    returned while one background call refreshes it.
+    """
+    def decorator(func):
+        def lookup(args, kwargs):
+            # Create cache key from function name and arguments
+            params = {
+                "args": args,
+                "kwargs": kwargs
+            }
+            cache_key = get_cache_key(func.__name__, params)
+            cached_result, fresh = RESPONSE_CACHE.lookup(cache_key)
+            result = "miss" if cached_result is None else "hit" if fresh else "stale"
+            metrics.count("cache_requests_total", help="Response cache lookups by cached function", function=func.__name__, result=result)
+            return cache_key, cached_result, fresh
+
+        def store(cache_key, result):
+            if result is not None:
+                RESPONSE_CACHE.set(cache_key, result, expiry_seconds, stale_seconds)
+
+        if asyncio.iscoroutinefunction(func):
+            async def call(cache_key, args, kwargs):
+                try:
+                    result = await func(*args, **kwargs)
+                    store(cache_key, result)
+                    return result
+                finally:
+                    with _in_flight_lock:
+                        _in_flight.pop(cache_key, None)
+
+            def start(cache_key, args, kwargs):
+                """Return the call in flight for cache_key on this loop, starting one if needed"""
+                loop = asyncio.get_running_loop()
+                with _in_flight_lock:
+                    task = _in_flight.get(cache_key)
+                    if task is None or task.get_loop() is not loop:
+                        task = loop.create_task(call(cache_key, args, kwargs))
+                        _in_flight[cache_key] = task
+                return task
+
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                cache_key, cached_result, fresh = lookup(args, kwargs)
+                if cached_result is not None:
+                    if not fresh:
+                        # Serve the stale result; the refresh runs in the background
+                        start(cache_key, args, kwargs).add_done_callback(_log_refresh_error)
+                    return cached_result
+                
+                # shield: a caller cancelled by its deadline must not cancel the call others wait on
+                return await asyncio.shield(start(cache_key, args, kwargs))
+            return async_wrapper
+
+        def start(cache_key, args, kwargs):
+            """Return (future, owner) for cache_key; the owner must run the call"""
+            with _in_flight_lock:
+                future = _in_flight.get(cache_key)
+                if future is not None:
+                    return future, False
+                future = _in_flight[cache_key] = concurrent.futures.Future()
+                return future, True
+
+        def call(cache_key, future, args, kwargs):
+            try:
+                result = func(*args, **kwargs)
+                store(cache_key, result)
+                future.set_result(result)
+            except BaseException as e:
+                future.set_exception(e)
+                raise
+            finally:
+                with _in_flight_lock:
+                    _in_flight.pop(cache_key, None)
+            return result
+
+        def refresh(cache_key, future, args, kwargs):
+            try:
+                call(cache_key, future, args, kwargs)
+            except Exception as e:
+                print(f"Error refreshing {func.__name__} in the background: {str(e)}")
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            cache_key, cached_result, fresh = lookup(args, kwargs)
+            if cached_result is not None:
+                if not fresh:
+                    future, owner = start(cache_key, args, kwargs)
+                    if owner:
+                        # Serve the stale result; the refresh runs in the background
+                        threading.Thread(target=refresh, args=(cache_key, future, args, kwargs), daemon=True).start()
+                return cached_result
+            
+            # Call the function if cache miss or expired, unless another caller already is
+            future, owner = start(cache_key, args, kwargs)
+            if not owner:
+                return future.result()
+            return call(cache_key, future, args, kwargs)
+        return wrapper
+    return decorator
+
+def _log_refresh_error(task):
+    """Done callback for background refreshes, so their errors are logged instead of lost"""
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Error refreshing cached result in the background: {str(task.exception())}")
+
+# Scraped pages are embedded into the semantic store by one background
+# worker, so a query never waits on the embedding model
+_site_indexer = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="site-indexer")
+
+def index_site_results(site_results, madhab=None):
+    """Queue scraped website results for the semantic store; returns the future"""
+    future = _site_indexer.submit(add_site_results, site_results, madhab)
+    future.add_done_callback(_log_index_error)
+    return future
+
+def _log_index_error(future):
+    if future.exception() is not None:
+        print(f"Error indexing scraped results: {str(future.exception())}")
+
+def retry_request(func):
+    """Decorator to retry failed requests.
+
+    Synchronous functions report the final failure with st.error and return
+    None. Coroutine functions re-raise it so the retrieval pipeline can
+    collect the error for the source that failed.
+    """
+    if asyncio.iscoroutinefunction(func):
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            retries = 0
+            
+            while True:
+                try:
+                    return await func(*args, **kwargs)
+                except http_client.TRANSIENT_ERRORS:
+                    retries += 1
+                    if retries >= MAX_RETRIES:
+                        raise
+                    await asyncio.sleep(RETRY_DELAY * retries)  # Exponential backoff
+        return async_wrapper
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        retries = 0
+        last_exception = None
+        
+        while retries < MAX_RETRIES:
+            try:
+                return func(*args, **kwargs)
+            except (requests.RequestException, aiohttp.ClientError) as e:
+                last_exception = e
+                retries += 1
+                if retries < MAX_RETRIES:
+                    time.sleep(RETRY_DELAY * retries)  # Exponential backoff
+        
+        # If all retries failed, log error and return None
+        st.error(f"Request failed after {MAX_RETRIES} attempts: {str(last_exception)}")
+        return None
+    return wrapper
+
+def sanitize_input(text):
+    """Sanitize user input to prevent injection attacks"""
+    if text is None:
+        return ""
+    # Escape HTML entities and strip potentially dangerous characters
+    return html.escape(text).strip()
+
+def run_retrieval(coro):
+    """Run a retrieval coroutine to completion on the shared HTTP client loop"""
+    # The loop runs in another thread, so carry the caller's trace over
+    return http_client.run(metrics.bind_trace(coro, metrics.current_trace()))
+
+async def _fetch(url, params=None, as_json=False):
+    """Fetch a URL through the shared connection pool and return (status, body)"""
+    return await http_client.fetch(url, params=params, as_json=as_json)
+
+@metrics.timed()
+@cached(3600)  # Cache for 1 hour
+@retry_request
+async def search_islamic_websites(query, madhab=None):
+    """Search reputable Islamic websites for information about salah"""
+    sanitized_query = sanitize_input(query)
+    results = []
+    
+    # List of reputable Islamic websites to search
+    websites = [
+        {"name": "IslamQA", "url": f"https://islamqa.info/en/search?q={sanitized_query}+prayer"},
+        {"name": "SeekersGuidance", "url": f"https://seekersguidance.org/search/{sanitized_query}+prayer/"},
+        {"name": "AboutIslam", "url": f"https://aboutislam.net/?s={sanitized_query}+prayer"}
+    ]
+    
+    # Add madhab-specific sources if madhab is specified
+    if madhab:
+        sanitized_madhab = sanitize_input(madhab)
+        if sanitized_madhab.lower() == "hanafi":
+            websites.append({"name": "Hanafi Fiqh", "url": f"https://hanafifiqh.org/?s={sanitized_query}+prayer"})
+        elif sanitized_madhab.lower() == "shafii":
+            websites.append({"name": "Shafii Fiqh", "url": f"https://seekersguidance.org/search/{sanitized_query}+prayer+shafi/"})
+        elif sanitized_madhab.lower() == "maliki":
+            websites.append({"name": "Maliki Fiqh", "url": f"https://seekersguidance.org/search/{sanitized_query}+prayer+maliki/"})
+        elif sanitized_madhab.lower() == "hanbali":
+            websites.append({"name": "Hanbali Fiqh", "url": f"https://islamqa.info/en/search?q={sanitized_query}+prayer+hanbali"})
+    
+    # Fetch all websites concurrently
+    site_results = await asyncio.gather(*(_fetch_and_parse_website(site) for site in websites))
+    for site, site_result in zip(websites, site_results):
+        if site_result:
+            results.append({
+                "source": site["name"],
+                "results": site_result
+            })
+    
+    return results
+
+@metrics.timed("fetch_website")
+async def _fetch_and_parse_website(site):
+    """Helper function to fetch and parse a website"""
+    try:
+        status, page = await _fetch(site["url"])
+        
+        if status == 200:
+            # Parsing is CPU work; keep it off the event loop shared by all sessions
+            return await asyncio.to_thread(extract_site_results, site["name"], page)
+        return None
+    except Exception as e:
+        print(f"Error in _fetch_and_parse_website for {site['name']}: {str(e)}")
+        return None
+
+@metrics.timed()
+async def search_sunnah_database(query):
+    """Search hadith collections for relevant information.
+
+    Uses the local hadith index when one has been built (see hadith_index.py)
+    and falls back to scraping sunnah.com otherwise.
+    """
+    # BM25 search is CPU work; keep it off the event loop shared by all sessions
+    hadiths = await asyncio.to_thread(search_hadith, query, limit=5)
+    if hadiths is not None:
+        return hadiths
+    return await _scrape_sunnah_com(query)
+
+@cached(86400)  # Cache for 1 day
+@retry_request
+async def _scrape_sunnah_com(query):
+    """Search hadith collections on sunnah.com"""
+    sanitized_query = sanitize_input(query)
+    
+    # Using sunnah.com for search results (web scraping as they don't have a public API)
+    url = f"https://sunnah.com/search?q={sanitized_query}"
+    status, page = await _fetch(url)
+    
+    if status == 200:
+        # Parse hadith results from sunnah.com, top 5 only
+        return await asyncio.to_thread(extract_hadith_results, page, limit=5)
+    return None
+
+@metrics.timed()
+async def search_quran(query):
+    """Search Quran for specific keywords.
+
+    Uses the local Quran index when one has been built (see quran_index.py)
+    and falls back to the quran.com search API otherwise.
+    """
+    # BM25 search is CPU work; keep it off the event loop shared by all sessions
+    verses = await asyncio.to_thread(search_verses, query, size=5)
+    if verses is not None:
+        return verses
+    return await _search_quran_api(query)
+
+@cached(604800)  # Cache for 1 week (Quran content doesn't change)
+@retry_request
+async def _search_quran_api(query):
+    """Search Quran for specific keywords with the quran.com API"""
+    sanitized_query = sanitize_input(query)
+    
+    status, data = await _fetch(QURAN_API_URL, params={
+        "q": sanitized_query,
+        "size": 5,
+        "page": 1,
+        "language": "en"
+    }, as_json=True)
+    
+    if status == 200:
+        return data
+    print(f"Quran API returned status code {status}")
+    return None
+
+@metrics.timed()
+def geocode_location(city, country):
+    """Resolve a city to its coordinates and timezone name.
+
+    Goes through the process-wide location cache (see locations.py); the
+    bundled gazetteer is tried before Nominatim. Returns {"latitude",
+    "longitude", "timezone"} or None if the place cannot be found.
+    """
+    return resolve_location(city, country)
+
+def calculation_method(madhab=None):
+    """Return (calculation method id, Asr shadow factor) for a madhab"""
+    # Map madhabs to calculation methods for better accuracy
+    method_map = {
+        "hanafi": 1,  # University of Islamic Sciences, Karachi (Hanafi)
+        "shafii": 3,  # Muslim World League (close to Shafi'i)
+        "maliki": 3,  # Muslim World League (used by many Malikis)
+        "hanbali": 4,  # Umm Al-Qura University, Makkah
+        None: 2       # Islamic Society of North America (default)
+    }
+    
+    method = method_map.get(madhab.lower() if madhab else None, 2)
+    asr_factor = ASR_FACTORS["hanafi"] if madhab and madhab.lower() == "hanafi" else ASR_FACTORS["standard"]
+    return method, asr_factor
+
+@metrics.timed()
+def get_prayer_times(city, country, madhab=None):
+    """Get prayer times for a specific location, calculated locally.
+
+    Returns a dict shaped like an Aladhan timingsByCity response for the
+    location's current local day, or None if the location cannot be found.
+    """
+    
+    sanitized_city = sanitize_input(city)
+    sanitized_country = sanitize_input(country)
+    method, asr_factor = calculation_method(madhab)
+    
+    location = geocode_location(sanitized_city, sanitized_country)
+    if not location:
+        return None
+    
+    day = datetime.now(pytz.timezone(location["timezone"])).date()
+    return _prayer_times(location["latitude"], location["longitude"], location["timezone"], day.isoformat(), method, asr_factor)
+
+@cached(86400, stale_seconds=0)  # The day is part of the key, so another day's times are never served
+def _prayer_times(latitude, longitude, timezone_name, day, method, asr_factor):
+    return prayer_times_response(latitude, longitude, timezone_name, method, asr_factor, date.fromisoformat(day))
+
+@metrics.timed()
+def get_prayer_schedule(city, country, madhab=None):
+    """Today's PrayerSchedule for a location, or None if it cannot be found.
+
+    Schedules are cached per location, method and local day, so every
+    session showing the same place shares one.
+    """
+    location = geocode_location(sanitize_input(city), sanitize_input(country))
+    if not location:
+        return None
+    method, asr_factor = calculation_method(madhab)
+    day = datetime.now(pytz.timezone(location["timezone"])).date()
+    return _prayer_schedule(location["latitude"], location["longitude"], location["timezone"], day.isoformat(), method, asr_factor)
+
+@cached(86400, stale_seconds=0)  # The day is part of the key
+def _prayer_schedule(latitude, longitude, timezone_name, day, method, asr_factor):
+    return PrayerSchedule(latitude, longitude, timezone_name, date.fromisoformat(day), method, asr_factor)
+
+@metrics.timed()
+def get_qibla_direction(city, country):
+    """Get Qibla direction and distance to Makkah for a location, calculated locally"""
+    location = geocode_location(sanitize_input(city), sanitize_input(country))
+    if not location:
+        return None
+    return qibla_response(location["latitude"], location["longitude"])
+
+def uses_location(query, city=None, country=None):
+    """Whether gather_sources would answer query with location data (prayer times or Qibla)"""
+    lowered_query = query.lower()
+    return bool(city and country) and (
+        "qibla" in lowered_query or any(keyword in lowered_query for keyword in PRAYER_TIME_KEYWORDS)
+    )
+
+async def gather_sources(query, madhab=None, city=None, country=None, deadline=QUERY_DEADLINE):
+    """Fetch every source relevant to a chat query concurrently.
+
+    Returns (results, errors). Sources still running when the deadline passes
+    are cancelled and reported as errors, so the total latency is bounded by
+    the slowest source (or the deadline) rather than the sum of all sources.
+    """
+    lowered_query = query.lower()
+    
+    # source name -> (error description, task)
+    tasks = {}
+    
+    # 1. Search stored passages by meaning, alongside the other sources
+    semantic = asyncio.create_task(asyncio.to_thread(search_passages, query, madhab=madhab))
+    
+    # 2. Search hadith database
+    if any(keyword in lowered_query for keyword in HADITH_KEYWORDS):
+        tasks["Hadith Database"] = ("searching hadith database", asyncio.create_task(search_sunnah_database(query)))
+    
+    # 3. Get prayer times if location is provided and query seems relevant
+    if city and country and any(keyword in lowered_query for keyword in PRAYER_TIME_KEYWORDS):
+        tasks["Prayer Times API"] = ("fetching prayer times", asyncio.create_task(asyncio.to_thread(get_prayer_times, city, country, madhab)))
+    
+    # 4. Get Qibla direction if location is provided and query asks for it
+    if city and country and "qibla" in lowered_query:
+        tasks["Qibla"] = ("calculating Qibla direction", asyncio.create_task(asyncio.to_thread(get_qibla_direction, city, country)))
+    
+    # 5. Search Quran if relevant
+    if any(keyword in lowered_query for keyword in QURAN_KEYWORDS):
+        tasks["Quran API"] = ("searching Quran", asyncio.create_task(search_quran(query)))
+    
+    # 6. The Islamic websites are only scraped when too few passages from
+    # earlier scrapes for this madhab are close enough
+    errors = []
+    passages = []
+    started = time.monotonic()
+    done, _ = await asyncio.wait([semantic], timeout=deadline)
+    if semantic in done:
+        try:
+            passages = semantic.result()
+        except Exception as e:
+            errors.append(f"Error searching stored passages: {str(e) or type(e).__name__}")
+    else:
+        semantic.cancel()
+        errors.append(f"Error searching stored passages: timed out after {deadline} seconds")
+    if sum(1 for passage in passages if "madhab" in passage) < SEMANTIC_MIN_PASSAGES:
+        tasks = {"Islamic Websites": ("searching Islamic websites", asyncio.create_task(search_islamic_websites(query, madhab))), **tasks}
+    remaining = max(0, deadline - (time.monotonic() - started))
+    
+    pending = set()
+    if tasks:
+        _, pending = await asyncio.wait([task for _, task in tasks.values()], timeout=remaining)
+    for task in pending:
+        task.cancel()
+    
+    results = []
+    if passages:
+        results.append({"source": "Semantic Search", "data": passages})
+    for source, (description, task) in tasks.items():
+        if task in pending:
+            errors.append(f"Error {description}: timed out after {deadline} seconds")
+            continue
+        try:
+            data = task.result()
+        except Exception as e:
+            errors.append(f"Error {description}: {str(e) or type(e).__name__}")
+            continue
+        
+        if source in ("Prayer Times API", "Qibla"):
+            if data and data.get("code") == 200:
+                results.append({"source": source, "data": data["data"]})
+        elif source == "Quran API":
+            if data and "search" in data and "results" in data["search"]:
+                results.append({"source": source, "data": {"verses": data["search"]["results"]}})
+        elif data:
+            results.append({"source": source, "data": data})
+            if source == "Islamic Websites":
+                index_site_results(data, madhab)
+    
+    return results, errors
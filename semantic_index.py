@@ -0,0 +1,234 @@
+"""Semantic passage search over the hadith, Quran and fiqh sources.
+
+Passages from the local hadith and Quran indexes are chunked, embedded and
+saved to a vector store ahead of time:
+
+    python semantic_index.py build
+
+Results scraped from the Islamic websites are kept in a separate, bounded
+in-memory store as they come in, tagged with the madhab they were searched
+for, so repeated questions can be answered from stored passages without
+scraping the sites again. Scraped passages expire after a day.
+"""
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+import metrics
+from embeddings import embed, get_embedder
+from hadith_index import get_hadith_index
+from quran_index import get_quran_index
+from vector_store import VectorStore, chunk_text
+
+SEMANTIC_INDEX_PATH = os.getenv(
+    "SALAH_GPT_SEMANTIC_INDEX",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "semantic_index"),
+)
+
+# Passages scoring below this cosine similarity are not used; unset uses the
+# embedder's own min_score, as the scales of the embedders differ
+SEMANTIC_MIN_SCORE = float(os.getenv("SALAH_GPT_SEMANTIC_MIN_SCORE")) if os.getenv("SALAH_GPT_SEMANTIC_MIN_SCORE") else None
+SEMANTIC_TOP_K = 5
+
+# Bounds for the passages scraped from the Islamic websites
+SITE_PASSAGES_MAX_ENTRIES = int(os.getenv("SALAH_GPT_SITE_PASSAGES_MAX_ENTRIES", "5000"))
+SITE_PASSAGES_TTL = int(os.getenv("SALAH_GPT_SITE_PASSAGES_TTL", "86400"))  # seconds
+
+# Stores larger than this get an IVF index instead of brute-force search
+IVF_MIN_VECTORS = 20000
+
+EMBED_BATCH_SIZE = 256
+
+
+def _corpus_passages():
+    """Chunked passages with payloads from the local hadith and Quran indexes"""
+    hadiths = get_hadith_index()
+    if hadiths is not None:
+        for hadith in hadiths.documents():
+            for chunk in chunk_text(hadith["text"]):
+                yield chunk, {"source": hadith["collection"], "text": chunk, "reference": hadith["reference"]}
+
+    quran = get_quran_index()
+    if quran is not None:
+        for verse in quran.documents():
+            text = verse["translation"] or verse["text"]
+            yield text, {"source": "Quran", "text": text, "reference": f"Quran {verse['verse_key']}"}
+
+
+def build(index_path=SEMANTIC_INDEX_PATH):
+    """Embed every local passage and save the vector store"""
+    embedder = get_embedder()
+    store = VectorStore(embedder.dimensions, embedder.name)
+    batch = []
+    for passage in _corpus_passages():
+        batch.append(passage)
+        if len(batch) == EMBED_BATCH_SIZE:
+            store.add(embedder.embed([text for text, _ in batch]), [payload for _, payload in batch])
+            batch = []
+    if batch:
+        store.add(embedder.embed([text for text, _ in batch]), [payload for _, payload in batch])
+
+    if len(store) >= IVF_MIN_VECTORS:
+        store.build_ivf()
+    store.save(index_path)
+    return len(store)
+
+
+class SitePassages:
+    """Bounded, expiring vector store of scraped website passages.
+
+    Passages are keyed by (madhab, link): the same page found for another
+    madhab is a separate entry, and a search only sees the passages of its
+    own madhab. Entries expire after ttl seconds and the oldest are evicted
+    beyond max_entries.
+    """
+
+    def __init__(self, dimensions, max_entries=SITE_PASSAGES_MAX_ENTRIES, ttl=SITE_PASSAGES_TTL):
+        self.dimensions = dimensions
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # (madhab, link) -> (expires_at, vector, payload)
+        self._matrices = {}  # madhab -> (expires_at array, vectors, payloads), rebuilt after changes
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def missing(self, madhab, keys):
+        """The keys without a live entry for madhab"""
+        now = time.time()
+        with self._lock:
+            return [key for key in keys if (madhab, key) not in self._entries or self._entries[(madhab, key)][0] <= now]
+
+    def add(self, madhab, keys, vectors, payloads):
+        now = time.time()
+        with self._lock:
+            for key, vector, payload in zip(keys, vectors, payloads):
+                self._entries.pop((madhab, key), None)
+                self._entries[(madhab, key)] = (now + self.ttl, vector, payload)
+            # Insertion order is expiry order, so expired entries are at the front
+            while self._entries and (len(self._entries) > self.max_entries or next(iter(self._entries.values()))[0] <= now):
+                self._entries.popitem(last=False)
+            self._matrices.clear()
+
+    def search(self, queries, madhab, k=SEMANTIC_TOP_K):
+        """Top-k (score, payload) lists for a batch of query vectors, best first"""
+        with self._lock:
+            matrix = self._matrices.get(madhab)
+            if matrix is None:
+                entries = [entry for (entry_madhab, _), entry in self._entries.items() if entry_madhab == madhab]
+                matrix = self._matrices[madhab] = (
+                    np.array([entry[0] for entry in entries]),
+                    np.array([entry[1] for entry in entries], dtype=np.float32).reshape(-1, self.dimensions),
+                    [entry[2] for entry in entries],
+                )
+        expires_at, vectors, payloads = matrix
+        if not len(payloads):
+            return [[] for _ in queries]
+        live = expires_at > time.time()
+        results = []
+        for scores in np.asarray(queries, dtype=np.float32) @ vectors.T:
+            scores = np.where(live, scores, -np.inf)
+            best = np.argsort(-scores, kind="stable")[:k]
+            results.append([(float(scores[i]), payloads[i]) for i in best if live[i]])
+        return results
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrices.clear()
+
+
+_store = None
+_site_passages = None
+_store_lock = threading.Lock()
+
+
+def get_semantic_store():
+    """Return the process-wide vector store, loading the saved one if it matches the embedder"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = _load_store()
+    return _store
+
+
+def get_site_passages():
+    """Return the process-wide store of scraped website passages"""
+    global _site_passages
+    if _site_passages is None:
+        with _store_lock:
+            if _site_passages is None:
+                _site_passages = SitePassages(get_embedder().dimensions)
+    return _site_passages
+
+
+def _load_store():
+    embedder = get_embedder()
+    if os.path.exists(os.path.join(SEMANTIC_INDEX_PATH, "meta.json")):
+        store = VectorStore.load(SEMANTIC_INDEX_PATH)
+        if store.embedder_name == embedder.name:
+            return store
+        print(f"Semantic index was built with {store.embedder_name}, not {embedder.name}; rebuild it with python semantic_index.py build")
+    return VectorStore(embedder.dimensions, embedder.name)
+
+
+def search_passages_batch(queries, k=SEMANTIC_TOP_K, min_score=SEMANTIC_MIN_SCORE, madhab=None):
+    """Top-k passages for each query as payload dicts with a "score", best first.
+
+    Searches the local corpus and the passages scraped for the same madhab.
+    """
+    if min_score is None:
+        min_score = get_embedder().min_score
+    store = get_semantic_store()
+    site_passages = get_site_passages()
+    if not len(store) and not len(site_passages):
+        return [[] for _ in queries]
+    vectors = embed(queries)
+    corpus_matches = store.search(vectors, k) if len(store) else [[] for _ in queries]
+    site_matches = site_passages.search(vectors, madhab or "", k)
+    results = []
+    for corpus, site in zip(corpus_matches, site_matches):
+        matches = sorted(corpus + site, key=lambda match: -match[0])[:k]
+        results.append([dict(payload, score=round(score, 3)) for score, payload in matches if score >= min_score])
+    return results
+
+
+@metrics.timed("semantic_search")
+def search_passages(query, k=SEMANTIC_TOP_K, min_score=SEMANTIC_MIN_SCORE, madhab=None):
+    """Top-k passages for one query (see search_passages_batch)"""
+    return search_passages_batch([query], k, min_score, madhab)[0]
+
+
+def add_site_results(site_results, madhab=None):
+    """Add scraped website results ({"source", "results": [...]}) searched for madhab.
+
+    Each result is matched by its title, which on these sites reads like the
+    question the page answers, rather than by the title and snippet.
+    """
+    site_passages = get_site_passages()
+    madhab = madhab or ""
+    passages = {}
+    for site in site_results or []:
+        for result in site["results"]:
+            text = f"{result['title']}. {result['snippet']}"
+            passages.setdefault(result["link"] or text, {
+                "source": site["source"], "text": text, "reference": result["title"], "link": result["link"], "madhab": madhab
+            })
+    keys = site_passages.missing(madhab, list(passages))
+    if keys:
+        payloads = [passages[key] for key in keys]
+        site_passages.add(madhab, keys, embed([payload["reference"] for payload in payloads]), payloads)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or sys.argv[1] != "build":
+        print("Usage: python semantic_index.py build")
+        sys.exit(1)
+    count = build()
+    print(f"Embedded {count} passages into {SEMANTIC_INDEX_PATH}")
@@ -0,0 +1,14 @@
+import os
+import sys
+import tempfile
+
+# Deterministic embeddings, and no files written into data/
+os.environ.setdefault("SALAH_GPT_EMBEDDER", "hashing")
+os.environ["SALAH_GPT_LOCATION_CACHE"] = ""
+os.environ["SALAH_GPT_CACHE_DB"] = ""
+# Tests never see locally built hadith, Quran or semantic indexes
+_EMPTY_DATA = tempfile.mkdtemp(prefix="salah-gpt-tests-")
+for name in ("SALAH_GPT_HADITH_INDEX", "SALAH_GPT_QURAN_INDEX", "SALAH_GPT_SEMANTIC_INDEX"):
+    os.environ[name] = os.path.join(_EMPTY_DATA, name.lower())
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
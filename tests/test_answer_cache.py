@@ -0,0 +1,43 @@
+import pytest
+
+from answer_cache import SemanticAnswerCache, answer_bucket
+
+BUCKET = answer_bucket(None, "en")
+
+NEAR_DUPLICATES = [
+    ("Can I pray Fajr after sunrise?", "Can I pray Fajr before sunrise?"),
+    ("What is the awrah of a man?", "What is the awrah of a woman?"),
+    ("Does he have to repeat the prayer?", "Does she have to repeat the prayer?"),
+    ("Can his prayer be valid?", "Can her prayer be valid?"),
+    ("Do I need wudu before touching the Quran?", "Do I need wudu after touching the Quran?"),
+    ("Should I pray Sunnah before Dhuhr?", "Can I pray Sunnah before Dhuhr?"),
+    ("Can I pray if I am bleeding?", "Can I pray until I am bleeding?"),
+]
+
+
+@pytest.mark.parametrize("cached, asked", NEAR_DUPLICATES)
+def test_near_duplicate_is_a_miss(cached, asked):
+    cache = SemanticAnswerCache()
+    cache.set(cached, BUCKET, "cached answer")
+    assert cache.get(asked, BUCKET) is None
+    assert cache.get(cached, BUCKET) == "cached answer"
+
+
+def test_rephrased_query_is_a_hit():
+    cache = SemanticAnswerCache()
+    cache.set("how to pray fajr", BUCKET, "fajr answer")
+    assert cache.get("How do I pray Fajr?", BUCKET) == "fajr answer"
+
+
+def test_best_match_with_same_qualifiers_wins():
+    cache = SemanticAnswerCache()
+    cache.set("Can I pray Fajr after sunrise?", BUCKET, "after")
+    cache.set("Can I pray Fajr before sunrise?", BUCKET, "before")
+    assert cache.get("can i pray fajr before sunrise", BUCKET) == "before"
+    assert cache.get("Can I pray Fajr after the sunrise?", BUCKET) == "after"
+
+
+def test_buckets_are_separate():
+    cache = SemanticAnswerCache()
+    cache.set("How to pray Witr?", answer_bucket("Hanafi", "en"), "hanafi")
+    assert cache.get("How to pray Witr?", answer_bucket("Shafii", "en")) is None
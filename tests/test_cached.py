@@ -0,0 +1,138 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import retrieval
+from response_cache import RESPONSE_CACHE
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    RESPONSE_CACHE.clear()
+    yield
+    # Background refreshes finish their bookkeeping shortly after storing
+    wait_for(lambda: not retrieval._in_flight)
+    RESPONSE_CACHE.clear()
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_concurrent_misses_call_once():
+    calls = []
+
+    @retrieval.cached(60)
+    def lookup(name):
+        calls.append(name)
+        time.sleep(0.2)
+        return f"result for {name}"
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: lookup("fajr"), range(8)))
+    assert calls == ["fajr"]
+    assert results == ["result for fajr"] * 8
+    assert lookup("fajr") == "result for fajr" and calls == ["fajr"]
+
+
+def test_concurrent_async_misses_call_once():
+    calls = []
+
+    @retrieval.cached(60)
+    async def lookup(name):
+        calls.append(name)
+        await asyncio.sleep(0.1)
+        return f"result for {name}"
+
+    async def main():
+        return await asyncio.gather(*(lookup("asr") for _ in range(8)))
+
+    assert asyncio.run(main()) == ["result for asr"] * 8
+    assert calls == ["asr"]
+
+
+def test_stale_hit_returns_old_value_and_refreshes_once(monkeypatch):
+    calls = []
+    release = threading.Event()
+
+    @retrieval.cached(10, stale_seconds=100)
+    def lookup(name):
+        calls.append(name)
+        if len(calls) > 1:
+            release.wait(5)
+        return f"version {len(calls)}"
+
+    assert lookup("isha") == "version 1"
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 50)
+
+    # Every stale hit is answered at once; only one refresh runs meanwhile
+    assert [lookup("isha") for _ in range(5)] == ["version 1"] * 5
+    release.set()
+    wait_for(lambda: lookup("isha") == "version 2")
+    assert len(calls) == 2
+
+
+def test_stale_async_hit_refreshes_in_the_background(monkeypatch):
+    calls = []
+
+    @retrieval.cached(10, stale_seconds=100)
+    async def lookup(name):
+        calls.append(name)
+        await asyncio.sleep(0.05)
+        return f"version {len(calls)}"
+
+    async def main():
+        first = await lookup("dhuhr")
+        now = time.time()
+        monkeypatch.setattr(time, "time", lambda: now + 50)
+        stale = await asyncio.gather(*(lookup("dhuhr") for _ in range(5)))
+        await asyncio.sleep(0.2)
+        return first, stale, await lookup("dhuhr")
+
+    first, stale, refreshed = asyncio.run(main())
+    assert first == "version 1" and stale == ["version 1"] * 5 and refreshed == "version 2"
+    assert len(calls) == 2
+
+
+def test_error_reaches_every_waiter_and_is_not_cached():
+    calls = []
+
+    @retrieval.cached(60)
+    def lookup(name):
+        calls.append(name)
+        time.sleep(0.2)
+        raise ConnectionError("site down")
+
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        futures = [pool.submit(lookup, "maghrib") for _ in range(6)]
+    assert all(isinstance(future.exception(), ConnectionError) for future in futures)
+    assert calls == ["maghrib"]
+
+    with pytest.raises(ConnectionError):
+        lookup("maghrib")
+    assert len(calls) == 2
+
+
+def test_async_error_reaches_every_waiter_and_is_not_cached():
+    calls = []
+
+    @retrieval.cached(60)
+    async def lookup(name):
+        calls.append(name)
+        await asyncio.sleep(0.05)
+        raise ConnectionError("site down")
+
+    async def main():
+        return await asyncio.gather(*(lookup("fajr") for _ in range(4)), return_exceptions=True)
+
+    assert all(isinstance(result, ConnectionError) for result in asyncio.run(main()))
+    assert calls == ["fajr"]
+    assert all(isinstance(result, ConnectionError) for result in asyncio.run(main()))
+    assert len(calls) == 2
@@ -0,0 +1,69 @@
+import pytest
+
+import chat_pipeline
+from model_router import LARGE_MODEL, SMALL_MODEL
+
+MESSAGES = [{"role": "user", "content": "How do I pray Fajr?"}]
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """Scripted chat(): answers[model] is a reply tuple or an exception to raise"""
+    answers, calls = {}, []
+
+    def chat(api_key, model, messages, on_text=None):
+        calls.append(model)
+        answer = answers[model]
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    monkeypatch.setattr(chat_pipeline, "chat", chat)
+    return answers, calls
+
+
+def complete(errors):
+    return chat_pipeline.route_and_complete("key", "How do I pray Fajr?", MESSAGES, 100, on_error=errors.append)
+
+
+def test_simple_question_stays_on_the_small_model(upstream):
+    answers, calls = upstream
+    answers[SMALL_MODEL] = ("Pray two rak'ahs before sunrise.", "stop")
+    errors = []
+    assert complete(errors) == "Pray two rak'ahs before sunrise."
+    assert calls == [SMALL_MODEL] and errors == []
+
+
+def test_cut_off_answer_is_escalated(upstream):
+    answers, calls = upstream
+    answers[SMALL_MODEL] = ("Pray two", "length")
+    answers[LARGE_MODEL] = ("Pray two rak'ahs before sunrise.", "stop")
+    assert complete([]) == "Pray two rak'ahs before sunrise."
+    assert calls == [SMALL_MODEL, LARGE_MODEL]
+
+
+def test_small_model_error_is_escalated(upstream):
+    answers, calls = upstream
+    answers[SMALL_MODEL] = RuntimeError("upstream down")
+    answers[LARGE_MODEL] = ("Pray two rak'ahs before sunrise.", "stop")
+    errors = []
+    assert complete(errors) == "Pray two rak'ahs before sunrise."
+    assert errors == []
+
+
+def test_weak_answer_is_kept_when_escalation_fails(upstream):
+    answers, calls = upstream
+    answers[SMALL_MODEL] = ("Pray two", "length")
+    answers[LARGE_MODEL] = RuntimeError("rate limited")
+    errors = []
+    assert complete(errors) == "Pray two"
+    assert errors == ["Error generating response: rate limited"]
+
+
+def test_no_answer_when_both_models_fail(upstream):
+    answers, calls = upstream
+    answers[SMALL_MODEL] = RuntimeError("upstream down")
+    answers[LARGE_MODEL] = RuntimeError("rate limited")
+    errors = []
+    assert complete(errors) is None
+    assert len(errors) == 1
@@ -0,0 +1,108 @@
+import pytest
+
+from context_builder import ITEM_MAX_TOKENS, build_context, count_tokens, truncate_to_tokens
+
+PRAYER_TIMES = {"source": "Prayer Times API", "data": {
+    "timings": {"Fajr": "06:03", "Sunrise": "08:06", "Dhuhr": "12:04", "Asr": "13:45", "Maghrib": "16:02", "Isha": "17:59", "Midnight": "00:01"},
+    "date": {"readable": "01 Jan 2024"},
+    "meta": {"timezone": "Europe/London"},
+}}
+QIBLA = {"source": "Qibla", "data": {"direction": 118.987, "distance": 4793.8}}
+
+
+def site(name, *items):
+    return {"source": name, "results": [{"title": title, "snippet": snippet, "link": link} for title, snippet, link in items]}
+
+
+def websites(*sites):
+    return {"source": "Islamic Websites", "data": list(sites)}
+
+
+def hadiths(*texts):
+    return {"source": "Hadith Database", "data": [
+        {"collection": "Sahih Muslim", "text": text, "reference": f"Sahih Muslim {number}"} for number, text in enumerate(texts, start=1)
+    ]}
+
+
+def quran(*verses):
+    return {"source": "Quran API", "data": {"verses": [
+        {"verse_key": key, "text": "", "translations": [{"text": text}]} for key, text in verses
+    ]}}
+
+
+def numbered(context):
+    return [line for line in context.splitlines() if line.startswith("[")]
+
+
+def test_structured_data_comes_first_in_compact_form():
+    context = build_context("when is fajr", [websites(site("IslamQA", ("Fajr time", "Fajr begins at true dawn.", "https://a/1"))), PRAYER_TIMES, QIBLA])
+    lines = context.splitlines()
+    assert lines[0] == "Prayer times for 01 Jan 2024 (Europe/London): Fajr 06:03, Sunrise 08:06, Dhuhr 12:04, Asr 13:45, Maghrib 16:02, Isha 17:59"
+    assert lines[1] == "Qibla: 119.0° from North, 4,794 km to Makkah"
+    assert lines[2] == "[1] IslamQA: Fajr time. Fajr begins at true dawn. (https://a/1)"
+
+
+def test_items_ranked_by_query_overlap_then_source():
+    context = build_context("sunnah prayers before dhuhr", [
+        websites(site("IslamQA",
+                      ("Zakat on gold", "Zakat is due on gold above the nisab.", "https://a/zakat"),
+                      ("Sunnah before Dhuhr", "Four rak'ahs of sunnah prayers before Dhuhr.", "https://a/sunnah"))),
+        hadiths("The Prophet never left the four rak'ahs of sunnah before Dhuhr."),
+        quran(("2:43", "And establish prayer and give zakah.")),
+    ])
+    assert [line.split(":")[0] for line in numbered(context)] == ["[1] IslamQA", "[2] Sahih Muslim", "[3] Quran", "[4] IslamQA"]
+    assert "Sunnah before Dhuhr" in numbered(context)[0]
+    assert "Zakat on gold" in numbered(context)[3]
+
+
+def test_equal_overlap_prefers_quran_then_hadith_then_websites():
+    context = build_context("prayer", [
+        websites(site("IslamQA", ("Prayer", "On prayer.", "https://a/1"))),
+        hadiths("Prayer is the pillar of the religion."),
+        quran(("2:43", "And establish prayer.")),
+    ])
+    assert [line.split(":")[0] for line in numbered(context)] == ["[1] Quran", "[2] Sahih Muslim", "[3] IslamQA"]
+
+
+def test_duplicates_are_dropped_by_text_and_link():
+    context = build_context("witr", [websites(
+        site("IslamQA", ("Is witr obligatory?", "Witr is a confirmed sunnah.", "https://a/witr")),
+        site("SeekersGuidance",
+             ("Is Witr obligatory", "Witr is a confirmed Sunnah!", "https://b/witr"),
+             ("Witr, again", "The same page found by another search.", "https://a/witr")),
+    )])
+    assert len(numbered(context)) == 1
+
+
+@pytest.mark.parametrize("budget", [40, 80, 150, 400])
+def test_budget_is_respected(budget):
+    items = [(f"Answer {i} about prayer", "Details of the ruling on prayer. " * 10, f"https://a/{i}") for i in range(20)]
+    context = build_context("prayer ruling", [PRAYER_TIMES, websites(site("IslamQA", *items))], budget=budget)
+    assert count_tokens(context) <= budget
+    # Numbering stays consecutive when items are left out
+    assert [line.split("]")[0] for line in numbered(context)] == [f"[{n}" for n in range(1, len(numbered(context)) + 1)]
+
+
+def test_smaller_items_still_fill_the_budget_after_a_large_one_is_skipped():
+    large = ("Prayer in detail", "prayer " * 150, "https://a/long")
+    small = ("Prayer briefly", "Pray on time.", "https://a/short")
+    context = build_context("prayer", [websites(site("IslamQA", large, small))], budget=60)
+    assert numbered(context) == ["[1] IslamQA: Prayer briefly. Pray on time. (https://a/short)"]
+
+
+def test_long_items_are_truncated():
+    text = " ".join(f"word{i}" for i in range(2000))
+    context = build_context("word1", [hadiths(text)], budget=10000)
+    line = numbered(context)[0]
+    assert line.endswith(" … (Sahih Muslim 1)")
+    assert count_tokens(line) <= ITEM_MAX_TOKENS + count_tokens("[1] Sahih Muslim:  (Sahih Muslim 1)")
+
+
+def test_truncate_to_tokens_cuts_at_a_word_boundary():
+    text = "one two three four five six seven eight nine ten " * 10
+    assert truncate_to_tokens(text, 1000) == text
+    cut = truncate_to_tokens(text, 10)
+    assert count_tokens(cut) <= 10
+    assert cut.endswith(" …")
+    kept = cut[:-2].split()
+    assert kept and text.split()[:len(kept)] == kept
@@ -0,0 +1,91 @@
+import pytest
+
+from fast_answers import classify_intent, fast_answer
+
+LONDON_TIMES = {
+    "code": 200,
+    "data": {
+        "timings": {"Fajr": "05:56", "Sunrise": "07:28", "Dhuhr": "12:46", "Asr": "15:12", "Maghrib": "18:03", "Isha": "19:54"},
+        "date": {"readable": "17 Oct 2026"},
+    },
+}
+
+
+def prayer_times(city, country, madhab=None):
+    return LONDON_TIMES
+
+
+@pytest.mark.parametrize("query, intent", [
+    ("What time is Fajr today?", "prayer_time"),
+    ("How many rakahs in Maghrib?", "rakahs"),
+    ("Which way is the qibla?", "qibla"),
+    ("What is the awrah of a woman?", "awrah"),
+])
+def test_structured_questions(query, intent):
+    assert classify_intent(query)[0] == intent
+
+
+@pytest.mark.parametrize("query", [
+    "When does Fajr end?",
+    "When is the last time for Isha?",
+    "When is it makruh to pray Asr?",
+    "When is it forbidden to pray after Fajr?",
+    "What time should I stop eating before Fajr in Ramadan?",
+    "When is suhoor before Fajr?",
+    "When does sehri end before Fajr?",
+    "How many rakahs does a traveler pray for Dhuhr?",
+    "How many rakahs does a traveller pray for Isha?",
+    "How many rakahs does a musafir pray for Asr?",
+    "What is the awrah of a man in front of his wife?",
+])
+def test_special_cases_go_to_the_model(query):
+    assert classify_intent(query) == (None, {})
+    assert fast_answer(query, city="London", country="UK", prayer_times=prayer_times) is None
+
+
+def test_awrah_gender_from_query():
+    assert classify_intent("What is the awrah of a man?") == ("awrah", {"gender": "Male"})
+    assert classify_intent("What is the awrah for women?") == ("awrah", {"gender": "Female"})
+
+
+def test_prayer_time_answer():
+    answer = fast_answer("What time is Fajr?", city="London", country="UK", prayer_times=prayer_times)
+    assert "05:56" in answer
+
+
+def test_sunnah_counts_follow_the_madhab():
+    hanafi = fast_answer("How many rakahs in Dhuhr?", "hanafi")
+    assert "| Dhuhr | 4 | 4 before, 2 after |" in hanafi and "Hanafi madhab" in hanafi
+    shafii = fast_answer("How many rakahs in Dhuhr?", "shafii")
+    assert "| Dhuhr | 4 | 2 before, 2 after |" in shafii and "Shafii madhab" in shafii
+    assert "| Maghrib | 3 | - |" in fast_answer("How many rakahs in Maghrib?", "maliki")
+
+
+class FakeSchedule:
+    timezone_name = "Europe/London"
+
+    def __init__(self, statuses):
+        self.statuses = statuses
+
+    def status(self, now=None):
+        return self.statuses.pop(0)
+
+
+def test_next_prayer_names_the_prayer():
+    schedule = FakeSchedule([{"next": "Asr", "next_start": 1792249920}])
+    answer = fast_answer("When is the next prayer?", city="London", country="UK", prayer_times=prayer_times, prayer_schedule=lambda *args: schedule)
+    assert "**Asr** at **16:12**" in answer
+    assert "Fajr" not in answer
+
+
+def test_next_prayer_skips_sunrise():
+    schedule = FakeSchedule([
+        {"next": "Sunrise", "next_start": 1792217280},
+        {"next": "Dhuhr", "next_start": 1792240560},
+    ])
+    answer = fast_answer("What time is the next prayer?", city="London", country="UK", prayer_schedule=lambda *args: schedule)
+    assert "**Dhuhr** at **13:36**" in answer
+
+
+def test_next_prayer_without_a_schedule_goes_to_the_model():
+    assert fast_answer("When is the next prayer?", city="London", country="UK", prayer_times=prayer_times) is None
@@ -0,0 +1,66 @@
+import os
+
+import pytest
+
+import html_extract
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+BENCH_FIXTURES = os.path.join(os.path.dirname(os.path.dirname(__file__)), "benchmarks", "fixtures")
+
+
+INSTALLED = {
+    "selectolax": html_extract.SelectolaxParser is not None,
+    "lxml": html_extract.lxml is not None,
+    "bs4": True,
+}
+BACKENDS = [pytest.param(name, marks=pytest.mark.skipif(not INSTALLED[name], reason=f"{name} is not installed"))
+            for name in html_extract.PARSERS]
+
+
+def read(directory, name):
+    with open(os.path.join(directory, name), encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.fixture(scope="module")
+def page():
+    return read(FIXTURES, "search_page.html")
+
+
+def test_site_results(page):
+    assert html_extract.extract_site_results("IslamQA", page, limit=5, backend=html_extract.get_backend("bs4")) == [
+        {"title": "How to pray Fajr", "link": "https://islamqa.info/answers/1/how-to-pray-fajr",
+         "snippet": "Fajr is two rak’ahs & is prayed before sunrise."},
+        {"title": "The sunnah of Fajr", "link": "https://islamqa.info/answers/2/sunnah-of-fajr",
+         "snippet": html_extract.NO_PREVIEW},
+        {"title": "الصلاة عماد الدين", "link": "https://islamqa.info/answers/3/%D8%A7%D9%84%D8%B5%D9%84%D8%A7%D8%A9",
+         "snippet": "Prayer is the pillar of the religion."},
+    ]
+
+
+@pytest.mark.parametrize("name", BACKENDS)
+@pytest.mark.parametrize("site", ["IslamQA", "SeekersGuidance", "AboutIslam", "Hanafi Fiqh"])
+def test_backends_extract_the_same_site_results(page, name, site):
+    expected = html_extract.extract_site_results(site, page, limit=5, backend=html_extract.get_backend("bs4"))
+    assert expected
+    assert html_extract.extract_site_results(site, page, limit=5, backend=html_extract.get_backend(name)) == expected
+
+
+@pytest.mark.parametrize("name", BACKENDS)
+def test_backends_extract_the_same_hadith(page, name):
+    results = html_extract.extract_hadith_results(page, backend=html_extract.get_backend(name))
+    assert results == [
+        {"collection": "Sahih al-Bukhari", "text": "The most beloved deed to Allah is prayer on time.", "reference": "Book 9, Hadith 527"},
+        {"collection": "Unknown Collection", "text": "A hadith whose collection is missing.", "reference": "Reference not available"},
+    ]
+
+
+@pytest.mark.parametrize("name", BACKENDS)
+@pytest.mark.parametrize("site, fixture", [
+    ("IslamQA", "islamqa.html"), ("SeekersGuidance", "seekersguidance.html"),
+    ("AboutIslam", "aboutislam.html"), ("Hanafi Fiqh", "hanafifiqh.html"),
+])
+def test_backends_agree_on_recorded_pages(name, site, fixture):
+    page = read(BENCH_FIXTURES, fixture)
+    expected = html_extract.extract_site_results(site, page, backend=html_extract.get_backend("bs4"))
+    assert html_extract.extract_site_results(site, page, backend=html_extract.get_backend(name)) == expected
@@ -0,0 +1,138 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import openai
+import pytest
+
+import llm_gateway
+
+MESSAGES = [{"role": "user", "content": "How do I pray Fajr?"}]
+
+
+def rate_limited(retry_after=None):
+    headers = {"retry-after": retry_after} if retry_after is not None else {}
+    return openai.RateLimitError("rate limited", response=SimpleNamespace(status_code=429, headers=headers, request=None), body=None)
+
+
+def completion(text):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text), finish_reason="stop")], usage=None)
+
+
+def chunk(text, finish_reason=None):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text), finish_reason=finish_reason)], usage=None)
+
+
+class FakeClient:
+    """Stands in for OpenAI(); each create() takes the next scripted reply.
+
+    A reply is a response, an exception to raise, or a list of stream
+    chunks in which an exception is raised mid-stream.
+    """
+
+    def __init__(self, *replies, delay=0):
+        self.replies = list(replies)
+        self.delay = delay
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages, stream=False, **kwargs):
+        self.calls += 1
+        time.sleep(self.delay)
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        if stream:
+            return self.stream(reply)
+        return reply
+
+    def stream(self, chunks):
+        for item in chunks:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Install a FakeClient for api key "test", without rate limiting or real backoff sleeps"""
+    monkeypatch.setattr(llm_gateway, "_bucket", llm_gateway.TokenBucket(1000, 1000))
+    delays = []
+    monkeypatch.setattr(llm_gateway, "time", SimpleNamespace(monotonic=time.monotonic, sleep=delays.append))
+
+    def install(*replies, delay=0):
+        fake = FakeClient(*replies, delay=delay)
+        monkeypatch.setitem(llm_gateway._clients, "test", fake)
+        fake.delays = delays
+        return fake
+    return install
+
+
+def test_token_bucket_allows_bursts_then_waits():
+    bucket = llm_gateway.TokenBucket(rate=20, capacity=2)
+    assert bucket.acquire(timeout=0) and bucket.acquire(timeout=0)
+    assert not bucket.acquire(timeout=0)
+    started = time.monotonic()
+    assert bucket.acquire(timeout=1)
+    assert 0.02 < time.monotonic() - started < 0.5
+
+
+def test_rate_limit_is_retried_after_retry_after(client):
+    fake = client(rate_limited("2"), completion("Two rak'ahs."))
+    assert llm_gateway.chat("test", "gpt-4o-mini", MESSAGES) == ("Two rak'ahs.", "stop")
+    assert fake.calls == 2
+    assert fake.delays == [2.0]
+
+
+def test_backoff_uses_full_jitter_without_retry_after(monkeypatch):
+    monkeypatch.setattr(llm_gateway.random, "uniform", lambda low, high: (low, high))
+    assert llm_gateway._backoff(1, rate_limited()) == (0, 2.0)
+    assert llm_gateway._backoff(10, rate_limited()) == (0, llm_gateway.LLM_BACKOFF_MAX)
+    # Retry-After is capped too
+    assert llm_gateway._backoff(1, rate_limited("3600")) == llm_gateway.LLM_BACKOFF_MAX
+
+
+def test_gives_up_after_max_retries(client):
+    fake = client(*[rate_limited("1")] * (llm_gateway.LLM_MAX_RETRIES + 1))
+    with pytest.raises(openai.RateLimitError):
+        llm_gateway.chat("test", "gpt-4o-mini", MESSAGES)
+    assert fake.calls == llm_gateway.LLM_MAX_RETRIES + 1
+
+
+def test_identical_concurrent_prompts_share_one_call(client):
+    fake = client(completion("Two rak'ahs."), delay=0.3)
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        results = list(pool.map(lambda _: llm_gateway.chat("test", "gpt-4o-mini", MESSAGES, on_text=None), range(5)))
+    assert fake.calls == 1
+    assert results == [("Two rak'ahs.", "stop")] * 5
+    assert llm_gateway._in_flight == {}
+
+
+def test_coalesced_caller_sees_the_full_text(client):
+    fake = client([chunk("Two "), chunk("rak'ahs.", "stop")], delay=0.3)
+    follower_text = []
+    leader = threading.Thread(target=llm_gateway.chat, args=("test", "gpt-4o-mini", MESSAGES), kwargs={"on_text": lambda text: None})
+    leader.start()
+    time.sleep(0.1)
+    assert llm_gateway.chat("test", "gpt-4o-mini", MESSAGES, on_text=follower_text.append) == ("Two rak'ahs.", "stop")
+    leader.join()
+    assert fake.calls == 1
+    assert follower_text == ["Two rak'ahs."]
+
+
+def test_stream_that_showed_text_is_not_retried(client):
+    fake = client([chunk("Two "), openai.APIConnectionError(request=None)], [chunk("Two rak'ahs.", "stop")])
+    shown = []
+    with pytest.raises(openai.APIConnectionError):
+        llm_gateway.chat("test", "gpt-4o-mini", MESSAGES, on_text=shown.append)
+    assert fake.calls == 1
+    assert shown == ["Two "]
+
+
+def test_stream_that_failed_before_any_text_is_retried(client):
+    fake = client([openai.APIConnectionError(request=None)], [chunk("Two rak'ahs.", "stop")])
+    shown = []
+    assert llm_gateway.chat("test", "gpt-4o-mini", MESSAGES, on_text=shown.append) == ("Two rak'ahs.", "stop")
+    assert fake.calls == 2
+    assert shown == ["Two rak'ahs."]
@@ -0,0 +1,92 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import locations
+from locations import LocationCache
+
+LONDON = {"latitude": 51.5, "longitude": -0.12, "timezone": "Europe/London"}
+
+
+def load(tmp_path, rows):
+    path = tmp_path / "locations.json"
+    path.write_text(json.dumps(rows), encoding="utf-8")
+    return LocationCache(path=str(path))
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "locations.json")
+    LocationCache(path=path).set(("london", "uk"), LONDON)
+    assert LocationCache(path=path).lookup(("london", "uk")) == (True, LONDON)
+
+
+def test_bad_rows_are_skipped(tmp_path):
+    cache = load(tmp_path, [
+        ["london", "uk", LONDON],
+        ["paris", "france"],
+        ["a", "b", "c", "d"],
+        "london",
+        ["berlin", "germany", {"latitude": 52.5}],
+        ["rome", "italy", None],
+        [1, 2, LONDON],
+        ["oslo", "norway", {"latitude": "north", "longitude": 10.7, "timezone": "Europe/Oslo"}],
+    ])
+    assert cache.stats()["entries"] == 1
+    assert cache.lookup(("london", "uk")) == (True, LONDON)
+
+
+def test_file_that_is_not_a_list(tmp_path):
+    assert load(tmp_path, {"london": LONDON}).stats()["entries"] == 0
+    assert load(tmp_path, None).stats()["entries"] == 0
+
+
+def test_concurrent_misses_geocode_once(monkeypatch):
+    calls = []
+
+    def slow_resolve(city, country):
+        calls.append((city, country))
+        time.sleep(0.2)
+        return LONDON
+
+    monkeypatch.setattr(locations, "_resolve", slow_resolve)
+    locations.LOCATION_CACHE.clear()
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: locations.resolve_location("Londonderry", "UK"), range(8)))
+    locations.LOCATION_CACHE.clear()
+    assert calls == [("Londonderry", "UK")]
+    assert results == [LONDON] * 8
+
+
+def test_waiters_share_the_error(monkeypatch):
+    def failing_resolve(city, country):
+        time.sleep(0.1)
+        raise TimeoutError("geocoder timed out")
+
+    monkeypatch.setattr(locations, "_resolve", failing_resolve)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(locations.resolve_location, "Nowhere", "Land") for _ in range(4)]
+    assert all(isinstance(future.exception(), TimeoutError) for future in futures)
+    # Errors are not cached
+    assert locations.LOCATION_CACHE.lookup(locations.location_key("Nowhere", "Land")) == (False, None)
+
+
+def test_default_cache_path_is_outside_the_source_tree():
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    path = subprocess.run(
+        [sys.executable, "-c", "import locations; print(locations.LOCATION_CACHE_PATH)"],
+        cwd=repo, env={key: value for key, value in os.environ.items() if key != "SALAH_GPT_LOCATION_CACHE"},
+        capture_output=True, text=True, check=True,
+    ).stdout.strip()
+    assert path.endswith(os.path.join("salah-gpt", "locations.json"))
+    assert not os.path.abspath(path).startswith(repo + os.sep)
+
+
+def test_concurrent_saves_keep_the_newest_entries(tmp_path):
+    path = str(tmp_path / "locations.json")
+    cache = LocationCache(path=path)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda i: cache.set((f"city{i}", "uk"), LONDON), range(40)))
+    assert LocationCache(path=path).stats()["entries"] == 40
@@ -0,0 +1,124 @@
+import asyncio
+import socket
+import urllib.request
+
+import pytest
+
+import metrics
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics(monkeypatch):
+    """Empty registries, so the rendered text only holds what a test recorded"""
+    for name in ("_counters", "_histograms", "_stats", "_help"):
+        monkeypatch.setattr(metrics, name, {})
+    monkeypatch.setattr(metrics, "_server", None)
+
+
+def test_counters_render_in_prometheus_text_format():
+    metrics.count("cache_hits_total", help="Cache hits", cache="answer")
+    metrics.count("cache_hits_total", 2, cache="answer")
+    metrics.count("cache_hits_total", cache="response")
+    assert metrics.render() == (
+        "# HELP salah_gpt_cache_hits_total Cache hits\n"
+        "# TYPE salah_gpt_cache_hits_total counter\n"
+        'salah_gpt_cache_hits_total{cache="answer"} 3\n'
+        'salah_gpt_cache_hits_total{cache="response"} 1\n'
+    )
+    assert metrics.counter_values("cache_hits_total") == {(("cache", "answer"),): 3, (("cache", "response"),): 1}
+
+
+def test_histogram_buckets_are_cumulative():
+    for value in (0.003, 0.02, 0.3, 0.3, 100):
+        metrics.observe("stage_seconds", value, help="Time spent per pipeline stage", stage="llm")
+    lines = metrics.render().splitlines()
+    assert lines[:2] == ["# HELP salah_gpt_stage_seconds Time spent per pipeline stage", "# TYPE salah_gpt_stage_seconds histogram"]
+    buckets = {line.split('le="')[1].split('"')[0]: int(line.split()[-1]) for line in lines if "_bucket" in line}
+    assert list(buckets) == [str(bound) for bound in metrics.BUCKETS] + ["+Inf"]
+    assert buckets["0.005"] == 1
+    assert buckets["0.025"] == 2
+    assert buckets["0.25"] == 2
+    assert buckets["0.5"] == 4
+    assert buckets["60"] == 4
+    assert buckets["+Inf"] == 5
+    assert 'salah_gpt_stage_seconds_sum{stage="llm"} 100.623000' in lines
+    assert 'salah_gpt_stage_seconds_count{stage="llm"} 5' in lines
+    assert 'salah_gpt_stage_seconds_bucket{stage="llm",le="0.1"} 2' in lines
+
+
+def test_stats_are_gauges_and_a_failing_one_is_skipped(capsys):
+    metrics.register_stats("location_cache", lambda: {"entries": 4, "hits": 10, "path": "/tmp/x", "enabled": True})
+    metrics.register_stats("broken", lambda: 1 / 0)
+    text = metrics.render()
+    assert "# TYPE salah_gpt_location_cache_entries gauge\nsalah_gpt_location_cache_entries 4\n" in text
+    assert "salah_gpt_location_cache_hits 10\n" in text
+    assert "path" not in text and "enabled" not in text
+    assert "Error collecting broken metrics" in capsys.readouterr().out
+
+
+def test_trace_collects_spans_across_threads_and_tasks():
+    @metrics.timed("search")
+    async def search():
+        await asyncio.to_thread(lookup)
+
+    @metrics.timed()
+    def lookup():
+        pass
+
+    async def main():
+        await asyncio.gather(search(), asyncio.create_task(search()))
+
+    with metrics.trace() as spans:
+        asyncio.run(main())
+        with pytest.raises(ValueError):
+            with metrics.span("llm"):
+                raise ValueError("bad")
+    assert metrics.current_trace() is None
+    assert sorted(span["stage"] for span in spans) == ["llm", "lookup", "lookup", "search", "search"]
+    assert spans[-1]["error"] == "ValueError"
+    assert 'salah_gpt_stage_errors_total{stage="llm"} 1' in metrics.render()
+
+    # Spans outside a trace are still timed, but not collected
+    lookup()
+    assert len(spans) == 5
+
+
+def test_format_trace():
+    assert metrics.format_trace([
+        {"stage": "search", "seconds": 0.1234, "error": None},
+        {"stage": "llm", "seconds": 2.5, "error": "RateLimitError"},
+    ]) == "search: 123 ms\nllm: 2500 ms (RateLimitError)"
+    assert metrics.format_trace([]) == ""
+
+
+def test_metrics_endpoint_serves_the_rendered_text():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    metrics.count("queries_total", path="cache")
+    server = metrics.start_metrics_server(port)
+    try:
+        assert metrics.start_metrics_server(port) is server
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as response:
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            assert response.read().decode() == metrics.render()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_bind_failure_is_logged_once(capsys):
+    with socket.socket() as taken:
+        taken.bind(("127.0.0.1", 0))
+        taken.listen()
+        port = taken.getsockname()[1]
+        assert metrics.start_metrics_server(port) is None
+        assert metrics.start_metrics_server(port) is None
+    out = capsys.readouterr().out
+    assert out.count("Metrics endpoint disabled") == 1
+    assert f"127.0.0.1:{port}" in out and "OSError" in out
+
+
+def test_invalid_port_is_logged(capsys):
+    assert metrics.start_metrics_server(70000) is None
+    assert "Metrics endpoint disabled: could not listen on 127.0.0.1:70000: OverflowError" in capsys.readouterr().out
@@ -0,0 +1,142 @@
+from datetime import date, datetime
+
+import pytest
+import pytz
+
+import retrieval
+from prayer_times import ASR_FACTORS, PrayerSchedule, format_countdown, prayer_times_response
+from response_cache import RESPONSE_CACHE
+
+MAKKAH = (21.4225, 39.8262, "Asia/Riyadh")
+LONDON = (51.5074, -0.1278, "Europe/London")
+TROMSO = (69.6492, 18.9553, "Europe/Oslo")
+
+
+def timings(place, day, method, asr_factor=ASR_FACTORS["standard"]):
+    return prayer_times_response(*place, method, asr_factor, day)["data"]["timings"]
+
+
+def minutes(hhmm):
+    hours, mins = hhmm.split(":")
+    return int(hours) * 60 + int(mins)
+
+
+def assert_close(actual, expected, tolerance=1):
+    for name, value in expected.items():
+        assert abs(minutes(actual[name]) - minutes(value)) <= tolerance, (name, actual[name], value)
+
+
+def test_makkah_umm_al_qura():
+    # Published Umm al-Qura timetable for Makkah, 1 January 2024
+    assert_close(timings(MAKKAH, date(2024, 1, 1), 4), {
+        "Fajr": "05:38", "Sunrise": "06:58", "Dhuhr": "12:24", "Asr": "15:29", "Maghrib": "17:50", "Isha": "19:20",
+    })
+
+
+def test_london_muslim_world_league():
+    # Muslim World League times for London, 1 January 2024
+    assert_close(timings(LONDON, date(2024, 1, 1), 3), {
+        "Fajr": "06:04", "Sunrise": "08:06", "Dhuhr": "12:04", "Asr": "13:45", "Maghrib": "16:02", "Isha": "17:59",
+    })
+
+
+def test_hanafi_asr_is_later():
+    standard = timings(LONDON, date(2024, 1, 1), 3)
+    hanafi = timings(LONDON, date(2024, 1, 1), 3, ASR_FACTORS["hanafi"])
+    assert_close(hanafi, {"Asr": "14:15"})
+    assert {name: value for name, value in hanafi.items() if name != "Asr"} == {name: value for name, value in standard.items() if name != "Asr"}
+    assert_close(timings(MAKKAH, date(2024, 1, 1), 4, ASR_FACTORS["hanafi"]), {"Asr": "16:14"})
+
+
+def test_midnight_sun_has_no_sunrise_or_sunset():
+    result = timings(TROMSO, date(2024, 6, 21), 3)
+    for name in ("Fajr", "Sunrise", "Maghrib", "Isha"):
+        assert result[name] == "-----"
+    assert_close(result, {"Dhuhr": "12:46"})
+
+
+def test_polar_night_adjusts_fajr_and_isha():
+    result = timings(TROMSO, date(2024, 12, 21), 3)
+    assert result["Sunrise"] == result["Maghrib"] == "-----"
+    assert minutes(result["Fajr"]) < minutes(result["Dhuhr"]) < minutes(result["Isha"])
+
+
+@pytest.fixture
+def london_at(monkeypatch):
+    """Pin retrieval's clock to a London wall-clock time, geocoding offline"""
+    monkeypatch.setattr(retrieval, "geocode_location", lambda city, country: dict(zip(("latitude", "longitude", "timezone"), LONDON)))
+    RESPONSE_CACHE.clear()
+
+    def pin(*args):
+        moment = pytz.timezone("Europe/London").localize(datetime(*args))
+
+        class PinnedDatetime(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return moment.astimezone(tz) if tz else moment.replace(tzinfo=None)
+
+        monkeypatch.setattr(retrieval, "datetime", PinnedDatetime)
+    yield pin
+    RESPONSE_CACHE.clear()
+
+
+def test_prayer_times_roll_over_at_local_midnight(london_at):
+    london_at(2024, 1, 1, 23, 50)
+    before = retrieval.get_prayer_times("London", "UK")
+    london_at(2024, 1, 2, 0, 10)
+    after = retrieval.get_prayer_times("London", "UK")
+    assert before["data"]["date"]["readable"] == "01 Jan 2024"
+    assert after["data"]["date"]["readable"] == "02 Jan 2024"
+
+
+def local(*args):
+    return pytz.timezone("Europe/London").localize(datetime(*args)).timestamp()
+
+
+@pytest.fixture(scope="module")
+def schedule():
+    return PrayerSchedule(*LONDON, date(2024, 1, 1), 3)
+
+
+def test_before_fajr_is_still_yesterdays_isha(schedule):
+    status = schedule.status(local(2024, 1, 1, 3, 0))
+    assert status["current"] == "Isha"
+    assert datetime.fromtimestamp(status["current_start"], pytz.timezone("Europe/London")).date() == date(2023, 12, 31)
+    assert status["next"] == "Fajr"
+    assert status["next_start"] == local(2024, 1, 1, 6, 3)
+    assert status["countdown"] == status["next_start"] - local(2024, 1, 1, 3, 0)
+
+
+def test_after_isha_next_is_tomorrows_fajr(schedule):
+    status = schedule.status(local(2024, 1, 1, 22, 0))
+    assert status["current"] == "Isha"
+    assert status["current_start"] == local(2024, 1, 1, 17, 59)
+    assert status["next"] == "Fajr"
+    assert datetime.fromtimestamp(status["next_start"], pytz.timezone("Europe/London")).date() == date(2024, 1, 2)
+
+
+def test_prayer_starts_on_its_minute(schedule):
+    fajr = local(2024, 1, 1, 6, 3)
+    assert schedule.status(fajr - 1)["current"] == "Isha"
+    assert schedule.status(fajr)["current"] == "Fajr"
+    assert schedule.status(fajr)["next"] == "Sunrise"
+
+
+def test_midnight_rollover(schedule):
+    before = schedule.status(local(2024, 1, 1, 23, 59))
+    after = schedule.status(local(2024, 1, 2, 0, 1))
+    assert before["current"] == after["current"] == "Isha"
+    assert before["next_start"] == after["next_start"]
+    assert before["countdown"] - after["countdown"] == 120
+
+
+def test_outside_the_three_days(schedule):
+    assert schedule.status(local(2023, 12, 30, 12, 0))["current"] is None
+    assert schedule.status(local(2024, 1, 3, 12, 0))["next"] is None
+
+
+@pytest.mark.parametrize("seconds, text", [
+    (-5, "0m"), (0, "0m"), (1, "1m"), (60, "1m"), (61, "2m"), (3599, "1h 00m"), (3600, "1h 00m"), (7500, "2h 05m"),
+])
+def test_format_countdown(seconds, text):
+    assert format_countdown(seconds) == text
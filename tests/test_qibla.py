@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from qibla import KAABA_LATITUDE, KAABA_LONGITUDE, distance_to_makkah, qibla_direction, qibla_directions, qibla_response
+
+# Published Qibla bearings (degrees from true North) and distances to the Ka'bah (km)
+CITIES = {
+    "London": (51.5074, -0.1278, 118.99, 4794),
+    "New York": (40.7128, -74.0060, 58.48, 10306),
+    "Cairo": (30.0444, 31.2357, 136.14, 1287),
+    "Jakarta": (-6.2088, 106.8456, 295.15, 7920),
+    "Sydney": (-33.8688, 151.2093, 277.50, 13236),
+}
+
+
+@pytest.mark.parametrize("city", CITIES)
+def test_published_bearing_and_distance(city):
+    latitude, longitude, bearing, distance = CITIES[city]
+    assert qibla_direction(latitude, longitude) == pytest.approx(bearing, abs=0.05)
+    assert distance_to_makkah(latitude, longitude) == pytest.approx(distance, rel=0.005)
+
+
+def test_due_directions():
+    # Due north of the Ka'bah the Qibla is due south, and vice versa
+    assert qibla_direction(40, KAABA_LONGITUDE) == pytest.approx(180)
+    assert qibla_direction(0, KAABA_LONGITUDE) == pytest.approx(0)
+    assert distance_to_makkah(KAABA_LATITUDE, KAABA_LONGITUDE) == pytest.approx(0, abs=1e-6)
+
+
+def test_vectorized_matches_scalar():
+    latitudes = [city[0] for city in CITIES.values()]
+    longitudes = [city[1] for city in CITIES.values()]
+    directions, distances = qibla_directions(latitudes, longitudes)
+    np.testing.assert_allclose(directions, [qibla_direction(lat, lon) for lat, lon in zip(latitudes, longitudes)])
+    np.testing.assert_allclose(distances, [distance_to_makkah(lat, lon) for lat, lon in zip(latitudes, longitudes)])
+
+
+def test_response_shape():
+    data = qibla_response(51.5074, -0.1278)["data"]
+    assert data["direction"] == pytest.approx(118.99, abs=0.05)
+    assert data["distance"] == pytest.approx(4794, rel=0.005)
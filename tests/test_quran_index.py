@@ -0,0 +1,63 @@
+import os
+
+import pytest
+
+import quran_index
+from text_index import normalize_arabic
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+@pytest.fixture(autouse=True)
+def verses(tmp_path, monkeypatch):
+    """The fixture Uthmani text and translation ingested into a fresh Quran index"""
+    path = str(tmp_path / "quran_index")
+    monkeypatch.setattr(quran_index, "QURAN_INDEX_PATH", path)
+    monkeypatch.setattr(quran_index, "_index", None)
+    count = quran_index.ingest(
+        os.path.join(FIXTURES, "quran-uthmani.txt"), os.path.join(FIXTURES, "en.sahih.txt"), "Saheeh International", index_path=path,
+    )
+    assert count == 6
+
+
+def verse_keys(query, size=5):
+    return [verse["verse_key"] for verse in quran_index.search_verses(query, size)["search"]["results"]]
+
+
+@pytest.mark.parametrize("uthmani, plain", [
+    ("ٱلصَّلَوٰةَ", "الصلاة"), ("ٱلزَّكَوٰةَ", "الزكاة"), ("ٱلْحَيَوٰةِ", "الحياة"), ("ٱلرِّبَوٰا۟", "الربا"),
+    ("ٱلرَّحْمَٰنِ", "الرحمن"), ("وَأَقِيمُوا۟", "وأقيموا"),
+])
+def test_uthmani_spelling_normalizes_to_plain(uthmani, plain):
+    assert normalize_arabic(uthmani) == normalize_arabic(plain)
+
+
+def test_plain_arabic_query_matches_uthmani_text():
+    assert set(verse_keys("الصلاة")) == {"2:43", "2:45", "2:238"}
+    assert verse_keys("الصَّلَاةِ") == verse_keys("الصلاة")
+    assert verse_keys("الزكاة") == ["2:43"]
+    assert verse_keys("وأقيموا الصلاة")[0] == "2:43"
+
+
+def test_superscript_alef_words_match_by_root():
+    assert "2:2" in verse_keys("الكتاب")
+    assert verse_keys("الرحمن") == ["1:1"]
+
+
+def test_english_ranking():
+    assert verse_keys("fasting")[0] == "2:183"
+    assert verse_keys("patience and prayer")[0] == "2:45"
+    assert verse_keys("middle prayer")[0] == "2:238"
+    assert verse_keys("pilgrimage") == []
+
+
+def test_response_shape():
+    response = quran_index.search_verses("zakah", size=1)["search"]
+    assert response["total_results"] == 1
+    verse = response["results"][0]
+    assert verse["verse_key"] == "2:43" and verse["verse_id"] == 3
+    assert verse["translations"] == [{
+        "text": "And establish prayer and give zakah and bow with those who bow [in worship and obedience].",
+        "name": "Saheeh International",
+        "language_name": "english",
+    }]
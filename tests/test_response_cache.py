@@ -0,0 +1,56 @@
+import time
+
+import response_cache
+from response_cache import DiskCacheTier, ResponseCache
+
+
+def restarted_cache(path):
+    return ResponseCache(disk_tier=DiskCacheTier(path, cleanup_interval=0))
+
+
+def test_stale_window_survives_restart(tmp_path, monkeypatch):
+    path = str(tmp_path / "cache.db")
+    restarted_cache(path).set("key", "value", ttl=10, stale_ttl=100)
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 50)
+    cache = restarted_cache(path)
+    assert cache.disk_tier.purge_expired() == 0
+    assert cache.lookup("key") == ("value", False)
+    # Promoted into memory with the same window
+    assert cache.lookup("key") == ("value", False)
+    assert cache.get("key") is None
+
+    monkeypatch.setattr(time, "time", lambda: now + 200)
+    assert restarted_cache(path).lookup("key") == (None, False)
+    assert cache.disk_tier.purge_expired() == 1
+
+
+def test_fresh_disk_row_is_a_hit(tmp_path):
+    path = str(tmp_path / "cache.db")
+    restarted_cache(path).set("key", "value", ttl=10, stale_ttl=100)
+    cache = restarted_cache(path)
+    assert cache.lookup("key") == ("value", True)
+    assert cache.stats()["disk_hits"] == 1
+
+
+def test_oversized_value_is_not_written_to_disk(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = ResponseCache(max_bytes=1000, disk_tier=DiskCacheTier(path, cleanup_interval=0))
+    cache.set("big", "x" * 5000, ttl=10)
+    assert cache.lookup("big") == (None, False)
+    assert restarted_cache(path).lookup("big") == (None, False)
+
+
+def test_value_is_pickled_once(tmp_path, monkeypatch):
+    dumps = []
+    real_dumps = response_cache.pickle.dumps
+
+    def counting_dumps(value, *args, **kwargs):
+        dumps.append(value)
+        return real_dumps(value, *args, **kwargs)
+
+    cache = restarted_cache(str(tmp_path / "cache.db"))
+    monkeypatch.setattr(response_cache.pickle, "dumps", counting_dumps)
+    cache.set("key", {"timings": {"Fajr": "05:56"}}, ttl=10)
+    assert len(dumps) == 1
@@ -0,0 +1,108 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import retrieval
+import semantic_index
+from embeddings import get_embedder
+
+WUDU_RESULTS = [{
+    "source": "IslamQA",
+    "results": [
+        {"title": "What Invalidates Wudu?", "snippet": "Wudu is broken by sleep and by anything leaving the private parts.", "link": "https://islamqa.info/1"},
+        {"title": "Things That Invalidate Wudu", "snippet": "Deep sleep, loss of consciousness and bleeding according to some.", "link": "https://islamqa.info/2"},
+        {"title": "Does Bleeding Invalidate Wudu?", "snippet": "The Hanafis hold that flowing blood breaks wudu.", "link": "https://islamqa.info/3"},
+    ],
+}]
+
+
+def gather(query, madhab=None):
+    """gather_sources, then wait for the background indexing it queued"""
+    results = asyncio.run(retrieval.gather_sources(query, madhab))
+    retrieval._site_indexer.submit(lambda: None).result()
+    return results
+
+
+@pytest.fixture(autouse=True)
+def fresh_stores(monkeypatch):
+    semantic_index._store = None
+    semantic_index._site_passages = None
+    scrapes = []
+
+    async def search_islamic_websites(query, madhab=None):
+        scrapes.append((query, madhab))
+        return WUDU_RESULTS
+
+    monkeypatch.setattr(retrieval, "search_islamic_websites", search_islamic_websites)
+    yield scrapes
+    semantic_index._store = None
+    semantic_index._site_passages = None
+
+
+def test_embedder_threshold_is_reachable():
+    semantic_index.add_site_results(WUDU_RESULTS)
+    passages = semantic_index.search_passages("What invalidates wudu?")
+    assert passages and passages[0]["score"] >= get_embedder().min_score
+    assert semantic_index.search_passages("What is the best stock to buy?") == []
+
+
+def test_stored_passages_skip_the_scrape(fresh_stores):
+    gather("What invalidates wudu?")
+    assert len(fresh_stores) == 1
+
+    results, errors = gather("What invalidates wudu?")
+    assert len(fresh_stores) == 1
+    assert results[0]["source"] == "Semantic Search"
+    assert not errors
+
+
+def test_unrelated_question_is_scraped(fresh_stores):
+    gather("What invalidates wudu?")
+    gather("How do I pray Jumuah?")
+    assert len(fresh_stores) == 2
+
+
+def test_passages_of_another_madhab_do_not_skip_the_scrape(fresh_stores):
+    gather("What invalidates wudu?")
+    gather("What invalidates wudu?", madhab="Hanafi")
+    assert fresh_stores == [("What invalidates wudu?", None), ("What invalidates wudu?", "Hanafi")]
+
+    gather("What invalidates wudu?", madhab="Hanafi")
+    assert len(fresh_stores) == 2
+
+
+def test_scraped_passages_expire(monkeypatch):
+    semantic_index.add_site_results(WUDU_RESULTS)
+    assert semantic_index.search_passages("What invalidates wudu?")
+
+    now = semantic_index.time.time()
+    monkeypatch.setattr(semantic_index.time, "time", lambda: now + semantic_index.SITE_PASSAGES_TTL + 1)
+    assert semantic_index.search_passages("What invalidates wudu?") == []
+    semantic_index.add_site_results([{"source": "AboutIslam", "results": [
+        {"title": "Praying in Congregation", "snippet": "Twenty-seven degrees better.", "link": "https://aboutislam.net/1"}
+    ]}])
+    assert len(semantic_index.get_site_passages()) == 1
+
+
+def test_scraped_passages_are_bounded():
+    store = semantic_index.get_site_passages()
+    store.max_entries = 2
+    semantic_index.add_site_results(WUDU_RESULTS)
+    assert len(store) == 2
+
+
+def test_indexing_does_not_delay_the_answer(monkeypatch):
+    indexed = threading.Event()
+
+    def slow_add_site_results(site_results, madhab=None):
+        time.sleep(0.5)
+        indexed.set()
+
+    monkeypatch.setattr(retrieval, "add_site_results", slow_add_site_results)
+    started = time.monotonic()
+    results, _ = asyncio.run(retrieval.gather_sources("What invalidates wudu?"))
+    assert time.monotonic() - started < 0.4
+    assert results[0]["source"] == "Islamic Websites"
+    assert indexed.wait(5)
@@ -0,0 +1,80 @@
+import os
+
+import pytest
+
+import hadith_index
+from text_index import TextIndex, arabic_analyzer, build_index, english_analyzer, english_stem
+
+HADITH_DUMP = os.path.join(os.path.dirname(__file__), "fixtures", "hadith.jsonl")
+
+
+@pytest.fixture
+def hadiths(tmp_path, monkeypatch):
+    """The fixture dump ingested into a fresh hadith index"""
+    path = str(tmp_path / "hadith_index")
+    monkeypatch.setattr(hadith_index, "HADITH_INDEX_PATH", path)
+    monkeypatch.setattr(hadith_index, "_index", None)
+    assert hadith_index.ingest([HADITH_DUMP], index_path=path) == 8
+    return hadith_index.get_hadith_index()
+
+
+def references(results):
+    return [hadith["reference"] for hadith in results]
+
+
+@pytest.mark.parametrize("word, stem", [
+    ("prayers", "prayer"), ("prays", "prai"), ("praying", "prai"), ("prayed", "prai"), ("hopping", "hop"),
+    ("agreed", "agree"), ("caresses", "caress"), ("ponies", "poni"), ("his", "his"),
+])
+def test_english_stem(word, stem):
+    assert english_stem(word) == stem
+
+
+def test_english_analyzer_keeps_negations():
+    assert english_analyzer("Does NOT break the Wuḍū'") == ["not", "break", "wudu"]
+
+
+def test_arabic_analyzer_matches_forms_of_a_root():
+    assert "#كتب" in arabic_analyzer("الكاتب")
+    assert set(arabic_analyzer("والصلاة")) & set(arabic_analyzer("صلاة"))
+
+
+def test_ingest_normalizes_aliases_and_skips_empty_text(hadiths):
+    assert len(hadiths) == 8
+    second = hadiths.document(1)
+    assert second["collection"] == "Sahih Muslim"
+    assert second["reference"] == "Sahih Muslim 233"
+
+
+def test_ranking(hadiths):
+    assert references(hadith_index.search_hadith("prayers in congregation", limit=3))[0] == "Sahih al-Bukhari 645"
+    assert references(hadith_index.search_hadith("what if I sleep through a prayer?", limit=1)) == ["Sahih Muslim 684"]
+    assert references(hadith_index.search_hadith("does breaking wudu invalidate prayer", limit=1)) == ["Sahih al-Bukhari 6954"]
+    # The rarer term outweighs "prayer", which most hadiths contain
+    assert references(hadith_index.search_hadith("fasting", limit=5)) == ["Sunan an-Nasa'i 2231"]
+
+
+def test_scores_are_sorted_and_limited(hadiths):
+    results = hadiths.search("prayer deed", limit=3)
+    assert len(results) == 3
+    scores = [score for score, _ in results]
+    assert scores == sorted(scores, reverse=True)
+    assert {document["reference"] for _, document in results} >= {"Sahih al-Bukhari 527", "Jami at-Tirmidhi 413"}
+
+
+def test_no_match_and_collection_field(hadiths):
+    assert hadith_index.search_hadith("zakat on gold") == []
+    assert set(references(hadith_index.search_hadith("tirmidhi"))) == {"Jami at-Tirmidhi 413"}
+
+
+def test_no_index_returns_none(tmp_path, monkeypatch):
+    monkeypatch.setattr(hadith_index, "HADITH_INDEX_PATH", str(tmp_path / "missing"))
+    monkeypatch.setattr(hadith_index, "_index", None)
+    assert hadith_index.search_hadith("prayer") is None
+
+
+def test_empty_index(tmp_path):
+    build_index(str(tmp_path), [], fields=("text",))
+    index = TextIndex(str(tmp_path))
+    assert len(index) == 0
+    assert index.search("prayer") == []
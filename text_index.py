@@ -0,0 +1,331 @@
+"""On-disk inverted index with BM25 ranking.
+
+Used for the local hadith and Quran search. An index is a directory:
+
+    meta.json     analyzer name, document count, average length, BM25 params
+    terms.tsv     term, document frequency and postings offset, sorted by term
+    postings.bin  (doc id, term frequency) pairs, grouped by term
+    doclens.bin   analyzed length of every document
+    docs.jsonl    stored documents, one JSON object per line
+    docs.idx      byte offset of every line in docs.jsonl
+
+Postings, lengths and stored documents are memory-mapped, so opening an
+index only reads the term dictionary and a search only touches the postings
+of the query terms.
+"""
+import json
+import math
+import mmap
+import os
+import re
+import unicodedata
+from functools import lru_cache
+
+import numpy as np
+
+POSTING_DTYPE = np.dtype([("doc", "<u4"), ("tf", "<u4")])
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+TOKEN_RE = re.compile(r"\w+")
+
+# Negations ("no", "not") are kept: they change the meaning of a ruling
+ENGLISH_STOPWORDS = frozenset("""
+a about after all also am an and any are as at be because been before being but by can could did do does
+doing for from had has have having he her here hers him his how i if in into is it its itself me my
+of on or our ours out over own said says shall she should so some such than that the their theirs them
+then there these they this those through to too under until up upon very was we were what when where which
+while who whom why will with would you your yours
+""".split())
+
+VOWELS = "aeiou"
+
+
+def _has_vowel(word):
+    return any(ch in VOWELS for ch in word)
+
+
+def _ends_cvc(word):
+    """Consonant-vowel-consonant ending, last letter not w, x or y (e.g. hop, mak)"""
+    return (
+        len(word) >= 3
+        and word[-1] not in VOWELS + "wxy"
+        and word[-2] in VOWELS
+        and word[-3] not in VOWELS
+    )
+
+
+@lru_cache(maxsize=65536)
+def english_stem(word):
+    """Light English stemmer: plural and -ed/-ing suffixes (Porter step 1)"""
+    if len(word) <= 3 or not word.isalpha():
+        return word
+
+    if word.endswith("sses"):
+        word = word[:-2]
+    elif word.endswith("ies"):
+        word = word[:-2]
+    elif word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        word = word[:-1]
+
+    if word.endswith("eed"):
+        if len(word) > 4:
+            word = word[:-1]
+    else:
+        for suffix in ("ing", "ed"):
+            stem = word[:-len(suffix)]
+            if word.endswith(suffix) and len(stem) >= 2 and _has_vowel(stem):
+                if stem.endswith(("at", "bl", "iz")):
+                    stem += "e"
+                elif len(stem) >= 3 and stem[-1] == stem[-2] and stem[-1] not in VOWELS + "lsz":
+                    stem = stem[:-1]
+                elif len(stem) == 3 and _ends_cvc(stem):
+                    stem += "e"
+                word = stem
+                break
+
+    if word.endswith("y") and len(word) > 3 and _has_vowel(word[:-1]):
+        word = word[:-1] + "i"
+    return word
+
+
+def english_analyzer(text):
+    """Lower-case, strip accents, drop stopwords and stem"""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).casefold()
+    return [english_stem(token) for token in TOKEN_RE.findall(text) if token not in ENGLISH_STOPWORDS]
+
+
+# Tashkeel, Quranic annotation marks, superscript alef and tatweel
+ARABIC_DIACRITICS_RE = re.compile("[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]")
+ARABIC_LETTER_MAP = str.maketrans({
+    "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا",  # hamza, madda and wasla forms of alef
+    "ؤ": "و",
+    "ئ": "ي",
+    "ى": "ي",  # alef maksura
+    "ة": "ه",  # teh marbuta
+})
+ARABIC_RE = re.compile("[\u0600-\u06ff]")
+
+# Checked longest first; only stripped while at least three letters remain
+ARABIC_PREFIXES = ("وال", "بال", "كال", "فال", "لل", "ال", "و", "ف")
+ARABIC_SUFFIXES = ("هما", "كم", "هم", "هن", "نا", "ها", "ان", "ات", "ون", "ين", "يه", "ه", "ي")
+# Already normalized (alef maksura written as yeh)
+ARABIC_STOPWORDS = frozenset("في من علي الي عن ان ما لا لم هو هي ذلك هذا الذي الذين ثم او قد".split())
+ARABIC_WEAK_LETTERS = "اوي"
+
+
+# Uthmani script writes some long alefs as a waw carrying a superscript alef
+# (ٱلصَّلَوٰةَ, ٱلزَّكَوٰةَ), where plain spelling has an alef (الصلاة, الزكاة)
+UTHMANI_WAW_ALEF_RE = re.compile("\u0648\u0670\u0627?")
+
+
+def normalize_arabic(text):
+    """Remove diacritics and tatweel and unify hamza, alef and teh marbuta forms.
+
+    Uthmani spellings are mapped onto plain ones where the difference is a
+    waw carrying the long alef; other superscript alefs are dropped, so e.g.
+    ٱلْكِتَٰبِ and الكتاب only share their root.
+    """
+    text = UTHMANI_WAW_ALEF_RE.sub("\u0627", text)
+    return ARABIC_DIACRITICS_RE.sub("", text).translate(ARABIC_LETTER_MAP)
+
+
+@lru_cache(maxsize=65536)
+def arabic_stem(word):
+    """Light stem of a normalized Arabic word: strip the article, conjunctions and pronoun/plural suffixes"""
+    for prefix in ARABIC_PREFIXES:
+        if word.startswith(prefix) and len(word) - len(prefix) >= 3:
+            word = word[len(prefix):]
+            break
+    for suffix in ARABIC_SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)]
+            break
+    return word
+
+
+@lru_cache(maxsize=65536)
+def arabic_root(stem):
+    """Approximate triliteral root of a light stem by removing common pattern letters.
+
+    Handles the most frequent patterns (fa'il, fa'ul/fa'il, maf'al, maf'ul,
+    taf'il, istaf'al, ...); returns the stem when no pattern applies.
+    """
+    word = stem
+    if len(word) == 6 and word.startswith(("است", "مست")):  # istaf'al, mustaf'il
+        word = word[3:]
+    elif len(word) == 5:
+        if word[0] == "م" and word[3] in ARABIC_WEAK_LETTERS:  # maf'ul, maf'il
+            word = word[1:3] + word[4]
+        elif word[0] in "تامين":  # taf'il, if'al, muf'al, ...
+            word = word[1:]
+            if word[2] in ARABIC_WEAK_LETTERS:
+                word = word[:2] + word[3]
+            elif word[1] in ARABIC_WEAK_LETTERS + "ت":
+                word = word[0] + word[2:]
+    if len(word) == 4:
+        if word[1] in ARABIC_WEAK_LETTERS:  # fa'il: katib -> ktb
+            word = word[0] + word[2:]
+        elif word[2] in ARABIC_WEAK_LETTERS:  # fa'ul, fa'il: rasul -> rsl, rahim -> rhm
+            word = word[:2] + word[3]
+        elif word[0] in "متينا":  # maf'al, taf'al, yaf'al, naf'al, af'al
+            word = word[1:]
+    return word if len(word) == 3 else stem
+
+
+def arabic_analyzer(text):
+    """Normalize, drop stopwords, and emit each word's light stem plus its root.
+
+    Roots are emitted with a "#" marker, so a query matches other forms of
+    the same root (root-aware matching) while documents sharing the exact
+    stem still score higher.
+    """
+    tokens = []
+    for token in TOKEN_RE.findall(normalize_arabic(text)):
+        if token in ARABIC_STOPWORDS or len(token) < 2:
+            continue
+        stem = arabic_stem(token)
+        tokens.append(stem)
+        root = arabic_root(stem)
+        if len(root) == 3:
+            tokens.append("#" + root)
+    return tokens
+
+
+def english_arabic_analyzer(text):
+    """Analyze Arabic-script words as Arabic and everything else as English"""
+    tokens = []
+    for token in TOKEN_RE.findall(normalize_arabic(text or "")):
+        if ARABIC_RE.search(token):
+            tokens.extend(arabic_analyzer(token))
+        else:
+            tokens.extend(english_analyzer(token))
+    return tokens
+
+
+# Analyzers by name; the name is stored in meta.json so a query is always
+# analyzed the same way as the documents were
+ANALYZERS = {
+    "english": english_analyzer,
+    "arabic": arabic_analyzer,
+    "english_arabic": english_arabic_analyzer,
+}
+
+
+def build_index(path, documents, fields, analyzer="english"):
+    """Write an index of documents (dicts) to the directory path.
+
+    fields names the document fields whose text is indexed; every field is
+    stored and returned by search.
+    """
+    analyze = ANALYZERS[analyzer]
+    os.makedirs(path, exist_ok=True)
+
+    postings = {}  # term -> [(doc id, tf)]
+    doc_lengths = []
+    offsets = []
+    with open(os.path.join(path, "docs.jsonl"), "wb") as docs_file:
+        for doc_id, document in enumerate(documents):
+            offsets.append(docs_file.tell())
+            docs_file.write(json.dumps(document, ensure_ascii=False).encode("utf-8") + b"\n")
+
+            terms = []
+            for field in fields:
+                terms.extend(analyze(document.get(field) or ""))
+            doc_lengths.append(len(terms))
+            counts = {}
+            for term in terms:
+                counts[term] = counts.get(term, 0) + 1
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append((doc_id, tf))
+        offsets.append(docs_file.tell())
+
+    np.array(offsets, dtype="<u8").tofile(os.path.join(path, "docs.idx"))
+    np.array(doc_lengths, dtype="<u4").tofile(os.path.join(path, "doclens.bin"))
+
+    offset = 0
+    with open(os.path.join(path, "postings.bin"), "wb") as postings_file, \
+            open(os.path.join(path, "terms.tsv"), "w", encoding="utf-8") as terms_file:
+        for term in sorted(postings):
+            term_postings = np.array(postings[term], dtype=POSTING_DTYPE)
+            postings_file.write(term_postings.tobytes())
+            terms_file.write(f"{term}\t{len(term_postings)}\t{offset}\n")
+            offset += len(term_postings)
+
+    with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "analyzer": analyzer,
+            "fields": list(fields),
+            "documents": len(doc_lengths),
+            "average_length": sum(doc_lengths) / len(doc_lengths) if doc_lengths else 0,
+            "k1": BM25_K1,
+            "b": BM25_B,
+        }, f, indent=2)
+
+
+class TextIndex:
+    """Read-only view of an index written by build_index"""
+
+    def __init__(self, path):
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.analyze = ANALYZERS[self.meta["analyzer"]]
+
+        self._terms = {}  # term -> (df, offset)
+        with open(os.path.join(path, "terms.tsv"), encoding="utf-8") as f:
+            for line in f:
+                term, df, offset = line.rstrip("\n").split("\t")
+                self._terms[term] = (int(df), int(offset))
+
+        self._documents = self.meta["documents"]
+        if self._documents:
+            self._postings = np.memmap(os.path.join(path, "postings.bin"), dtype=POSTING_DTYPE, mode="r")
+            self._doc_lengths = np.memmap(os.path.join(path, "doclens.bin"), dtype="<u4", mode="r")
+        self._doc_offsets = np.memmap(os.path.join(path, "docs.idx"), dtype="<u8", mode="r")
+        with open(os.path.join(path, "docs.jsonl"), "rb") as f:
+            self._docs = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self._documents else b""
+
+    def __len__(self):
+        return self._documents
+
+    def document(self, doc_id):
+        """Stored fields of a document"""
+        start, end = int(self._doc_offsets[doc_id]), int(self._doc_offsets[doc_id + 1])
+        return json.loads(self._docs[start:end])
+
+    def documents(self):
+        """Iterate over all stored documents in id order"""
+        for doc_id in range(self._documents):
+            yield self.document(doc_id)
+
+    def scores(self, terms):
+        """BM25 score of every document for already-analyzed query terms"""
+        scores = np.zeros(self._documents, dtype=np.float32)
+        if not self._documents:
+            return scores
+        k1, b = self.meta["k1"], self.meta["b"]
+        average_length = self.meta["average_length"] or 1
+        for term in set(terms):
+            if term not in self._terms:
+                continue
+            df, offset = self._terms[term]
+            postings = self._postings[offset:offset + df]
+            idf = math.log(1 + (self._documents - df + 0.5) / (df + 0.5))
+            tf = postings["tf"].astype(np.float32)
+            length_norm = 1 - b + b * self._doc_lengths[postings["doc"]] / average_length
+            scores[postings["doc"]] += idf * tf * (k1 + 1) / (tf + k1 * length_norm)
+        return scores
+
+    def search(self, query, limit=5):
+        """Top documents for a query as (score, document) pairs, best first"""
+        scores = self.scores(self.analyze(query))
+        matched = np.flatnonzero(scores)
+        if not len(matched):
+            return []
+        if len(matched) > limit:
+            matched = matched[np.argpartition(-scores[matched], limit)[:limit]]
+        ranked = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(float(scores[doc_id]), self.document(doc_id)) for doc_id in ranked]
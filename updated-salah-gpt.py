@@ -8,6 +8,8 @@ from datetime import datetime
 import pytz
 import hashlib
 import time
+from locations import resolve_location
+from qibla import qibla_response
 
 # Set page configuration
 st.set_page_config(
@@ -26,7 +28,6 @@ if openai_api_key:
 
 # API URLs
 PRAYER_API_URL = "https://api.aladhan.com/v1/timingsByCity"
-QIBLA_API_URL = "https://api.aladhan.com/v1/qibla"
 QURAN_API_URL = "https://api.quran.com/api/v4/search"
 
 # Initialize session cache for API responses
@@ -305,37 +306,15 @@ def get_prayer_times(city, country, madhab=None):
         return None
 
 def get_qibla_direction(city, country):
-    """Get Qibla direction for a specific location"""
-    cache_key = get_cache_key("get_qibla_direction", {"city": city, "country": country})
-    
-    # Check cache first
-    if cache_key in st.session_state.cache:
-        cache_entry = st.session_state.cache[cache_key]
-        # Cache valid for 1 month (Qibla direction doesn't change)
-        if time.time() - cache_entry["timestamp"] < 2592000:
-            return cache_entry["data"]
-    
+    """Get Qibla direction for a specific location, calculated locally"""
     try:
-        response = requests.get(QIBLA_API_URL, params={
-            "city": city,
-            "country": country
-        })
-        
-        if response.status_code == 200:
-            data = response.json()
-            
-            # Cache the results
-            st.session_state.cache[cache_key] = {
-                "timestamp": time.time(),
-                "data": data
-            }
-            
-            return data
-        else:
-            return None
+        place = resolve_location(city, country)
     except Exception as e:
-        st.error(f"Error fetching Qibla direction: {str(e)}")
+        st.error(f"Error finding location: {str(e)}")
+        return None
+    if not place:
         return None
+    return qibla_response(place["latitude"], place["longitude"])
 
 
 def validate_wudu():
@@ -0,0 +1,166 @@
+"""NumPy vector store with brute-force or IVF top-k search.
+
+Vectors are unit-length float32 rows, so scores are cosine similarities.
+Brute-force search is one matrix product per batch of queries and is exact;
+for large stores an inverted file (IVF) index can be built, which clusters
+the vectors with k-means and only scores the vectors in the clusters
+closest to each query. A store is saved as a directory:
+
+    meta.json       dimensions, embedder name, count
+    vectors.npy     (count, dimensions) float32, memory-mapped on load
+    payloads.jsonl  one JSON payload per vector
+    centroids.npy   IVF cluster centroids (only if an IVF index was built)
+    lists.npy       IVF cluster of every vector
+"""
+import json
+import os
+import threading
+
+import numpy as np
+
+# IVF defaults: clusters scanned per query, k-means iterations
+IVF_PROBES = 16
+KMEANS_ITERATIONS = 10
+
+# Passage chunking, in words
+CHUNK_WORDS = 120
+CHUNK_OVERLAP = 30
+
+
+def chunk_text(text, max_words=CHUNK_WORDS, overlap=CHUNK_OVERLAP):
+    """Split text into overlapping passages of at most max_words words"""
+    words = (text or "").split()
+    if len(words) <= max_words:
+        return [" ".join(words)] if words else []
+    step = max_words - overlap
+    return [" ".join(words[start:start + max_words]) for start in range(0, len(words) - overlap, step)]
+
+
+class VectorStore:
+    """Vectors with JSON payloads and batched top-k similarity search"""
+
+    def __init__(self, dimensions, embedder_name=""):
+        self.dimensions = dimensions
+        self.embedder_name = embedder_name
+        self._vectors = np.zeros((0, dimensions), dtype=np.float32)
+        self._buffer = None  # over-allocated backing array for _vectors once vectors are added
+        self._payloads = []
+        self._centroids = None
+        self._lists = None
+        self._cluster_order = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._payloads)
+
+    def add(self, vectors, payloads):
+        """Append vectors (n, dimensions) with one payload each"""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dimensions)
+        with self._lock:
+            count = len(self._payloads)
+            if self._buffer is None or count + len(vectors) > len(self._buffer):
+                # Grow by doubling so repeated small adds stay amortized O(1)
+                buffer = np.empty((max(2 * (count + len(vectors)), 256), self.dimensions), dtype=np.float32)
+                buffer[:count] = self._vectors
+                self._buffer = buffer
+            self._buffer[count:count + len(vectors)] = vectors
+            self._vectors = self._buffer[:count + len(vectors)]
+            self._payloads.extend(payloads)
+            if self._centroids is not None:
+                self._lists = np.concatenate([self._lists, self._nearest_centroids(vectors, 1)[:, 0]])
+                self._cluster_order = self._group_by_cluster()
+
+    def build_ivf(self, n_lists=None, iterations=KMEANS_ITERATIONS, seed=0):
+        """Cluster the vectors with spherical k-means for approximate search"""
+        vectors = np.asarray(self._vectors)
+        n_lists = min(n_lists or max(1, int(np.sqrt(len(vectors)))), len(vectors))
+        rng = np.random.default_rng(seed)
+        centroids = vectors[rng.choice(len(vectors), size=n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignments = np.argmax(vectors @ centroids.T, axis=1)
+            for cluster in range(n_lists):
+                members = vectors[assignments == cluster]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    centroids[cluster] = centroid / max(np.linalg.norm(centroid), 1e-12)
+        with self._lock:
+            self._centroids = centroids
+            self._lists = np.argmax(vectors @ centroids.T, axis=1)
+            self._cluster_order = self._group_by_cluster()
+
+    def _group_by_cluster(self):
+        """Vector ids sorted by cluster plus cluster boundaries, so each cluster is one slice"""
+        order = np.argsort(self._lists, kind="stable")
+        bounds = np.searchsorted(self._lists[order], np.arange(len(self._centroids) + 1))
+        return order, bounds
+
+    def _nearest_centroids(self, queries, probes):
+        scores = queries @ self._centroids.T
+        probes = min(probes, scores.shape[1])
+        return np.argpartition(-scores, probes - 1, axis=1)[:, :probes]
+
+    def search(self, queries, k=5, probes=IVF_PROBES):
+        """Top-k (score, payload) lists for a batch of query vectors, best first.
+
+        Uses the IVF index when one has been built, scanning the probes
+        nearest clusters of each query; otherwise scores every vector.
+        """
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dimensions)
+        with self._lock:
+            vectors, payloads = self._vectors, self._payloads
+            centroids, cluster_order = self._centroids, self._cluster_order
+        if not len(vectors):
+            return [[] for _ in queries]
+
+        if centroids is None:
+            return [self._top_k(scores, np.arange(len(vectors)), k, payloads) for scores in queries @ vectors.T]
+
+        order, bounds = cluster_order
+        results = []
+        for query, clusters in zip(queries, self._nearest_centroids(queries, probes)):
+            candidates = np.concatenate([order[bounds[c]:bounds[c + 1]] for c in clusters])
+            results.append(self._top_k(vectors[candidates] @ query, candidates, k, payloads))
+        return results
+
+    @staticmethod
+    def _top_k(scores, ids, k, payloads):
+        if len(scores) > k:
+            best = np.argpartition(-scores, k - 1)[:k]
+        else:
+            best = np.arange(len(scores))
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [(float(scores[i]), payloads[ids[i]]) for i in best]
+
+    def save(self, path):
+        """Write the store to the directory path"""
+        os.makedirs(path, exist_ok=True)
+        with self._lock:
+            np.save(os.path.join(path, "vectors.npy"), np.asarray(self._vectors))
+            with open(os.path.join(path, "payloads.jsonl"), "w", encoding="utf-8") as f:
+                for payload in self._payloads:
+                    f.write(json.dumps(payload, ensure_ascii=False) + "\n")
+            if self._centroids is not None:
+                np.save(os.path.join(path, "centroids.npy"), self._centroids)
+                np.save(os.path.join(path, "lists.npy"), self._lists)
+            with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump({
+                    "dimensions": self.dimensions,
+                    "embedder": self.embedder_name,
+                    "count": len(self._payloads),
+                    "ivf": self._centroids is not None,
+                }, f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        """Load a store written by save; vectors are memory-mapped"""
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        store = cls(meta["dimensions"], meta["embedder"])
+        store._vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        with open(os.path.join(path, "payloads.jsonl"), encoding="utf-8") as f:
+            store._payloads = [json.loads(line) for line in f]
+        if meta.get("ivf"):
+            store._centroids = np.load(os.path.join(path, "centroids.npy"))
+            store._lists = np.load(os.path.join(path, "lists.npy"))
+            store._cluster_order = store._group_by_cluster()
+        return store